@@ -1,14 +1,43 @@
+"""Login by email or username.
+
+``EmailOrUsernameBackend`` is the only authentication backend: it resolves the
+login against both unique columns in one query and always runs exactly one
+password hash, so an unknown login costs the same as a wrong password and a
+failed attempt isn't retried by a second backend. A successful check with a
+stored hash that is out of date (another hasher, or PASSWORD_HASH_ITERATIONS
+changed) rehashes the password with the current one.
+"""
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.db.models import Q
 
 User = get_user_model()
 
-class EmailBackend(ModelBackend):
+
+def find_user(login):
+    """The user whose email or username is `login`, preferring the email match"""
+    matches = list(User.objects.filter(Q(email=login) | Q(username=login))[:2])
+    for user in matches:
+        if user.email == login:
+            return user
+    return matches[0] if matches else None
+
+
+class EmailOrUsernameBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = User.objects.get(email=username)
-            if user.check_password(password):
-                return user
-        except User.DoesNotExist:
+        login = username if username is not None else kwargs.get(User.USERNAME_FIELD)
+        if login is None or password is None:
             return None
-        return None
\ No newline at end of file
+
+        user = find_user(login)
+        if user is None or not user.has_usable_password():
+            # Hash anyway so a miss takes as long as a wrong password
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+
+# Sessions created before the rename store this path as their backend
+EmailBackend = EmailOrUsernameBackend
@@ -0,0 +1,103 @@
+"""JWT authentication that resolves request.user from the cache.
+
+simplejwt's JWTAuthentication loads the whole user row on every
+authenticated request. ``CachedJWTAuthentication`` keeps the user for
+``AUTH_USER_CACHE_SECONDS`` under a key made of the user id and a per-user
+version, and loads only AUTH_USER_FIELDS on a miss (other columns load
+lazily if a view touches them). The password hash is never cached; when
+simplejwt's CHECK_REVOKE_TOKEN is on, only the digest it compares is.
+
+``invalidate_user`` bumps the version, which orphans the cached entry at
+once - including one written by a request that read the row just before the
+change. It runs from authentication.signals whenever a user row is saved
+(deactivation, password change, profile update) or deleted.
+
+That is only immediate in every worker process if they share the cache, so
+users are not cached at all while the default cache is per-process
+(local memory) or a dummy: each request then loads the row.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from utils import caching
+
+# What permission checks, ownership tests and the author summary in responses
+# read from request.user
+AUTH_USER_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'role',
+    'is_active', 'is_staff', 'is_superuser', 'avatar', 'avatar_url', 'is_verified',
+)
+# Saving any of these must drop the cached user
+INVALIDATING_FIELDS = AUTH_USER_FIELDS + ('password',)
+
+
+def cache_seconds():
+    """How long a user stays cached; 0 unless the cache is shared between processes"""
+    if not caching.is_shared():
+        return 0
+    return getattr(settings, 'AUTH_USER_CACHE_SECONDS', 300)
+
+
+def version_key(user_id):
+    return f'auth:user-version:{user_id}'
+
+
+def user_key(user_id, version):
+    return f'auth:user:{user_id}:{version}'
+
+
+def invalidate_user(user_id):
+    try:
+        cache.incr(version_key(user_id))
+    except ValueError:
+        # No version yet (or evicted): any value other than the default works
+        cache.set(version_key(user_id), 1, None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def load_entry(self, user_id):
+        """(AUTH_USER_FIELDS values, password digest or None) for the cache"""
+        fields = AUTH_USER_FIELDS + (('password',) if api_settings.CHECK_REVOKE_TOKEN else ())
+        row = self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values(*fields).first()
+        if row is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        password = row.pop('password', None)
+        return row, get_md5_hash_password(password) if password is not None else None
+    
+    def build_user(self, values):
+        # from_db leaves the other columns deferred, as only() would
+        names = [field.attname for field in self.user_model._meta.concrete_fields if field.attname in values]
+        return self.user_model.from_db(None, names, [values[name] for name in names])
+    
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        
+        seconds = cache_seconds()
+        if seconds:
+            # Read before the row so a concurrent invalidation can only make
+            # what we cache unreachable, never current
+            key = user_key(user_id, cache.get(version_key(user_id), 0))
+            entry = cache.get(key)
+            if entry is None:
+                entry = self.load_entry(user_id)
+                cache.set(key, entry, seconds)
+        else:
+            entry = self.load_entry(user_id)
+        values, password_digest = entry
+        user = self.build_user(values)
+        
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_digest:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        
+        return user
@@ -0,0 +1,15 @@
+"""Password hasher with a configurable work factor.
+
+``ConfigurablePBKDF2PasswordHasher`` is Django's PBKDF2-SHA256 hasher with
+its iteration count read from PASSWORD_HASH_ITERATIONS. It keeps the
+``pbkdf2_sha256`` algorithm name, so existing hashes verify unchanged and are
+rewritten with the configured count the next time their owner logs in.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
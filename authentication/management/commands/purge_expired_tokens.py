@@ -0,0 +1,37 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding refresh tokens (and their blacklist rows) in small chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows examined per transaction')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between chunks')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = last_id = 0
+        # Walks the primary key instead of filtering on the unindexed
+        # expires_at, so each chunk is a short range read and a short write
+        while True:
+            rows = list(
+                OutstandingToken.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'expires_at')[:options['chunk_size']]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            expired = [row_id for row_id, expires_at in rows if expires_at <= now]
+            if expired:
+                with transaction.atomic():
+                    OutstandingToken.objects.filter(id__in=expired).delete()
+                deleted += len(expired)
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} expired tokens')
+        )
@@ -0,0 +1,147 @@
+"""In-memory filter of revoked refresh tokens.
+
+With simplejwt's token_blacklist app every refresh first checks the
+blacklist table for the token's jti. ``is_revoked`` answers that from a
+per-process Bloom filter of blacklisted jtis instead: a jti that isn't in
+the filter was definitely not revoked (the common case, no query); a hit is
+confirmed against the table, since Bloom filters have false positives
+(``REVOKED_TOKEN_FILTER_ERROR_RATE`` of them at ``REVOKED_TOKEN_FILTER_CAPACITY``
+entries).
+
+The filter is built from the table on first use in each process and then
+kept current: ``revoke`` adds to it directly, and revocations made by other
+processes are picked up at most every ``REVOKED_TOKEN_SYNC_SECONDS``, so
+another worker may accept a just-revoked token for that long. With
+concurrent writers blacklist rows can commit out of id order, so a sync
+doesn't continue after the last id it saw: it re-reads every row blacklisted
+since ``REVOKED_TOKEN_SYNC_OVERLAP_SECONDS`` before the previous sync
+started, found by walking the primary key back from the newest row. It is rebuilt from scratch every
+``REVOKED_TOKEN_REBUILD_SECONDS`` to drop expired tokens, or sooner when it
+outgrows its capacity.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def positions(self, item):
+        # Double hashing: k positions from two independent 64-bit values
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        with self._lock:
+            for position in self.positions(item):
+                self.bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class RevokedTokens:
+    batch_size = 5000
+
+    def __init__(self):
+        self.filter = None
+        # Wall-clock start of the last build or sync, compared with blacklisted_at
+        self.synced_from = None
+        self.synced_at = self.built_at = 0.0
+        self._lock = threading.Lock()
+
+    def build(self):
+        started = timezone.now()
+        live = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        # Room for twice what is revoked now, so it stays accurate while it grows
+        capacity = max(getattr(settings, 'REVOKED_TOKEN_FILTER_CAPACITY', 100000), 2 * live.count())
+        bloom = BloomFilter(capacity, getattr(settings, 'REVOKED_TOKEN_FILTER_ERROR_RATE', 0.001))
+        newest_id = BlacklistedToken.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        
+        last_id = 0
+        while True:
+            rows = list(live.filter(id__gt=last_id, id__lte=newest_id).order_by('id').values_list('id', 'token__jti')[:self.batch_size])
+            for row_id, jti in rows:
+                bloom.add(jti)
+            if len(rows) < self.batch_size:
+                break
+            last_id = rows[-1][0]
+        
+        self.filter, self.synced_from = bloom, started
+        self.synced_at = self.built_at = time.monotonic()
+
+    def sync(self):
+        """Add tokens blacklisted since shortly before the last sync, possibly by other processes"""
+        started = timezone.now()
+        overlap = timedelta(seconds=getattr(settings, 'REVOKED_TOKEN_SYNC_OVERLAP_SECONDS', 60))
+        # Newest row from before the window: only the window's rows are
+        # stepped over to find it, and every row after it is re-read
+        floor = (
+            BlacklistedToken.objects.filter(blacklisted_at__lt=self.synced_from - overlap)
+            .order_by('-id').values_list('id', flat=True).first()
+        ) or 0
+        for jti in BlacklistedToken.objects.filter(id__gt=floor).values_list('token__jti', flat=True):
+            # Rows re-read from the overlap are already in; don't count them twice
+            if jti not in self.filter:
+                self.filter.add(jti)
+        self.synced_from = started
+        self.synced_at = time.monotonic()
+
+    def refresh(self):
+        now = time.monotonic()
+        due_sync = now - self.synced_at >= getattr(settings, 'REVOKED_TOKEN_SYNC_SECONDS', 5)
+        due_rebuild = (
+            self.filter is None
+            or now - self.built_at >= getattr(settings, 'REVOKED_TOKEN_REBUILD_SECONDS', 3600)
+            or self.filter.count > self.filter.capacity
+        )
+        if not due_sync and not due_rebuild:
+            return
+        # One thread refreshes while the others keep using the current filter;
+        # only the very first build makes everyone wait
+        if not self._lock.acquire(blocking=self.filter is None):
+            return
+        try:
+            # Re-checked: another thread may have done it while we waited
+            if self.filter is None or (due_rebuild and self.built_at < now):
+                self.build()
+            elif self.synced_at < now:
+                self.sync()
+        finally:
+            self._lock.release()
+
+    def add(self, jti):
+        self.refresh()
+        self.filter.add(jti)
+
+    def might_be_revoked(self, jti):
+        self.refresh()
+        return jti in self.filter
+
+
+revoked_tokens = RevokedTokens()
+
+
+def is_revoked(jti):
+    if not revoked_tokens.might_be_revoked(jti):
+        return False
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+def record_revocation(jti):
+    """Add a jti just blacklisted in this process, without waiting for the next sync"""
+    revoked_tokens.add(jti)
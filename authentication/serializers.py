@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.password_validation import validate_password
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from .tokens import RefreshToken
 
 User = get_user_model()
 
@@ -58,4 +59,8 @@ class ChangePasswordSerializer(serializers.Serializer):
         user = self.context['request'].user
         if not user.check_password(value):
             raise serializers.ValidationError("Old password is incorrect")
-        return value
\ No newline at end of file
+        return value
+
+class RevocationAwareTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh (and rotation blacklisting) through the in-memory revoked-token filter"""
+    token_class = RefreshToken
@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .cached_auth import INVALIDATING_FIELDS, invalidate_user
+
+User = get_user_model()
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user(sender, instance, update_fields=None, **kwargs):
+    # e.g. the last_login update on every login doesn't touch cached columns
+    if update_fields is not None and not set(INVALIDATING_FIELDS) & set(update_fields):
+        return
+    invalidate_user(instance.pk)
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
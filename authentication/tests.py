@@ -1,3 +1,231 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from posts.models import Post
+from users.models import User
+from . import cached_auth, revocation
+from .hashers import ConfigurablePBKDF2PasswordHasher
+from .tokens import RefreshToken
 
-# Create your tests here.
+
+def make_user(username, **extra):
+    return User.objects.create_user(email=f'{username}@example.com', username=username, password='pass12345', **extra)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        # Users are only cached in a cache shared between processes
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': self.cache_dir},
+        })
+        self.settings_override.enable()
+        self.alice = make_user('alice')
+        self.post = Post.objects.create(author=self.alice, content='hello')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def user_queries(self, client, path='/api/notifications/unread-count/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path)
+        return response, [query['sql'] for query in queries.captured_queries if 'FROM "users_user"' in query['sql']]
+
+    def test_user_is_loaded_once_with_only_the_needed_columns(self):
+        client = self.client_for(self.alice)
+        response, queries = self.user_queries(client)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"bio"', queries[0])
+
+        response, queries = self.user_queries(client, f'/api/posts/{self.post.id}/like-status/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_password_hash_is_not_cached(self):
+        self.user_queries(self.client_for(self.alice))
+        version = cache.get(cached_auth.version_key(self.alice.id), 0)
+        values, digest = cache.get(cached_auth.user_key(self.alice.id, version))
+        self.assertNotIn('password', values)
+        self.assertIsNone(digest)
+
+    def test_local_memory_cache_is_not_used(self):
+        client = self.client_for(self.alice)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual(len(self.user_queries(client)[1]), 1)
+            self.assertEqual(len(self.user_queries(client)[1]), 1)
+
+    def test_deactivation_takes_effect_immediately(self):
+        client = self.client_for(self.alice)
+        self.assertEqual(client.get('/api/notifications/unread-count/').status_code, 200)
+
+        admin = make_user('admin', role='admin')
+        self.client_for(admin).post(f'/api/admin/users/{self.alice.id}/deactivate/')
+
+        self.assertEqual(client.get('/api/notifications/unread-count/').status_code, 401)
+
+    def test_password_and_profile_changes_invalidate(self):
+        client = self.client_for(self.alice)
+        self.user_queries(client)
+
+        response = client.put('/api/auth/change-password/', {'old_password': 'pass12345', 'new_password': 'N3w-passw0rd!'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.user_queries(client)[1]), 1)
+        self.assertTrue(User.objects.get(pk=self.alice.pk).check_password('N3w-passw0rd!'))
+
+        response = client.patch('/api/users/me/', {'bio': 'Hi there'})
+        self.assertEqual(response.data['bio'], 'Hi there')
+        self.assertEqual(len(self.user_queries(client)[1]), 1)
+
+    def test_last_login_update_keeps_the_cache(self):
+        client = self.client_for(self.alice)
+        self.user_queries(client)
+        APIClient().post('/api/auth/login/', {'login': 'alice@example.com', 'password': 'pass12345'})
+        self.assertEqual(self.user_queries(client)[1], [])
+
+
+class RevokedTokenFilterTests(TestCase):
+    def setUp(self):
+        revocation.revoked_tokens = revocation.RevokedTokens()
+        self.alice = make_user('alice')
+
+    def refresh(self, token):
+        return APIClient().post('/api/auth/token/refresh/', {'refresh': str(token)})
+
+    def test_bloom_filter_has_no_false_negatives_and_few_false_positives(self):
+        bloom = revocation.BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'revoked-{i}')
+        self.assertTrue(all(f'revoked-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_unrevoked_refresh_does_not_query_the_blacklist(self):
+        token = RefreshToken.for_user(self.alice)
+        revocation.revoked_tokens.refresh()  # built at first use
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        lookups = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT') and 'token_blacklist_blacklistedtoken' in q['sql']]
+        self.assertEqual(len(lookups), 1)  # the rotation's own get_or_create, not the check
+        self.assertIn('"token_id"', lookups[0])
+
+    def test_revoked_tokens_are_rejected(self):
+        token = RefreshToken.for_user(self.alice)
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        self.assertEqual(client.post('/api/auth/logout/', {'refresh': str(token)}).status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+        # Rotation blacklists the old token
+        other = RefreshToken.for_user(self.alice)
+        self.assertEqual(self.refresh(other).status_code, 200)
+        self.assertEqual(self.refresh(other).status_code, 401)
+
+    def test_revocations_by_other_processes_are_synced(self):
+        token = RefreshToken.for_user(self.alice)
+        revocation.revoked_tokens.refresh()
+        outstanding = OutstandingToken.objects.get(jti=token['jti'])
+        BlacklistedToken.objects.create(token=outstanding)  # as another worker would
+
+        self.assertFalse(revocation.revoked_tokens.might_be_revoked(token['jti']))
+        revocation.revoked_tokens.synced_at = 0
+        self.assertTrue(revocation.is_revoked(token['jti']))
+
+    def test_revocations_committed_out_of_id_order_are_synced(self):
+        early, late = RefreshToken.for_user(self.alice), RefreshToken.for_user(self.alice)
+        # The writer that got the lower id commits after the one with the higher id
+        BlacklistedToken.objects.create(id=100, token=OutstandingToken.objects.get(jti=late['jti']))
+        revocation.revoked_tokens.refresh()
+        revocation.revoked_tokens.synced_at = 0
+        revocation.revoked_tokens.refresh()
+        BlacklistedToken.objects.create(id=50, token=OutstandingToken.objects.get(jti=early['jti']))
+
+        revocation.revoked_tokens.synced_at = 0
+        self.assertTrue(revocation.is_revoked(early['jti']))
+        self.assertEqual(revocation.revoked_tokens.filter.count, 2)  # re-read rows aren't counted again
+
+    def test_purge_deletes_only_expired_tokens(self):
+        live = RefreshToken.for_user(self.alice)
+        expired = RefreshToken.for_user(self.alice)
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=expired['jti']))
+
+        call_command('purge_expired_tokens', chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class LoginTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+
+    def login(self, login, password='pass12345'):
+        return APIClient().post('/api/auth/login/', {'login': login, 'password': password})
+
+    def count_hashes(self, login, password='pass12345'):
+        encode = ConfigurablePBKDF2PasswordHasher.encode
+        with mock.patch.object(ConfigurablePBKDF2PasswordHasher, 'encode', autospec=True, side_effect=encode) as hashed:
+            response = self.login(login, password)
+        return response, hashed.call_count
+
+    def test_login_by_email_or_username_with_one_user_query(self):
+        for login in ('alice@example.com', 'alice'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.login(login)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['user']['id'], self.alice.id)
+            lookups = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT') and 'FROM "users_user"' in q['sql']]
+            self.assertEqual(len(lookups), 1)
+
+    def test_every_attempt_runs_exactly_one_hash(self):
+        for login, password, expected in [
+            ('alice@example.com', 'pass12345', 200),
+            ('alice@example.com', 'wrong', 401),
+            ('nobody@example.com', 'pass12345', 401),
+        ]:
+            response, hashes = self.count_hashes(login, password)
+            self.assertEqual(response.status_code, expected)
+            self.assertEqual(hashes, 1)
+
+    def test_outdated_hash_is_upgraded_on_login(self):
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login('alice').status_code, 200)
+        self.alice.refresh_from_db()
+        self.assertTrue(self.alice.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(self.alice.check_password('pass12345'))
+
+    @override_settings(LAST_LOGIN_UPDATE_MINUTES=15)
+    def test_last_login_is_written_at_most_once_per_interval(self):
+        self.login('alice')
+        self.alice.refresh_from_db()
+        first = self.alice.last_login
+        self.assertIsNotNone(first)
+
+        self.login('alice')
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.last_login, first)
+
+        User.objects.filter(pk=self.alice.pk).update(last_login=first - timedelta(minutes=20))
+        self.login('alice')
+        self.alice.refresh_from_db()
+        self.assertGreater(self.alice.last_login, first)
@@ -0,0 +1,18 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from . import revocation
+
+
+class RefreshToken(tokens.RefreshToken):
+    """Refresh token whose blacklist check goes through the revoked-token filter"""
+
+    def check_blacklist(self):
+        if revocation.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        revocation.record_revocation(self.payload[api_settings.JTI_CLAIM])
+        return result
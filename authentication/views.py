@@ -3,12 +3,14 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.tokens import RefreshToken
+from datetime import timedelta
+from django.conf import settings
 from django.contrib.auth import get_user_model, authenticate
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from .serializers import UserRegistrationSerializer, ChangePasswordSerializer
+from .tokens import RefreshToken
 from users.serializers import UserSerializer
 
 User = get_user_model()
@@ -33,6 +35,14 @@ class RegisterView(generics.CreateAPIView):
             'access': str(refresh.access_token),
         }, status=status.HTTP_201_CREATED)
 
+def record_login(user):
+    """Set last_login, skipping the write if it was recorded recently"""
+    now = timezone.now()
+    every = timedelta(minutes=getattr(settings, 'LAST_LOGIN_UPDATE_MINUTES', 15))
+    if user.last_login is None or now - user.last_login >= every:
+        User.objects.filter(pk=user.pk).update(last_login=now)
+        user.last_login = now
+
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -43,8 +53,7 @@ def login_view(request):
     user = authenticate(username=login, password=password)
     if user:
         refresh = RefreshToken.for_user(user)
-        user.last_login = timezone.now()
-        user.save(update_fields=['last_login'])
+        record_login(user)
         
         return Response({
             'user': UserSerializer(user).data,
@@ -78,6 +87,7 @@ class ChangePasswordView(generics.UpdateAPIView):
         
         user = self.get_object()
         user.set_password(serializer.validated_data['new_password'])
-        user.save()
+        # request.user may be a cached partial row; write only what changed
+        user.save(update_fields=['password'])
         
         return Response({"message": "Password updated successfully"}, status=status.HTTP_200_OK)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Multi-process login benchmark.
+
+Posts to /api/auth/login/ against a throwaway database from one process per
+core and prints logins per second in total and per core for a correct
+password, a wrong password and an unknown login. Each attempt costs one
+password hash, so the three rates should be close; PASSWORD_HASH_ITERATIONS
+is the knob that moves them.
+
+    python bench_login.py --processes 4 --seconds 5 --iterations 600000
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'socialconnect.settings')
+
+CASES = {
+    'ok': ('bench@example.com', 'bench-password'),
+    'bad password': ('bench@example.com', 'not-the-password'),
+    'unknown user': ('nobody@example.com', 'bench-password'),
+}
+
+
+def setup_django(db_path, iterations):
+    import django
+    from django.conf import settings
+
+    # Must happen before the first connection is opened
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.PASSWORD_HASH_ITERATIONS = iterations
+    settings.ALLOWED_HOSTS = ['*']
+    django.setup()
+
+
+def prepare_database(db_path, iterations):
+    setup_django(db_path, iterations)
+    from django.core.management import call_command
+    from users.models import User
+
+    call_command('migrate', verbosity=0)
+    User.objects.create_user(email=CASES['ok'][0], username='bench', password=CASES['ok'][1])
+
+
+def worker(db_path, iterations, case, seconds, results):
+    setup_django(db_path, iterations)
+    import logging
+    from django.test import Client
+
+    # Every failed attempt would otherwise log an "Unauthorized" warning
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+
+    client = Client()
+    login, password = CASES[case]
+    expected = 200 if case == 'ok' else 401
+    done = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        response = client.post('/api/auth/login/', {'login': login, 'password': password})
+        assert response.status_code == expected, response.status_code
+        done += 1
+    results.put(done)
+
+
+def run_case(db_path, iterations, case, processes, seconds):
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=worker, args=(db_path, iterations, case, seconds, results))
+        for _ in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    total = sum(results.get() for _ in workers)
+    for process in workers:
+        process.join()
+    return total / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--seconds', type=float, default=5, help='Run time per case')
+    parser.add_argument('--iterations', type=int, default=None, help='PASSWORD_HASH_ITERATIONS (default: settings)')
+    args = parser.parse_args()
+
+    multiprocessing.set_start_method('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'bench.sqlite3')
+        # Set up in a child so this process never imports Django settings
+        setup = multiprocessing.Process(target=prepare_database, args=(db_path, args.iterations))
+        setup.start()
+        setup.join()
+
+        print(f'{args.processes} processes x {args.seconds:g}s, iterations={args.iterations or "default"}')
+        print(f'{"case":<14}{"logins/s":>12}{"per core":>12}')
+        for case in CASES:
+            rate = run_case(db_path, args.iterations, case, args.processes, args.seconds)
+            print(f'{case:<14}{rate:>12.1f}{rate / args.processes:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
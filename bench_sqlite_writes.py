@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""Multi-process write benchmark for the SQLite production mode.
+
+Runs the same like/unlike workload against a throwaway database with Django's
+defaults, with SQLITE_TUNING, and with SQLITE_TUNING plus SQLITE_WRITE_QUEUE,
+then prints write throughput and the share of writes that failed with
+"database is locked".
+
+    python bench_sqlite_writes.py --processes 4 --threads 8 --writes 200
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'socialconnect.settings')
+
+MODES = {
+    'default': {'SQLITE_TUNING': False, 'SQLITE_WRITE_QUEUE': False},
+    'wal': {'SQLITE_TUNING': True, 'SQLITE_WRITE_QUEUE': False},
+    'wal+queue': {'SQLITE_TUNING': True, 'SQLITE_WRITE_QUEUE': True},
+}
+POSTS = 20
+
+
+def setup_django(db_path, mode):
+    import django
+    from django.conf import settings
+
+    # Must happen before the first connection is opened
+    settings.DATABASES['default']['NAME'] = db_path
+    for name, value in MODES[mode].items():
+        setattr(settings, name, value)
+    django.setup()
+
+
+def prepare_database(db_path, mode, users):
+    setup_django(db_path, mode)
+    from django.core.management import call_command
+    from users.models import User
+    from posts.models import Post
+
+    call_command('migrate', verbosity=0)
+    authors = User.objects.bulk_create([
+        User(username=f'bench{i}', email=f'bench{i}@example.com', password='!') for i in range(users)
+    ])
+    Post.objects.bulk_create([Post(author=authors[i % users], content=f'post {i}') for i in range(POSTS)])
+
+
+def worker(db_path, mode, first_user, threads, writes, results):
+    setup_django(db_path, mode)
+    from django.db import OperationalError, connection
+    from posts.models import Post, Like
+    from posts import counters
+    from utils import write_queue
+
+    post_ids = list(Post.objects.values_list('id', flat=True))
+    connection.close()
+    done, locked = [], []
+
+    def toggle_like(user_id, post_id):
+        like, created = Like.objects.get_or_create(user_id=user_id, post_id=post_id)
+        if created:
+            counters.increment(post_id, 'like_count', 1)
+        else:
+            like.delete()
+            counters.increment(post_id, 'like_count', -1)
+
+    def run_thread(user_id):
+        ok = errors = 0
+        for _ in range(writes):
+            try:
+                write_queue.run(toggle_like, user_id, random.choice(post_ids))
+                ok += 1
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                errors += 1
+        done.append(ok)
+        locked.append(errors)
+        connection.close()
+
+    pool = [threading.Thread(target=run_thread, args=(first_user + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((sum(done), sum(locked)))
+
+
+def run_mode(mode, processes, threads, writes):
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'bench.sqlite3')
+        # Set up in a child so this process never imports Django settings
+        setup = multiprocessing.Process(target=prepare_database, args=(db_path, mode, processes * threads))
+        setup.start()
+        setup.join()
+
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=worker, args=(db_path, mode, i * threads + 1, threads, writes, results))
+            for i in range(processes)
+        ]
+        started = time.monotonic()
+        for process in workers:
+            process.start()
+        totals = [results.get() for _ in workers]
+        elapsed = time.monotonic() - started
+        for process in workers:
+            process.join()
+
+    ok = sum(done for done, _ in totals)
+    locked = sum(errors for _, errors in totals)
+    return ok / elapsed, locked / max(ok + locked, 1), locked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent requests per process')
+    parser.add_argument('--writes', type=int, default=200, help='Writes per thread')
+    args = parser.parse_args()
+
+    multiprocessing.set_start_method('spawn')
+    print(f'{args.processes} processes x {args.threads} threads x {args.writes} writes')
+    print(f'{"mode":<12}{"writes/s":>12}{"locked":>10}{"lock rate":>12}')
+    for mode in MODES:
+        throughput, lock_rate, locked = run_mode(mode, args.processes, args.threads, args.writes)
+        print(f'{mode:<12}{throughput:>12.0f}{locked:>10}{lock_rate:>11.1%}')
+
+
+if __name__ == '__main__':
+    main()
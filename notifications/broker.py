@@ -0,0 +1,171 @@
+"""In-process pub/sub for the notification stream.
+
+Every connected stream client holds a ``Subscription`` (an asyncio queue on the
+server's event loop), so an idle connection costs a queue and a timer, not a
+thread. ``publish`` can be called from any thread: it delivers to local
+subscribers and hands the event to the configured backend, which fans it out
+to the other worker processes on this machine.
+
+Backends (``NOTIFICATION_STREAM_BACKEND``):
+
+* ``LocalBackend`` - single process, nothing leaves the process.
+* ``UnixSocketBackend`` - each process binds a datagram socket in
+  ``NOTIFICATION_STREAM_SOCKET_DIR``; publishing sends the event to every
+  socket in that directory.
+"""
+import asyncio
+import json
+import os
+import socket
+import threading
+import uuid
+from collections import defaultdict
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=getattr(settings, 'NOTIFICATION_STREAM_QUEUE_SIZE', 100))
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: drop rather than buffer without bound
+            pass
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self, backend):
+        self.backend = backend
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        backend.start(self)
+
+    def subscribe(self, user_id):
+        """Subscribe to `user_id`'s events. Must be called from the event loop."""
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def deliver_local(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # Event loop already closed
+                self.unsubscribe(subscription)
+
+    def publish(self, user_id, event):
+        self.deliver_local(user_id, event)
+        self.backend.publish(user_id, event)
+
+
+class LocalBackend:
+    def start(self, broker):
+        pass
+
+    def publish(self, user_id, event):
+        pass
+
+
+class UnixSocketBackend:
+    max_datagram = 64 * 1024
+
+    def __init__(self, directory=None, name=None):
+        self.directory = str(directory or getattr(settings, 'NOTIFICATION_STREAM_SOCKET_DIR', '/tmp/socialconnect-stream'))
+        self.path = os.path.join(self.directory, f'{name or os.getpid()}-{uuid.uuid4().hex[:8]}.sock')
+        self.receiver = None
+        self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sender.setblocking(False)
+
+    def start(self, broker):
+        os.makedirs(self.directory, exist_ok=True)
+        self.receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.receiver.bind(self.path)
+        threading.Thread(target=self._receive, args=(broker,), daemon=True).start()
+
+    def _receive(self, broker):
+        while True:
+            try:
+                data = self.receiver.recv(self.max_datagram)
+            except OSError:
+                return
+            message = json.loads(data)
+            broker.deliver_local(message['user_id'], message['event'])
+
+    def publish(self, user_id, event):
+        data = json.dumps({'user_id': user_id, 'event': event}).encode()
+        try:
+            entries = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            path = os.path.join(self.directory, entry)
+            if not entry.endswith('.sock') or path == self.path:
+                continue
+            try:
+                self.sender.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket left behind by a worker that exited
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                # Receiver's buffer is full; it is a realtime hint, drop it
+                pass
+
+    def close(self):
+        if self.receiver is not None:
+            self.receiver.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        self.sender.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend_class = import_string(
+                    getattr(settings, 'NOTIFICATION_STREAM_BACKEND', 'notifications.broker.LocalBackend')
+                )
+                _broker = Broker(backend_class())
+    return _broker
+
+
+def publish(user_id, event):
+    get_broker().publish(user_id, event)
@@ -0,0 +1,108 @@
+"""Write-time coalescing of like and follow notifications.
+
+Instead of one row per like, likes on the same post (and follows of the same
+user) that arrive within ``NOTIFICATION_COALESCE_WINDOW`` of an unseen group
+row are folded into it: the row's sender becomes the latest actor,
+``actor_count`` goes up and the message is rewritten to
+"alice and 41 others liked your post". Every folded actor's id is kept in
+``actor_ids``, so someone who unlikes and likes again is not counted twice
+even after dropping out of ``recent_actors``. The fold bumps ``last_activity_at``
+and marks the row unread again, so it moves back to the top of the list and
+is returned to ``?since=`` pollers. Once the recipient has seen the group,
+the next like starts a new one.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .models import Notification
+
+COALESCED_TYPES = {
+    'like': 'liked your post',
+    'follow': 'started following you',
+}
+
+
+def is_enabled():
+    return getattr(settings, 'NOTIFICATION_COALESCING', True)
+
+
+def group_key(notification):
+    post_id = notification.post_id if notification.notification_type == 'like' else None
+    return (notification.recipient_id, notification.notification_type, post_id)
+
+
+def group_message(notification):
+    actors = notification.recent_actors
+    action = COALESCED_TYPES[notification.notification_type]
+    if notification.actor_count == 1:
+        message = f"{actors[0]['username']} {action}"
+    elif notification.actor_count == 2 and len(actors) > 1:
+        message = f"{actors[0]['username']} and {actors[1]['username']} {action}"
+    else:
+        others = notification.actor_count - 1
+        message = f"{actors[0]['username']} and {others} {'other' if others == 1 else 'others'} {action}"
+    return message[:200]
+
+
+def open_group(recipient_id, notification_type, post_id):
+    """The unseen group row new activity can still be folded into"""
+    window = timedelta(minutes=getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 60))
+    return (
+        Notification.objects.select_for_update()
+        .filter(
+            recipient_id=recipient_id,
+            notification_type=notification_type,
+            post_id=post_id,
+            seen_at__isnull=True,
+            created_at__gte=timezone.now() - window,
+        )
+        .order_by('-created_at')
+        .first()
+    )
+
+
+def add_actor(group, sender):
+    """Fold `sender` into `group`. Returns False if they were already counted in it."""
+    if sender.id in group.actor_ids:
+        return False
+    group.actor_ids = group.actor_ids + [sender.id]
+    limit = getattr(settings, 'NOTIFICATION_RECENT_ACTORS', 3)
+    group.recent_actors = [{'id': sender.id, 'username': sender.username}] + group.recent_actors[:limit - 1]
+    group.actor_count += 1
+    group.sender = sender
+    group.message = group_message(group)
+    group.last_activity_at = timezone.now()
+    group.is_read = False
+    return True
+
+
+def coalesce(notifications):
+    """Split a batch into (new rows to insert, existing group rows that changed).
+
+    Must run inside a transaction; open group rows are locked while they are
+    updated.
+    """
+    created, updated, groups = [], [], {}
+
+    for notification in notifications:
+        if notification.notification_type not in COALESCED_TYPES:
+            created.append(notification)
+            continue
+
+        key = group_key(notification)
+        if key not in groups:
+            groups[key] = open_group(*key)
+        group = groups[key]
+
+        if group is None:
+            notification.recent_actors = [{'id': notification.sender.id, 'username': notification.sender.username}]
+            notification.actor_ids = [notification.sender.id]
+            notification.message = group_message(notification)
+            groups[key] = notification
+            created.append(notification)
+        elif add_actor(group, notification.sender) and group.pk and group not in updated:
+            updated.append(group)
+
+    for group in updated:
+        group.save(update_fields=['sender', 'actor_count', 'recent_actors', 'actor_ids', 'message', 'last_activity_at', 'is_read'])
+    return created, updated
@@ -0,0 +1,54 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from notifications.retention import policies, expired, purge_chunk
+
+class Command(BaseCommand):
+    help = 'Archive and delete notifications that are past their retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows moved per transaction')
+        parser.add_argument('--export', type=str, help='Append removed rows to this JSON lines file')
+        parser.add_argument('--no-archive', action='store_true', help='Do not copy rows to the archive table')
+        parser.add_argument('--max-chunks', type=int, help='Stop after this many chunks (run again to resume)')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between chunks')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows are expired')
+
+    def handle(self, *args, **options):
+        if options['no_archive'] and not options['export'] and not options['dry_run']:
+            self.stdout.write(self.style.WARNING('Neither archiving nor exporting: expired rows will be dropped'))
+
+        now = timezone.now()
+        if options['dry_run']:
+            for notification_type, policy in policies().items():
+                count = expired(notification_type, policy, now).count()
+                self.stdout.write(f'{notification_type}: {count} expired')
+            return
+
+        export_file = open(options['export'], 'a') if options['export'] else None
+        rows = reclaimed = chunks = 0
+        try:
+            for notification_type, policy in policies().items():
+                queryset = expired(notification_type, policy, now)
+                position = None
+                while options['max_chunks'] is None or chunks < options['max_chunks']:
+                    moved, size, position = purge_chunk(
+                        queryset, options['chunk_size'], position,
+                        archive=not options['no_archive'], export_file=export_file,
+                    )
+                    if position is None:
+                        break
+                    rows += moved
+                    reclaimed += size
+                    chunks += 1
+                    if options['pause']:
+                        time.sleep(options['pause'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Interrupted; run again to resume'))
+        finally:
+            if export_file is not None:
+                export_file.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Removed {rows} notifications in {chunks} chunks, reclaiming ~{reclaimed} bytes of row data')
+        )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from notifications.models import Notification, UnreadNotificationCounter
+
+class Command(BaseCommand):
+    help = 'Recompute per-user unread notification counters from the notifications table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        actual = dict(
+            Notification.objects.filter(seen_at__isnull=True)
+            .values('recipient_id')
+            .annotate(total=Count('id'))
+            .values_list('recipient_id', 'total')
+        )
+        stored = dict(UnreadNotificationCounter.objects.values_list('user_id', 'unread_count'))
+
+        drifted = {
+            user_id: actual.get(user_id, 0)
+            for user_id in set(actual) | set(stored)
+            if actual.get(user_id, 0) != stored.get(user_id)
+        }
+
+        if drifted and not options['dry_run']:
+            with transaction.atomic():
+                existing = UnreadNotificationCounter.objects.in_bulk([u for u in drifted if u in stored])
+                for counter in existing.values():
+                    counter.unread_count = drifted[counter.user_id]
+                UnreadNotificationCounter.objects.bulk_update(existing.values(), ['unread_count'], batch_size=1000)
+                UnreadNotificationCounter.objects.bulk_create([
+                    UnreadNotificationCounter(user_id=user_id, unread_count=count)
+                    for user_id, count in drifted.items() if user_id not in stored
+                ], batch_size=1000)
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(
+            self.style.SUCCESS(f'{verb} {len(drifted)} drifted unread counters')
+        )
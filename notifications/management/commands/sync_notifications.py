@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from notifications.models import SupabaseOutbox
+from notifications.supabase_sync import drain_once, next_attempt_in, get_session, SupabaseSyncError
+
+class Command(BaseCommand):
+    help = 'Send queued notifications to Supabase'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Notifications per request')
+        parser.add_argument('--loop', action='store_true', help='Keep draining until interrupted')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--retry-failed', action='store_true', help='Requeue rows that exhausted their retries')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = SupabaseOutbox.objects.filter(failed_at__isnull=False).update(
+                failed_at=None, attempts=0, next_attempt_at=timezone.now()
+            )
+            self.stdout.write(f'Requeued {requeued} failed notifications')
+
+        session = get_session()
+        delivered = 0
+        try:
+            while True:
+                try:
+                    sent = drain_once(options['batch_size'], session=session)
+                except SupabaseSyncError as e:
+                    self.stderr.write(self.style.WARNING(f'Supabase sync failed: {e}'))
+                    sent = 0
+                delivered += sent
+                if sent:
+                    continue
+
+                wait = next_attempt_in()
+                if not options['loop'] and (wait is None or wait > 0):
+                    break
+                time.sleep(options['interval'] if wait is None else min(max(wait, 0.05), options['interval']))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Delivered {delivered} notifications to Supabase')
+        )
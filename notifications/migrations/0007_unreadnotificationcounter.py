@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_counters(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    UnreadNotificationCounter = apps.get_model('notifications', 'UnreadNotificationCounter')
+    unread = (
+        Notification.objects.filter(seen_at__isnull=True)
+        .values('recipient_id')
+        .annotate(total=models.Count('id'))
+    )
+    UnreadNotificationCounter.objects.bulk_create([
+        UnreadNotificationCounter(user_id=row['recipient_id'], unread_count=row['total'])
+        for row in unread
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_stored_counters'),
+        ('notifications', '0006_notification_coalescing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadNotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_unreadnotificationcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('recipient_id', models.BigIntegerField(db_index=True)),
+                ('sender_id', models.BigIntegerField()),
+                ('notification_type', models.CharField(max_length=10)),
+                ('post_id', models.BigIntegerField(blank=True, null=True)),
+                ('actor_count', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:51
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def backfill_last_activity(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.update(last_activity_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0009_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_last_activity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'last_activity_at'], name='notif_recipient_activity_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0010_notification_last_activity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['notification_type', 'created_at'], name='notif_type_created_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:14
+
+from django.db import migrations, models
+
+
+def backfill_actor_ids(apps, schema_editor):
+    # Only unseen groups can still be folded into; the recent actors are
+    # all that is known about who was counted in them
+    Notification = apps.get_model('notifications', 'Notification')
+    groups = Notification.objects.filter(seen_at__isnull=True, notification_type__in=['like', 'follow'])
+    batch = []
+    for group in groups.only('id', 'sender_id', 'recent_actors').iterator():
+        group.actor_ids = [actor['id'] for actor in group.recent_actors] or [group.sender_id]
+        batch.append(group)
+        if len(batch) >= 1000:
+            Notification.objects.bulk_update(batch, ['actor_ids'])
+            batch = []
+    Notification.objects.bulk_update(batch, ['actor_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0011_notification_type_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(backfill_actor_ids, migrations.RunPython.noop),
+    ]
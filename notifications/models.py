@@ -1,5 +1,8 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
 from django.conf import settings
+from django.utils import timezone
 
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
@@ -8,7 +11,8 @@ class Notification(models.Model):
         ('comment', 'Comment'),
     ]
     
-    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
+    # Indexed by the composite (recipient, ...) indexes in Meta
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications', db_index=False)
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_notifications')
     notification_type = models.CharField(max_length=10, choices=NOTIFICATION_TYPES)
     post = models.ForeignKey('posts.Post', on_delete=models.CASCADE, null=True, blank=True)
@@ -16,9 +20,104 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     seen_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Coalesced notifications ("alice and 41 others liked your post") keep
+    # the latest actor in `sender` plus a short list of recent actors.
+    # `actor_ids` holds every actor folded in, so repeats aren't recounted
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)
+    actor_ids = models.JSONField(default=list, blank=True)
+    # Bumped when another actor is folded into the row, so the change shows
+    # up in the list's ordering and in ?since= polls
+    last_activity_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Read backwards for the list's (-created_at, -id) keyset order
+            models.Index(fields=['recipient', 'created_at'], name='notif_recipient_created_idx'),
+            models.Index(fields=['recipient', 'last_activity_at'], name='notif_recipient_activity_idx'),
+            models.Index(fields=['recipient', 'seen_at'], name='notif_recipient_seen_idx'),
+            models.Index(fields=['recipient', 'is_read'], name='notif_recipient_read_idx'),
+            # Retention walks each type's expired rows in (created_at, id) order
+            models.Index(fields=['notification_type', 'created_at'], name='notif_type_created_idx'),
+        ]
         
     def __str__(self):
         return f'{self.sender.username} -> {self.recipient.username}: {self.notification_type}'
+
+class SupabaseOutbox(models.Model):
+    """Notification rows waiting to be mirrored to Supabase, drained in id order by sync_notifications"""
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='outbox_entries')
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        
+    def __str__(self):
+        return f'outbox {self.id} -> notification {self.notification_id}'
+
+class UnreadNotificationCounter(models.Model):
+    """Per-user count of unseen notifications, so the badge is a primary-key lookup"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='unread_notification_counter')
+    unread_count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f'{self.user_id}: {self.unread_count} unread'
+    
+    @classmethod
+    def get_count(cls, user_id):
+        return cls.objects.filter(pk=user_id).values_list('unread_count', flat=True).first() or 0
+    
+    @classmethod
+    def get_counts(cls, user_ids):
+        """{user_id: unread count} for `user_ids`, in one query"""
+        counts = dict(cls.objects.filter(pk__in=user_ids).values_list('user_id', 'unread_count'))
+        return {user_id: counts.get(user_id, 0) for user_id in user_ids}
+    
+    @classmethod
+    def increment(cls, user_id, amount=1):
+        if cls.objects.filter(pk=user_id).update(unread_count=F('unread_count') + amount):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=user_id, unread_count=amount)
+        except IntegrityError:
+            # Created concurrently by another writer
+            cls.objects.filter(pk=user_id).update(unread_count=F('unread_count') + amount)
+    
+    @classmethod
+    def decrement(cls, user_id, amount=1):
+        cls.objects.filter(pk=user_id).update(unread_count=Greatest(F('unread_count') - amount, 0))
+    
+    @classmethod
+    def discount(cls, notifications):
+        """Subtract the unseen rows of `notifications`, which are about to be deleted, from their recipients' counts"""
+        unseen = (
+            notifications.filter(seen_at__isnull=True).order_by()
+            .values('recipient_id').annotate(removed=Count('id'))
+        )
+        for row in unseen:
+            cls.decrement(row['recipient_id'], row['removed'])
+    
+    @classmethod
+    def reset(cls, user_id):
+        cls.objects.update_or_create(user_id=user_id, defaults={'unread_count': 0})
+
+class NotificationArchive(models.Model):
+    """Compact copy of a notification removed by the retention job (plain ids, no foreign keys)"""
+    original_id = models.BigIntegerField(unique=True)
+    recipient_id = models.BigIntegerField(db_index=True)
+    sender_id = models.BigIntegerField()
+    notification_type = models.CharField(max_length=10)
+    post_id = models.BigIntegerField(null=True, blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f'archived {self.notification_type} {self.original_id}'
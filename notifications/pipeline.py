@@ -0,0 +1,120 @@
+"""Single entry point for creating notifications.
+
+``notify`` queues a notification on the current transaction instead of
+inserting it straight away. Duplicates for the same (recipient, sender, type,
+post) are dropped, and once the transaction commits everything queued is
+written with one ``bulk_create``, together with their Supabase outbox rows.
+Likes and follows are folded into existing group rows first (see
+``coalescing``), and connected stream clients are told about the result (see
+``broker``). Nothing is written if the transaction rolls back.
+
+Notifications queued inside a savepoint go into a batch of that savepoint,
+whose flush is registered with ``on_commit`` there, so rolling the savepoint
+back (e.g. one failed job in ``utils.write_queue``) drops exactly what was
+queued inside it.
+"""
+import threading
+from collections import Counter
+from django.db import transaction
+from .models import Notification, UnreadNotificationCounter
+from .supabase_sync import enqueue, notification_payload
+from . import broker
+from . import coalescing
+
+_local = threading.local()
+
+
+def notification_key(notification):
+    return (
+        notification.recipient_id,
+        notification.sender_id,
+        notification.notification_type,
+        notification.post_id,
+    )
+
+
+class NotificationBatch:
+    def __init__(self, savepoint_ids=()):
+        # The savepoints open when the batch's flush was registered
+        self.savepoint_ids = savepoint_ids
+        self.pending = {}
+
+    def add(self, notification):
+        self.pending.setdefault(notification_key(notification), notification)
+
+    def flush(self):
+        batches = getattr(_local, 'batches', [])
+        if self in batches:
+            batches.remove(self)
+        notifications = list(self.pending.values())
+        self.pending = {}
+        if not notifications:
+            return []
+
+        with transaction.atomic():
+            updated = []
+            if coalescing.is_enabled():
+                notifications, updated = coalescing.coalesce(notifications)
+            notifications = Notification.objects.bulk_create(notifications)
+            for recipient_id, created in Counter(n.recipient_id for n in notifications).items():
+                UnreadNotificationCounter.increment(recipient_id, created)
+            enqueue(notifications + updated)
+        
+        counts = UnreadNotificationCounter.get_counts({n.recipient_id for n in notifications + updated})
+        for notification in notifications + updated:
+            broker.publish(notification.recipient_id, {
+                'type': 'notification',
+                'notification': notification_payload(notification),
+                'unread_count': counts[notification.recipient_id],
+            })
+        return notifications + updated
+
+
+def _live_batches(connection):
+    """Batches queued on the open transaction.
+
+    A batch whose flush callback is no longer registered belonged to a
+    transaction or savepoint that was rolled back, so it is discarded.
+    """
+    callbacks = [entry[1] for entry in connection.run_on_commit]
+    batches = _local.batches = [batch for batch in getattr(_local, 'batches', []) if batch.flush in callbacks]
+    return batches
+
+
+def _queue(connection, notification):
+    batches = _live_batches(connection)
+    # A live batch commits whenever this savepoint does: it was queued in
+    # this savepoint, an enclosing one, or an inner one already released
+    if any(notification_key(notification) in batch.pending for batch in batches):
+        return
+
+    savepoint_ids = tuple(connection.savepoint_ids)
+    batch = next((batch for batch in batches if batch.savepoint_ids == savepoint_ids), None)
+    if batch is None:
+        batch = NotificationBatch(savepoint_ids)
+        transaction.on_commit(batch.flush, robust=True)
+        batches.append(batch)
+    batch.add(notification)
+
+
+def notify(recipient, sender, notification_type, message, post=None):
+    """Queue a notification for `recipient`. Notifying yourself is a no-op."""
+    if recipient.pk == sender.pk:
+        return
+
+    notification = Notification(
+        recipient=recipient,
+        sender=sender,
+        notification_type=notification_type,
+        post=post,
+        message=message,
+    )
+
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        batch = NotificationBatch()
+        batch.add(notification)
+        batch.flush()
+        return
+
+    _queue(connection, notification)
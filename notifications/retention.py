@@ -0,0 +1,119 @@
+"""Retention policies for notifications.
+
+``NOTIFICATION_RETENTION`` maps a notification type to how many days it is
+kept and whether only read notifications may be removed (a notification
+counts as read once it has been read or seen). Expired rows are moved out in
+small chunks, each in its own short transaction, so the job never holds long
+locks and can be stopped and restarted at any point: whatever has not been
+moved yet is simply picked up by the next run.
+
+Each type's expired rows are walked along the (notification_type,
+created_at) index with a (created_at, id) keyset, so a chunk reads only its
+own rows and rows that are kept (unread) are stepped over once, not re-read
+by every chunk. A chunk's ids are picked before its write transaction opens;
+inside it they are re-checked by primary key, so the write lock is held only
+for the copy and delete.
+"""
+import json
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Notification, NotificationArchive, UnreadNotificationCounter
+
+DEFAULT_POLICIES = {
+    'like': {'days': 30, 'only_read': True},
+    'comment': {'days': 90, 'only_read': True},
+    'follow': {'days': 180, 'only_read': False},
+}
+
+ARCHIVED_FIELDS = ['id', 'recipient_id', 'sender_id', 'notification_type', 'post_id', 'actor_count', 'created_at', 'seen_at']
+
+
+def policies():
+    return getattr(settings, 'NOTIFICATION_RETENTION', DEFAULT_POLICIES)
+
+
+def expired(notification_type, policy, now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=policy['days'])
+    queryset = Notification.objects.filter(notification_type=notification_type, created_at__lt=cutoff)
+    if policy.get('only_read'):
+        queryset = queryset.filter(Q(is_read=True) | Q(seen_at__isnull=False))
+    return queryset
+
+
+def after(queryset, position):
+    """Rows of `queryset` past the (created_at, id) `position`"""
+    if position is None:
+        return queryset
+    created_at, pk = position
+    # created_at__gte bounds the index range; ties on created_at are cut by id
+    return queryset.filter(created_at__gte=created_at).exclude(created_at=created_at, id__lte=pk)
+
+
+def row_record(row):
+    return {
+        'id': row['id'],
+        'recipient_id': row['recipient_id'],
+        'sender_id': row['sender_id'],
+        'notification_type': row['notification_type'],
+        'post_id': row['post_id'],
+        'actor_count': row['actor_count'],
+        'created_at': row['created_at'].isoformat(),
+    }
+
+
+def purge_chunk(queryset, chunk_size, position=None, archive=True, export_file=None):
+    """Move the next chunk of `queryset` after `position` out of the notifications table.
+
+    Rows are copied to NotificationArchive (when `archive`) and/or appended to
+    `export_file` as JSON lines, then deleted. Returns (rows, bytes, position)
+    where bytes is the size of the removed rows' data as exported and
+    position is where the next chunk starts, None once there are no more.
+    """
+    # Read outside the transaction: no write lock while the index is walked
+    candidates = list(
+        after(queryset, position).order_by('created_at', 'id').values_list('created_at', 'id')[:chunk_size]
+    )
+    if not candidates:
+        return 0, 0, None
+    position = candidates[-1]
+
+    with transaction.atomic():
+        # Re-checked by primary key: a row may have changed since it was picked
+        rows = list(queryset.filter(id__in=[pk for _, pk in candidates]).order_by('id').values(*ARCHIVED_FIELDS))
+        if not rows:
+            return 0, 0, position
+
+        records = [row_record(row) for row in rows]
+        reclaimed = sum(len(json.dumps(record)) for record in records)
+
+        if export_file is not None:
+            # Written before the delete commits: a crash can only duplicate
+            # lines (ids are unique), never lose rows
+            export_file.write(''.join(json.dumps(record) + '\n' for record in records))
+            export_file.flush()
+
+        if archive:
+            NotificationArchive.objects.bulk_create([
+                NotificationArchive(
+                    original_id=row['id'],
+                    recipient_id=row['recipient_id'],
+                    sender_id=row['sender_id'],
+                    notification_type=row['notification_type'],
+                    post_id=row['post_id'],
+                    actor_count=row['actor_count'],
+                    created_at=row['created_at'],
+                )
+                for row in rows
+            ], ignore_conflicts=True)
+
+        Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+
+        unseen = Counter(row['recipient_id'] for row in rows if row['seen_at'] is None)
+        for recipient_id, removed in unseen.items():
+            UnreadNotificationCounter.decrement(recipient_id, removed)
+
+    return len(rows), reclaimed, position
@@ -1,18 +1,20 @@
 from rest_framework import serializers
 from .models import Notification
-from users.serializers import UserSerializer
+from users.serializers import UserSummarySerializer
 from django.utils import timezone
 from datetime import datetime
 
 class NotificationSerializer(serializers.ModelSerializer):
-    sender = UserSerializer(read_only=True)
+    sender = UserSummarySerializer(read_only=True)
     time_ago = serializers.SerializerMethodField()
     post_thumbnail = serializers.SerializerMethodField()
     
     class Meta:
         model = Notification
-        fields = ['id', 'sender', 'notification_type', 'post', 'message', 'is_read', 'seen_at', 'created_at', 'time_ago', 'post_thumbnail']
-        read_only_fields = ['id', 'sender', 'notification_type', 'post', 'message', 'created_at']
+        fields = ['id', 'sender', 'notification_type', 'post', 'message', 'is_read', 'seen_at', 'created_at', 'time_ago', 'post_thumbnail',
+                  'actor_count', 'recent_actors', 'last_activity_at']
+        read_only_fields = ['id', 'sender', 'notification_type', 'post', 'message', 'created_at', 'actor_count', 'recent_actors',
+                            'last_activity_at']
     
     def get_time_ago(self, obj):
         now = timezone.now()
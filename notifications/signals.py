@@ -1,50 +1,51 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
-from posts.models import Like, Comment
-from users.models import Follow
-from .models import Notification
-from .supabase_sync import sync_to_supabase
+from posts.models import Like, Comment, Post
+from users.models import Follow, User
+from .models import Notification, UnreadNotificationCounter
+from .pipeline import notify
 
 @receiver(post_save, sender=Follow)
 def create_follow_notification(sender, instance, created, **kwargs):
     if created:
-        try:
-            notification = Notification.objects.create(
-                recipient=instance.following,
-                sender=instance.follower,
-                notification_type='follow',
-                message=f'{instance.follower.username} started following you'
-            )
-            sync_to_supabase(notification)
-        except Exception as e:
-            print(f"ERROR: Failed to create follow notification: {e}")
+        notify(
+            recipient=instance.following,
+            sender=instance.follower,
+            notification_type='follow',
+            message=f'{instance.follower.username} started following you'
+        )
 
 @receiver(post_save, sender=Like)
 def create_like_notification(sender, instance, created, **kwargs):
-    if created and instance.post.author != instance.user:
-        try:
-            notification = Notification.objects.create(
-                recipient=instance.post.author,
-                sender=instance.user,
-                notification_type='like',
-                post=instance.post,
-                message=f'{instance.user.username} liked your post'
-            )
-            sync_to_supabase(notification)
-        except Exception as e:
-            print(f"ERROR: Failed to create like notification: {e}")
+    if created:
+        notify(
+            recipient=instance.post.author,
+            sender=instance.user,
+            notification_type='like',
+            post=instance.post,
+            message=f'{instance.user.username} liked your post'
+        )
 
 @receiver(post_save, sender=Comment)
 def create_comment_notification(sender, instance, created, **kwargs):
-    if created and instance.post.author != instance.author:
-        try:
-            notification = Notification.objects.create(
-                recipient=instance.post.author,
-                sender=instance.author,
-                notification_type='comment',
-                post=instance.post,
-                message=f'{instance.author.username} commented on your post'
-            )
-            sync_to_supabase(notification)
-        except Exception as e:
-            print(f"ERROR: Failed to create comment notification: {e}")
\ No newline at end of file
+    if created:
+        notify(
+            recipient=instance.post.author,
+            sender=instance.author,
+            notification_type='comment',
+            post=instance.post,
+            message=f'{instance.author.username} commented on your post'
+        )
+
+# Notifications removed by a cascade are never seen, so their recipients'
+# badges are brought down before the delete runs (in the same transaction)
+@receiver(pre_delete, sender=Post)
+def discount_notifications_of_deleted_post(sender, instance, **kwargs):
+    UnreadNotificationCounter.discount(Notification.objects.filter(post=instance))
+
+@receiver(pre_delete, sender=User)
+def discount_notifications_of_deleted_user(sender, instance, **kwargs):
+    # Their own counter goes with them; their posts are handled above
+    UnreadNotificationCounter.discount(
+        Notification.objects.filter(sender=instance).exclude(recipient=instance).exclude(post__author=instance)
+    )
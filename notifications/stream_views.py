@@ -0,0 +1,81 @@
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from authentication.cached_auth import CachedJWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from .broker import get_broker
+from .models import UnreadNotificationCounter
+
+
+def server_sent_event(event_type, data):
+    return f'event: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+
+class NotificationEventStream:
+    """Async iterator of SSE chunks for one connected client.
+
+    Django calls close() on streaming content when the response finishes,
+    which is what drops the broker subscription.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.subscription = get_broker().subscribe(user_id)
+        self.heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT_SECONDS', 15)
+        self.deadline = time.monotonic() + getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300)
+
+    def __aiter__(self):
+        return self.events()
+
+    async def events(self):
+        try:
+            unread = await sync_to_async(UnreadNotificationCounter.get_count)(self.user_id)
+            yield server_sent_event('unread_count', {'unread_count': unread})
+            while time.monotonic() < self.deadline:
+                try:
+                    event = await asyncio.wait_for(self.subscription.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                yield server_sent_event(event['type'], event)
+        finally:
+            self.close()
+
+    def close(self):
+        self.subscription.close()
+
+
+async def authenticate_stream(request):
+    """Resolve the user from a Bearer header or, for EventSource clients, ?token="""
+    authentication = CachedJWTAuthentication()
+    raw_token = request.GET.get('token')
+    header = request.META.get('HTTP_AUTHORIZATION')
+    if header:
+        raw_token = authentication.get_raw_token(header.encode()) or raw_token
+    if not raw_token:
+        return None
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        return await sync_to_async(authentication.get_user)(validated_token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def notification_stream(request):
+    """Server-sent events with new notifications and unread-count changes.
+
+    Needs an ASGI server (uvicorn/daphne): each open stream is a coroutine
+    waiting on an asyncio queue. Streams end after NOTIFICATION_STREAM_MAX_SECONDS
+    and EventSource reconnects on its own.
+    """
+    user = await authenticate_stream(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    response = StreamingHttpResponse(NotificationEventStream(user.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,41 +1,153 @@
+"""Mirror notifications to Supabase for real-time delivery.
+
+Notifications are never sent from the request that creates them. ``enqueue``
+writes them to the ``SupabaseOutbox`` table in the same transaction, and the
+``sync_notifications`` command drains the outbox in id order, sending batched
+array upserts over one pooled HTTP session and backing off when Supabase is
+slow or down.
+"""
 import requests
 from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from datetime import timedelta
+from requests.adapters import HTTPAdapter
+from .models import SupabaseOutbox
+
+_session = None
+
+
+class SupabaseSyncError(Exception):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def is_configured():
+    return bool(getattr(settings, 'SUPABASE_URL', None) and getattr(settings, 'SUPABASE_SERVICE_KEY', None))
+
+
+def get_session():
+    """Process-wide HTTP session so the TLS connection to Supabase is reused"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        _session = session
+    return _session
+
+
+def notification_payload(notification):
+    return {
+        'id': notification.id,
+        'recipient_id': notification.recipient_id,
+        'sender_id': notification.sender_id,
+        'notification_type': notification.notification_type,
+        'post_id': notification.post_id,
+        'message': notification.message,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def enqueue(notifications):
+    """Queue notifications for sync. Call inside the transaction that writes them."""
+    if not is_configured():
+        return
+    SupabaseOutbox.objects.bulk_create([
+        SupabaseOutbox(notification=notification, payload=notification_payload(notification))
+        for notification in notifications
+    ])
+
+
+def send_batch(payloads, session=None):
+    """Upsert a list of notification payloads in a single request"""
+    supabase_key = settings.SUPABASE_SERVICE_KEY
+    url = f"{settings.SUPABASE_URL}/rest/v1/notifications_notification"
+    headers = {
+        'apikey': supabase_key,
+        'Authorization': f'Bearer {supabase_key}',
+        'Content-Type': 'application/json',
+        'Prefer': 'return=minimal,resolution=merge-duplicates'
+    }
+    timeout = getattr(settings, 'SUPABASE_SYNC_TIMEOUT', 10)
 
-def sync_to_supabase(notification):
-    """Sync notification to Supabase for real-time"""
     try:
-        supabase_url = getattr(settings, 'SUPABASE_URL', None)
-        supabase_key = getattr(settings, 'SUPABASE_SERVICE_KEY', None)
-        
-        if not supabase_url or not supabase_key:
-            print("Supabase credentials not configured - skipping sync")
-            return
-            
-        url = f"{supabase_url}/rest/v1/notifications_notification"
-        headers = {
-            'apikey': supabase_key,
-            'Authorization': f'Bearer {supabase_key}',
-            'Content-Type': 'application/json',
-            'Prefer': 'return=minimal'
-        }
-        
-        data = {
-            'recipient_id': notification.recipient.id,
-            'sender_id': notification.sender.id if notification.sender else None,
-            'notification_type': notification.notification_type,
-            'post_id': notification.post.id if notification.post else None,
-            'message': notification.message,
-            'is_read': notification.is_read,
-            'created_at': notification.created_at.isoformat()
-        }
-        
-        response = requests.post(url, json=data, headers=headers, timeout=5)
-        if response.status_code in [200, 201]:
-            print(f"SUCCESS: Notification synced to Supabase: {notification.notification_type}")
-        else:
-            print(f"WARNING: Supabase sync failed: {response.status_code} - {response.text}")
-        
+        response = (session or get_session()).post(url, json=payloads, headers=headers, timeout=timeout)
     except requests.exceptions.RequestException as e:
-        print(f"WARNING: Supabase sync network error: {e}")
-    except Exception as e:
-        print(f"WARNING: Supabase sync error: {e}")
\ No newline at end of file
+        raise SupabaseSyncError(f'Network error: {e}')
+
+    if response.status_code not in [200, 201, 204]:
+        retryable = response.status_code >= 500 or response.status_code in [408, 429]
+        raise SupabaseSyncError(f'{response.status_code} - {response.text[:200]}', retryable=retryable)
+
+
+def backoff_delay(attempts):
+    base = getattr(settings, 'SUPABASE_SYNC_BACKOFF_SECONDS', 1)
+    ceiling = getattr(settings, 'SUPABASE_SYNC_MAX_BACKOFF_SECONDS', 300)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), ceiling))
+
+
+def record_failure(entries, error, now):
+    """Back the entries off after a retryable error, or mark them failed for good"""
+    attempts = entries[0].attempts + 1
+    max_attempts = getattr(settings, 'SUPABASE_SYNC_MAX_ATTEMPTS', 10)
+    failure = {'attempts': F('attempts') + 1, 'last_error': str(error)}
+    if error.retryable and attempts < max_attempts:
+        failure['next_attempt_at'] = now + backoff_delay(attempts)
+    else:
+        failure['failed_at'] = now
+    SupabaseOutbox.objects.filter(id__in=[entry.id for entry in entries]).update(**failure)
+
+
+def send_each(entries, now, session=None):
+    """Send entries one request each, so a row Supabase rejects fails on its own. Returns the number delivered."""
+    delivered = 0
+    for position, entry in enumerate(entries):
+        try:
+            send_batch([entry.payload], session=session)
+        except SupabaseSyncError as e:
+            if e.retryable:
+                # Supabase itself is struggling: the rest waits, in order
+                record_failure(entries[position:], e, now)
+                raise
+            record_failure([entry], e, now)
+            continue
+        entry.delete()
+        delivered += 1
+    return delivered
+
+
+def drain_once(batch_size=100, session=None):
+    """Send the oldest pending outbox rows as one batch.
+
+    Returns the number of rows delivered. Nothing is sent while the oldest row
+    is backing off, so notifications always reach Supabase in creation order.
+    Raises SupabaseSyncError after recording the failure on the batch. When
+    Supabase rejects a batch outright (a non-retryable 4xx) the rows are
+    resent one at a time, so only the rows it rejects are marked failed.
+    """
+    entries = list(SupabaseOutbox.objects.filter(failed_at__isnull=True).order_by('id')[:batch_size])
+    now = timezone.now()
+    if not entries or entries[0].next_attempt_at > now:
+        return 0
+
+    try:
+        send_batch([entry.payload for entry in entries], session=session)
+    except SupabaseSyncError as e:
+        if not e.retryable and len(entries) > 1:
+            return send_each(entries, now, session=session)
+        record_failure(entries, e, now)
+        raise
+
+    SupabaseOutbox.objects.filter(id__in=[entry.id for entry in entries]).delete()
+    return len(entries)
+
+
+def next_attempt_in():
+    """Seconds until the oldest pending row may be retried, or None if the outbox is empty"""
+    head = SupabaseOutbox.objects.filter(failed_at__isnull=True).order_by('id').first()
+    if head is None:
+        return None
+    return max(0, (head.next_attempt_at - timezone.now()).total_seconds())
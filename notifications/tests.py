@@ -1,3 +1,567 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+from unittest import skipUnless
+from unittest.mock import patch
+import threading
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from posts.models import Comment, Post
+from users.models import User
+from .models import Notification, NotificationArchive, SupabaseOutbox, UnreadNotificationCounter
+from .pipeline import notify
+from . import supabase_sync
+from .broker import Broker, UnixSocketBackend, get_broker
+from utils.pagination import KeysetPagination
+from utils.query_plans import plan_problems
+from datetime import timedelta
 
-# Create your tests here.
+
+def make_user(username):
+    return User.objects.create_user(email=f'{username}@example.com', username=username, password='pass12345')
+
+
+class NotificationPipelineTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.post = Post.objects.create(author=self.alice, content='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+
+    def test_like_and_comment_create_one_notification_each(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.id}/comments/', {'content': 'nice'})
+
+        types = sorted(Notification.objects.filter(recipient=self.alice).values_list('notification_type', flat=True))
+        self.assertEqual(types, ['comment', 'like'])
+
+    def test_notifications_are_deferred_and_deduplicated(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            with transaction.atomic():
+                notify(self.alice, self.bob, 'like', 'bob liked your post', post=self.post)
+                notify(self.alice, self.bob, 'like', 'bob liked your post', post=self.post)
+                notify(self.bob, self.alice, 'follow', 'alice started following you')
+                self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(len(callbacks), 1)
+        with CaptureQueriesContext(connection) as ctx:
+            callbacks[0]()
+
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "notifications_notification"')]
+        self.assertEqual(len(inserts), 1)
+        # Unread counts for the stream are read once for all recipients
+        count_reads = [q for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'notifications_unreadnotificationcounter' in q['sql']]
+        self.assertEqual(len(count_reads), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_rolled_back_notifications_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    notify(self.alice, self.bob, 'follow', 'bob started following you')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            with transaction.atomic():
+                notify(self.alice, self.bob, 'like', 'bob liked your post', post=self.post)
+
+        self.assertEqual(list(Notification.objects.values_list('notification_type', flat=True)), ['like'])
+
+    def test_rolled_back_savepoint_drops_only_its_notifications(self):
+        carol = make_user('carol')
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                notify(self.alice, self.bob, 'follow', 'bob started following you')
+                with transaction.atomic():
+                    Comment.objects.create(post=self.post, author=self.bob, content='kept')
+                try:
+                    with transaction.atomic():
+                        Comment.objects.create(post=self.post, author=carol, content='rolled back')
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+
+        self.assertEqual(Comment.objects.count(), 1)
+        notifications = Notification.objects.order_by('notification_type').values_list('notification_type', 'sender__username')
+        self.assertEqual(list(notifications), [('comment', 'bob'), ('follow', 'bob')])
+
+    def test_self_notifications_are_skipped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.alice, self.alice, 'like', 'alice liked your post', post=self.post)
+        self.assertFalse(Notification.objects.exists())
+
+
+class NotificationCoalescingTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.post = Post.objects.create(author=self.alice, content='viral')
+        self.fans = [make_user(f'fan{i}') for i in range(5)]
+
+    def like(self, fan, post=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.alice, fan, 'like', f'{fan.username} liked your post', post=post or self.post)
+
+    def test_likes_on_same_post_fold_into_one_group(self):
+        for fan in self.fans:
+            self.like(fan)
+
+        group = Notification.objects.get(recipient=self.alice)
+        self.assertEqual(group.actor_count, 5)
+        self.assertEqual(group.sender, self.fans[-1])
+        self.assertEqual([actor['username'] for actor in group.recent_actors], ['fan4', 'fan3', 'fan2'])
+        self.assertEqual(group.message, 'fan4 and 4 others liked your post')
+
+    def test_repeat_actor_is_not_counted_twice(self):
+        self.like(self.fans[0])
+        self.like(self.fans[1])
+        self.like(self.fans[0])
+
+        group = Notification.objects.get(recipient=self.alice)
+        self.assertEqual(group.actor_count, 2)
+        self.assertEqual(group.message, 'fan1 and fan0 liked your post')
+
+    def test_actor_who_dropped_out_of_recent_actors_is_not_recounted(self):
+        for fan in self.fans[:4]:
+            self.like(fan)
+        # fan0 unlikes and likes again after fan1..fan3 pushed them out
+        self.like(self.fans[0])
+
+        group = Notification.objects.get(recipient=self.alice)
+        self.assertEqual(group.actor_count, 4)
+        self.assertEqual(group.message, 'fan3 and 3 others liked your post')
+
+    def test_fold_bumps_activity_and_marks_unread(self):
+        self.like(self.fans[0])
+        group = Notification.objects.get(recipient=self.alice)
+        Notification.objects.filter(pk=group.pk).update(is_read=True, last_activity_at=group.created_at - timedelta(minutes=5))
+        self.like(self.fans[1])
+
+        group.refresh_from_db()
+        self.assertGreater(group.last_activity_at, group.created_at)
+        self.assertFalse(group.is_read)
+
+    def test_seen_group_starts_a_new_one(self):
+        self.like(self.fans[0])
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        client.patch('/api/notifications/mark-seen/')
+        self.like(self.fans[1])
+
+        self.assertEqual(Notification.objects.filter(recipient=self.alice).count(), 2)
+        self.assertEqual(client.get('/api/notifications/unread-count/').data['unread_count'], 1)
+
+    def test_other_posts_and_comments_are_not_folded(self):
+        other_post = Post.objects.create(author=self.alice, content='other')
+        self.like(self.fans[0])
+        self.like(self.fans[1], post=other_post)
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.alice, self.fans[2], 'comment', 'fan2 commented on your post', post=self.post)
+            notify(self.alice, self.fans[3], 'comment', 'fan3 commented on your post', post=self.post)
+
+        self.assertEqual(Notification.objects.filter(recipient=self.alice).count(), 4)
+
+    @override_settings(NOTIFICATION_COALESCING=False)
+    def test_coalescing_can_be_disabled(self):
+        self.like(self.fans[0])
+        self.like(self.fans[1])
+        self.assertEqual(Notification.objects.filter(recipient=self.alice).count(), 2)
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.post = Post.objects.create(author=self.alice, content='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def unread(self):
+        return self.client.get('/api/notifications/unread-count/').data['unread_count']
+
+    def test_counter_follows_creation_and_mark_seen(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.alice, self.bob, 'comment', 'bob commented on your post', post=self.post)
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.alice, self.bob, 'follow', 'bob started following you')
+        self.assertEqual(self.unread(), 2)
+
+        self.client.patch('/api/notifications/mark-seen/')
+        self.assertEqual(self.unread(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.alice, self.bob, 'like', 'bob liked your post', post=self.post)
+        self.assertEqual(self.unread(), 1)
+        self.client.post('/api/notifications/mark-all-read/')
+        self.assertEqual(self.unread(), 0)
+
+    def test_cascaded_deletes_are_subtracted(self):
+        carol = make_user('carol')
+        other = Post.objects.create(author=self.alice, content='another')
+        for actor, post in ((self.bob, self.post), (carol, other)):
+            client = APIClient()
+            client.force_authenticate(actor)
+            with self.captureOnCommitCallbacks(execute=True):
+                client.post(f'/api/posts/{post.id}/like/')
+        self.assertEqual(self.unread(), 2)
+
+        self.client.delete(f'/api/posts/{self.post.id}/')
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertEqual(self.unread(), 1)
+
+        carol.delete()
+        self.assertEqual(self.unread(), 0)
+
+    def test_unread_count_is_a_single_lookup(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.unread()
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_reconcile_fixes_drift(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.alice, self.bob, 'follow', 'bob started following you')
+        UnreadNotificationCounter.objects.update(unread_count=9)
+        Notification.objects.create(recipient=self.bob, sender=self.alice, notification_type='follow', message='x')
+
+        call_command('reconcile_unread_counts', stdout=StringIO())
+
+        self.assertEqual(UnreadNotificationCounter.get_count(self.alice.id), 1)
+        self.assertEqual(UnreadNotificationCounter.get_count(self.bob.id), 1)
+
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.token = str(RefreshToken.for_user(self.alice).access_token)
+
+    def notify_alice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.alice, self.bob, 'follow', 'bob started following you')
+
+    async def test_stream_pushes_notifications_and_unread_counts(self):
+        response = await self.async_client.get('/api/notifications/stream/', {'token': self.token})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+
+        first = (await anext(events)).decode()
+        self.assertIn('event: unread_count', first)
+        self.assertIn('"unread_count": 0', first)
+
+        await sync_to_async(self.notify_alice)()
+        pushed = (await asyncio.wait_for(anext(events), timeout=5)).decode()
+        self.assertIn('event: notification', pushed)
+        self.assertIn('bob started following you', pushed)
+        self.assertIn('"unread_count": 1', pushed)
+        await events.aclose()
+        response.close()
+        self.assertEqual(get_broker().connection_count(), 0)
+
+    async def test_stream_requires_a_valid_token(self):
+        response = await self.async_client.get('/api/notifications/stream/', {'token': 'garbage'})
+        self.assertEqual(response.status_code, 401)
+
+
+class UnixSocketBackendTests(TestCase):
+    async def test_events_fan_out_between_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            receiving = Broker(UnixSocketBackend(directory, name='worker-a'))
+            sending = Broker(UnixSocketBackend(directory, name='worker-b'))
+            subscription = receiving.subscribe(42)
+            try:
+                sending.publish(42, {'type': 'unread_count', 'unread_count': 3})
+                event = await asyncio.wait_for(subscription.get(), timeout=5)
+                self.assertEqual(event['unread_count'], 3)
+            finally:
+                subscription.close()
+                receiving.backend.close()
+                sending.backend.close()
+
+
+class NotificationListTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.senders = [make_user(f'sender{i}') for i in range(3)]
+        self.notifications = [
+            Notification.objects.create(
+                recipient=self.alice,
+                sender=self.senders[i % 3],
+                notification_type='comment',
+                post=Post.objects.create(author=self.alice, content=str(i), image_url=f'http://example.com/{i}.jpg'),
+                message='commented on your post',
+            )
+            for i in range(45)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_cursor_pages_through_whole_history(self):
+        seen = []
+        response = self.client.get('/api/notifications/')
+        while True:
+            seen += [n['id'] for n in response.data['results']]
+            if not response.data['has_next']:
+                break
+            response = self.client.get('/api/notifications/', {'cursor': response.data['next_cursor']})
+
+        self.assertEqual(seen, [n.id for n in reversed(self.notifications)])
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        counts = []
+        for page_size in (5, 20):
+            with patch.object(KeysetPagination, 'page_size', page_size):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get('/api/notifications/')
+            self.assertEqual(len(response.data['results']), page_size)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_since_returns_only_newer_notifications(self):
+        response = self.client.get('/api/notifications/', {'since': self.notifications[-3].id})
+        self.assertEqual([n['id'] for n in response.data['results']], [n.id for n in reversed(self.notifications[-2:])])
+        self.assertEqual(response.data['results'][0]['sender']['username'], self.senders[44 % 3].username)
+
+    def test_folded_activity_reaches_pollers_and_moves_to_the_top(self):
+        post = self.notifications[0].post
+        bob, carol = make_user('bob'), make_user('carol')
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.alice, bob, 'like', 'bob liked your post', post=post)
+        group = self.client.get('/api/notifications/').data['results'][0]
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.alice, self.senders[0], 'comment', 'sender0 commented on your post', post=post)
+        with self.captureOnCommitCallbacks(execute=True):
+            notify(self.alice, carol, 'like', 'carol liked your post', post=post)
+
+        self.assertEqual(self.client.get('/api/notifications/').data['results'][0]['id'], group['id'])
+        for since in (group['id'], group['last_activity_at']):
+            results = self.client.get('/api/notifications/', {'since': since}).data['results']
+            self.assertEqual([n['message'] for n in results], ['carol and bob liked your post', 'sender0 commented on your post'])
+
+
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.post = Post.objects.create(author=self.alice, content='hello')
+
+    def make_notification(self, notification_type, age_days, seen=False):
+        notification = Notification.objects.create(
+            recipient=self.alice, sender=self.bob, notification_type=notification_type,
+            post=self.post, message='m', seen_at=timezone.now() if seen else None,
+        )
+        Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(days=age_days))
+        if not seen:
+            UnreadNotificationCounter.increment(self.alice.id)
+        return notification
+
+    def test_purge_archives_expired_rows_only(self):
+        old_read_like = self.make_notification('like', 40, seen=True)
+        self.make_notification('like', 40)          # unread: kept
+        self.make_notification('like', 5, seen=True)  # too young: kept
+        old_follow = self.make_notification('follow', 200)
+        out = StringIO()
+
+        call_command('purge_notifications', '--chunk-size', '1', stdout=out)
+
+        self.assertFalse(Notification.objects.filter(pk__in=[old_read_like.pk, old_follow.pk]).exists())
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(
+            set(NotificationArchive.objects.values_list('original_id', flat=True)),
+            {old_read_like.pk, old_follow.pk},
+        )
+        self.assertEqual(UnreadNotificationCounter.get_count(self.alice.id), 1)
+        self.assertIn('Removed 2 notifications in 2 chunks', out.getvalue())
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+    def test_purge_walks_the_index_past_kept_rows(self):
+        for _ in range(3):
+            self.make_notification('like', 40)          # unread: kept
+            self.make_notification('like', 40, seen=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('purge_notifications', '--chunk-size', '2', stdout=StringIO())
+
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(plan_problems(queries.captured_queries), [])
+        # One read per chunk: likes in two chunks plus the empty read that ends
+        # them, then one empty read each for comments and follows
+        picks = [q for q in queries.captured_queries if q['sql'].startswith('SELECT "notifications_notification"."created_at"')]
+        self.assertEqual(len(picks), 3 + 1 + 1)
+
+    def test_purge_resumes_and_exports(self):
+        for _ in range(3):
+            self.make_notification('follow', 200)
+        with tempfile.NamedTemporaryFile('r', suffix='.jsonl') as export:
+            call_command('purge_notifications', '--chunk-size', '2', '--max-chunks', '1',
+                         '--no-archive', '--export', export.name, stdout=StringIO())
+            self.assertEqual(Notification.objects.count(), 1)
+
+            call_command('purge_notifications', '--no-archive', '--export', export.name, stdout=StringIO())
+            lines = [json.loads(line) for line in export.read().splitlines()]
+
+        self.assertEqual(Notification.objects.count(), 0)
+        self.assertEqual(len(lines), 3)
+        self.assertFalse(NotificationArchive.objects.exists())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.notifications = [
+            Notification.objects.create(recipient=self.alice, sender=self.bob, notification_type='comment', message=str(i))
+            for i in range(25)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def assertIndexed(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(plan_problems(queries.captured_queries), [])
+
+    def test_list(self):
+        response = self.client.get('/api/notifications/')
+        self.assertIndexed('get', '/api/notifications/', {'cursor': response.data['next_cursor']})
+
+    def test_list_since(self):
+        self.assertIndexed('get', '/api/notifications/', {'since': self.notifications[10].id})
+
+    def test_unread_count(self):
+        self.assertIndexed('get', '/api/notifications/unread-count/')
+
+    def test_mark_seen(self):
+        self.assertIndexed('patch', '/api/notifications/mark-seen/')
+
+    def test_mark_all_read(self):
+        self.assertIndexed('post', '/api/notifications/mark-all-read/')
+
+
+class StandInSupabase(BaseHTTPRequestHandler):
+    """Local stand-in for the Supabase REST endpoint"""
+    statuses = []
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        status = self.statuses.pop(0) if self.statuses else 201
+        if status < 300:
+            self.received.append((self.path, json.loads(body)))
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class SupabaseOutboxTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = HTTPServer(('127.0.0.1', 0), StandInSupabase)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StandInSupabase.statuses = []
+        StandInSupabase.received = []
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.settings_override = override_settings(
+            SUPABASE_URL=f'http://127.0.0.1:{self.server.server_port}',
+            SUPABASE_SERVICE_KEY='service-key',
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def create_notifications(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for i in range(count):
+                    post = Post.objects.create(author=self.alice, content=str(i))
+                    notify(self.alice, self.bob, 'like', 'bob liked your post', post=post)
+
+    def test_outbox_is_written_with_notifications_and_drained_in_order(self):
+        self.create_notifications(5)
+        self.assertEqual(SupabaseOutbox.objects.count(), 5)
+
+        self.assertEqual(supabase_sync.drain_once(batch_size=3), 3)
+        self.assertEqual(supabase_sync.drain_once(batch_size=3), 2)
+        self.assertEqual(supabase_sync.drain_once(batch_size=3), 0)
+
+        self.assertEqual([path for path, _ in StandInSupabase.received], ['/rest/v1/notifications_notification'] * 2)
+        sent_ids = [row['id'] for _, batch in StandInSupabase.received for row in batch]
+        self.assertEqual(sent_ids, list(Notification.objects.order_by('id').values_list('id', flat=True)))
+        self.assertFalse(SupabaseOutbox.objects.exists())
+
+    def test_server_errors_back_off_and_retry(self):
+        self.create_notifications(2)
+        StandInSupabase.statuses = [503]
+
+        with self.assertRaises(supabase_sync.SupabaseSyncError):
+            supabase_sync.drain_once()
+        self.assertEqual(supabase_sync.drain_once(), 0)
+        self.assertGreater(supabase_sync.next_attempt_in(), 0)
+
+        SupabaseOutbox.objects.update(next_attempt_at=timezone.now())
+        call_command('sync_notifications', stdout=StringIO())
+        self.assertEqual(len(StandInSupabase.received), 1)
+        self.assertFalse(SupabaseOutbox.objects.exists())
+
+    def test_client_errors_are_not_retried(self):
+        self.create_notifications(1)
+        StandInSupabase.statuses = [400]
+
+        with self.assertRaises(supabase_sync.SupabaseSyncError):
+            supabase_sync.drain_once()
+        self.assertIsNotNone(SupabaseOutbox.objects.get().failed_at)
+        self.assertIsNone(supabase_sync.next_attempt_in())
+
+    def test_rejected_batch_fails_only_the_bad_row(self):
+        self.create_notifications(3)
+        bad = SupabaseOutbox.objects.order_by('id')[1]
+        # The batch is rejected as a whole, then retried row by row
+        StandInSupabase.statuses = [400, 201, 400, 201]
+
+        self.assertEqual(supabase_sync.drain_once(), 2)
+
+        self.assertEqual(list(SupabaseOutbox.objects.values_list('id', flat=True)), [bad.id])
+        self.assertIsNotNone(SupabaseOutbox.objects.get().failed_at)
+        sent_ids = [row['id'] for _, batch in StandInSupabase.received for row in batch]
+        self.assertNotIn(bad.notification_id, sent_ids)
+        self.assertEqual(len(sent_ids), 2)
+
+    def test_server_error_while_isolating_backs_off_the_rest(self):
+        self.create_notifications(3)
+        StandInSupabase.statuses = [400, 201, 503]
+
+        with self.assertRaises(supabase_sync.SupabaseSyncError):
+            supabase_sync.drain_once()
+
+        pending = SupabaseOutbox.objects.order_by('id')
+        self.assertEqual(pending.count(), 2)
+        self.assertTrue(all(entry.failed_at is None and entry.attempts == 1 for entry in pending))
+        self.assertGreater(supabase_sync.next_attempt_in(), 0)
+
+    @override_settings(SUPABASE_URL='')
+    def test_nothing_is_queued_without_credentials(self):
+        self.create_notifications(1)
+        self.assertFalse(SupabaseOutbox.objects.exists())
@@ -2,28 +2,67 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from .models import Notification
+from django.utils.dateparse import parse_datetime
+from django.db import transaction
+from .models import Notification, UnreadNotificationCounter
 from .serializers import NotificationSerializer
+from .broker import publish
+from utils.pagination import KeysetPagination
+
+def publish_unread_count(user_id, count):
+    transaction.on_commit(lambda: publish(user_id, {'type': 'unread_count', 'unread_count': count}))
+
+class ActivityPagination(KeysetPagination):
+    # Coalesced groups move back to the top when someone new is folded in
+    ordering_fields = ('last_activity_at', 'id')
 
 class NotificationListView(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ActivityPagination
+    
+    def since(self):
+        """The ?since= threshold: a last_activity_at timestamp, or (older clients) a notification id"""
+        since = self.request.query_params.get('since')
+        if not since:
+            return None
+        if since.isdigit():
+            # Everything with activity after that notification was created,
+            # including groups it has since been folded into
+            created_at = Notification.objects.filter(id=int(since), recipient=self.request.user).values_list('created_at', flat=True).first()
+            if created_at is None:
+                raise ValidationError({'since': 'Unknown notification id'})
+            return created_at
+        # A '+' in an unencoded UTC offset arrives as a space
+        threshold = parse_datetime(since.replace(' ', '+'))
+        if threshold is None:
+            raise ValidationError({'since': 'Expected a last_activity_at timestamp'})
+        return threshold
     
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)[:20]
+        queryset = Notification.objects.filter(recipient=self.request.user).select_related('sender', 'post')
+        # ?since= returns only notifications with activity after that point
+        since = self.since()
+        if since is not None:
+            queryset = queryset.filter(last_activity_at__gt=since)
+        return queryset
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def unread_count(request):
-    count = Notification.objects.filter(recipient=request.user, seen_at__isnull=True).count()
+    count = UnreadNotificationCounter.get_count(request.user.id)
     return Response({"unread_count": count})
 
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 def mark_notifications_seen(request):
-    Notification.objects.filter(recipient=request.user, seen_at__isnull=True).update(seen_at=timezone.now())
+    with transaction.atomic():
+        Notification.objects.filter(recipient=request.user, seen_at__isnull=True).update(seen_at=timezone.now())
+        UnreadNotificationCounter.reset(request.user.id)
+        publish_unread_count(request.user.id, 0)
     return Response({"message": "Notifications marked as seen"})
 
 @api_view(['POST'])
@@ -37,5 +76,9 @@ def mark_notification_read(request, notification_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_all_notifications_read(request):
-    Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+    with transaction.atomic():
+        Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+        Notification.objects.filter(recipient=request.user, seen_at__isnull=True).update(seen_at=timezone.now())
+        UnreadNotificationCounter.reset(request.user.id)
+        publish_unread_count(request.user.id, 0)
     return Response({"message": "All notifications marked as read"}, status=status.HTTP_200_OK)
@@ -0,0 +1,158 @@
+"""Background generation of post image variants.
+
+When a post gets an image, ``schedule`` queues it for after the transaction
+commits and the request returns with the original image straight away.
+The resizing and encoding (posts.imaging) runs in a process pool of
+``IMAGE_VARIANT_WORKERS`` processes so it never competes with request threads
+for the GIL; the parent process then saves the variant files to the default
+storage and records them in ``Post.image_variants``:
+
+    {"card": {"width": 640, "height": 480, "webp": "<url>", "jpeg": "<url>"}, ...}
+
+Variant URLs are resolved against the post's ``image_url``, which was made
+absolute from the upload request, so they point at the same host even
+though no request is around when they are stored.
+
+With ``IMAGE_VARIANT_WORKERS = 0`` variants are rendered inline in the
+on-commit hook instead, which is what the tests and single-process
+management commands use.
+
+The post is already saved when the hook runs, so a failure to render (an
+image Pillow can't decode, a pool whose worker died) is logged and leaves
+the post without variants instead of failing the request;
+``generate_image_variants`` picks such posts up later. A broken pool is
+dropped and a fresh one started on next use.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urljoin
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from utils.storage import update_references
+from . import imaging
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def workers():
+    return getattr(settings, 'IMAGE_VARIANT_WORKERS', 2)
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs request and writer threads
+            # can copy held locks into the child
+            _pool = ProcessPoolExecutor(max_workers=workers(), mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def discard_pool(pool):
+    """Forget `pool` after it broke, so the next get_pool() starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def store(post_id, source_url, rendered):
+    """Save rendered variants and record them on the post, unless its image changed meanwhile"""
+    variants = {}
+    for label, variant in rendered.items():
+        variants[label] = {'width': variant['width'], 'height': variant['height']}
+        for fmt, data in variant['files'].items():
+            # Content-addressed: the name only contributes its extension
+            name = default_storage.save(f'posts/variants/{label}.{fmt}', ContentFile(data))
+            variants[label][fmt] = urljoin(source_url, default_storage.url(name))
+    with transaction.atomic():
+        post = Post.objects.select_for_update().filter(pk=post_id, image_url=source_url).only(*Post.MEDIA_FIELDS).first()
+        if post is not None:
+            # A queryset update: re-saving would re-run the timeline and
+            # search signals for a change that doesn't concern them
+            before = post.media_references()
+            post.image_variants = variants
+            Post.objects.filter(pk=post_id).update(image_variants=variants)
+            update_references(before, post.media_references())
+    return variants
+
+
+def generate(post_id, source_name):
+    """Render and store variants for the post's image. Returns a Future of the variants map."""
+    post = Post.objects.filter(pk=post_id).only('image_url').first()
+    done = Future()
+    if post is None or not post.image_url:
+        done.set_result(None)
+        return done
+    
+    with default_storage.open(source_name) as source:
+        data = source.read()
+    
+    if not workers():
+        done.set_result(store(post_id, post.image_url, imaging.render_variants(data)))
+        return done
+    
+    submitter = threading.get_ident()
+    pool = get_pool()
+    
+    def rendered(future):
+        try:
+            done.set_result(store(post_id, post.image_url, future.result()))
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                discard_pool(pool)
+            done.set_exception(e)
+        finally:
+            # Usually called on the pool's management thread, which must not
+            # keep a database connection open
+            if threading.get_ident() != submitter:
+                connection.close()
+    
+    try:
+        future = pool.submit(imaging.render_variants, data)
+    except BrokenProcessPool:
+        # A worker died since the last job; retry once on a fresh pool
+        discard_pool(pool)
+        pool = get_pool()
+        future = pool.submit(imaging.render_variants, data)
+    future.add_done_callback(rendered)
+    return done
+
+
+def schedule(post, source_name):
+    """Generate variants for `post` once the current transaction commits"""
+    post_id = post.pk
+
+    def failed(done):
+        if done.exception() is not None:
+            logger.error('Image variants for post %s failed', post_id, exc_info=done.exception())
+
+    # robust: errors are logged rather than raised into the request that
+    # created the post (with ATOMIC_REQUESTS off the hook runs inside it)
+    transaction.on_commit(lambda: generate(post_id, source_name).add_done_callback(failed), robust=True)
+
+
+def srcset(variants):
+    """{fmt: 'url 320w, url 640w, ...'} for a Post.image_variants map"""
+    if not variants:
+        return None
+    widths = sorted(variants.values(), key=lambda variant: variant['width'])
+    result = {}
+    for fmt in imaging.FORMATS:
+        seen, entries = set(), []
+        for variant in widths:
+            if fmt in variant and variant['width'] not in seen:
+                seen.add(variant['width'])
+                entries.append(f"{variant[fmt]} {variant['width']}w")
+        result[fmt] = ', '.join(entries)
+    return result
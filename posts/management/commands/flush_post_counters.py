@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from posts.counters import flush
+
+class Command(BaseCommand):
+    help = 'Apply buffered like/comment count deltas to posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Deltas applied per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep flushing until interrupted')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the buffer is empty')
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                applied = flush(options['batch_size'])
+                total += applied
+                if applied:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Applied {total} counter deltas')
+        )
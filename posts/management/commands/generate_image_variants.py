@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from posts.models import Post
+from posts import image_variants
+
+class Command(BaseCommand):
+    help = 'Generate resized image variants for posts that have an uploaded image but no variants yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate variants for every post with an image')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.filter(is_active=True).exclude(image_url='')
+        if not options['all']:
+            posts = posts.filter(image_variants={})
+
+        # Images are read into memory when submitted, so only a couple of
+        # jobs per worker are in flight at a time
+        chunk_size = max(image_variants.workers(), 1) * 2
+        pending, generated, skipped, failed = [], 0, 0, 0
+        for post_id, image_url in posts.values_list('id', 'image_url').iterator():
+            # Only images in our own media storage can be read back
+            if settings.MEDIA_URL not in image_url:
+                skipped += 1
+                continue
+            source_name = image_url.split(settings.MEDIA_URL, 1)[1]
+            try:
+                pending.append((post_id, image_variants.generate(post_id, source_name)))
+            except OSError as e:
+                failed += 1
+                self.stderr.write(f'Post {post_id}: {e}')
+            if len(pending) >= chunk_size:
+                done, errors = self.wait(pending)
+                generated, failed, pending = generated + done, failed + errors, []
+
+        done, errors = self.wait(pending)
+        generated, failed = generated + done, failed + errors
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Generated variants for {generated} posts ({skipped} external images skipped, {failed} failed)')
+        )
+
+    def wait(self, pending):
+        """Wait for [(post_id, future)]; returns (generated, failed)"""
+        generated, failed = 0, 0
+        for post_id, done in pending:
+            try:
+                done.result()
+                generated += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Post {post_id}: {e}')
+        return generated, failed
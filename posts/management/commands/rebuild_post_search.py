@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from posts.models import Comment, Post
+from posts.search import get_backend, populate
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of posts and comments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts or comments per transaction')
+
+    def batches(self, queryset, batch_size):
+        """Active rows of `queryset` in pk order, `batch_size` at a time"""
+        last_pk = 0
+        while True:
+            rows = list(queryset.filter(is_active=True, pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not rows:
+                return
+            last_pk = rows[-1].pk
+            yield rows
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if backend is None:
+            raise CommandError('No post search backend for this database')
+
+        with transaction.atomic():
+            backend.clear()
+
+        posts = comments = 0
+        for rows in self.batches(Post.objects.only('pk', 'content'), options['batch_size']):
+            with transaction.atomic():
+                populate(backend, rows, [])
+            posts += len(rows)
+        for rows in self.batches(Comment.objects.only('pk', 'post_id', 'content'), options['batch_size']):
+            with transaction.atomic():
+                populate(backend, [], rows)
+            comments += len(rows)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {posts} posts and {comments} comments')
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from posts.timeline import rebuild_timeline
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized home timelines from follows and posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Only rebuild the timeline of this user id')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        if options.get('user'):
+            users = users.filter(id=options['user'])
+
+        rebuilt = 0
+        for user in users.iterator():
+            rebuild_timeline(user)
+            rebuilt += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {rebuilt} timelines')
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from posts.timeline import trim_timelines
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Cut materialized home timelines back to FEED_TIMELINE_LENGTH entries'
+
+    def handle(self, *args, **options):
+        removed = trim_timelines(User.objects.order_by('id').values_list('id', flat=True).iterator())
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Removed {removed} timeline entries past the limit')
+        )
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_timelines(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('users', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    limit = getattr(settings, 'FEED_TIMELINE_LENGTH', 800)
+
+    for user in User.objects.all().iterator():
+        following_ids = Follow.objects.filter(follower=user).values_list('following_id', flat=True)
+        recent_posts = Post.objects.filter(
+            models.Q(author_id__in=following_ids) | models.Q(author=user),
+            is_active=True
+        ).order_by('-created_at').values_list('id', 'created_at')[:limit]
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(owner=user, post_id=post_id, created_at=created_at) for post_id, created_at in recent_posts],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0002_initial'),
+        ('users', '0002_user_avatar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='posts.post')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['owner', '-created_at'], name='posts_feed_owner_created_idx')],
+                'unique_together': {('owner', 'post')},
+            },
+        ),
+        migrations.RunPython(build_timelines, migrations.RunPython.noop),
+    ]
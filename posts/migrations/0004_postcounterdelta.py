@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostCounterDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('like_count', 'Like count'), ('comment_count', 'Comment count')], max_length=20)),
+                ('delta', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_deltas', to='posts.post')),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_postcounterdelta'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='feedentry',
+            name='posts_feed_owner_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['post', 'created_at'], name='posts_comment_post_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['owner', '-created_at', '-post'], name='posts_feed_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['author', 'created_at'], name='posts_author_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at'], name='posts_active_created_idx'),
+        ),
+    ]
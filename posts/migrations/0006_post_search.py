@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:05
+
+from collections import defaultdict
+from django.db import migrations
+
+# Frozen copy of the search schema as of this migration (one document per
+# post holding its content and its comments); posts.search has moved on since
+
+
+def documents(apps, db):
+    """(post id, content, comments text) for every active post"""
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = defaultdict(list)
+    for post_id, content in Comment.objects.using(db.alias).filter(is_active=True).order_by('id').values_list('post_id', 'content').iterator():
+        comments[post_id].append(content)
+    for post_id, content in Post.objects.using(db.alias).filter(is_active=True).values_list('id', 'content').iterator():
+        yield post_id, content, ' '.join(comments.get(post_id, ()))
+
+
+def create_search_table(apps, schema_editor):
+    db = schema_editor.connection
+    with db.cursor() as cursor:
+        if db.vendor == 'sqlite':
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5("
+                "content, comments, tokenize = 'porter unicode61 remove_diacritics 2')"
+            )
+            for post_id, content, comments in documents(apps, db):
+                cursor.execute(
+                    'INSERT INTO posts_search (rowid, content, comments) VALUES (%s, %s, %s)',
+                    [post_id, content, comments],
+                )
+        elif db.vendor == 'postgresql':
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS posts_search ('
+                'post_id bigint PRIMARY KEY REFERENCES posts_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                'document tsvector NOT NULL)'
+            )
+            cursor.execute('CREATE INDEX IF NOT EXISTS posts_search_document_idx ON posts_search USING GIN (document)')
+            for post_id, content, comments in documents(apps, db):
+                cursor.execute(
+                    'INSERT INTO posts_search (post_id, document) VALUES (%s, '
+                    'setweight(to_tsvector(%s, %s), \'A\') || setweight(to_tsvector(%s, %s), \'B\'))',
+                    [post_id, 'english', content, 'english', comments],
+                )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:05
+
+import re
+import unicodedata
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Frozen copy of the tag parsing in posts.tags as of this migration, so later
+# changes to it don't alter what the backfill does
+HASHTAG = re.compile(r'(?<![\w#])#(\w{1,100})')
+MENTION = re.compile(r'(?<![\w@])@(\w{1,150})')
+
+
+def normalize(name):
+    return unicodedata.normalize('NFKC', name).casefold()
+
+
+def extract_tags(content):
+    """{(kind, name)} for the hashtags and mentions in `content`"""
+    found = {('hashtag', normalize(name)) for name in HASHTAG.findall(content)}
+    found |= {('mention', normalize(name)) for name in MENTION.findall(content)}
+    return found
+
+
+def tag_existing_posts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Tag = apps.get_model('posts', 'Tag')
+    PostTag = apps.get_model('posts', 'PostTag')
+    db = schema_editor.connection.alias
+
+    # Existing posts are indexed for /api/tags/<tag>/posts/ but not counted
+    # towards trending, which only covers the last TAG_TRENDING_WINDOW minutes
+    tag_ids = {}
+    batch = []
+    for post in Post.objects.using(db).only('id', 'content', 'created_at').iterator():
+        for key in extract_tags(post.content):
+            if key not in tag_ids:
+                tag_ids[key] = Tag.objects.using(db).get_or_create(kind=key[0], name=key[1])[0].id
+            batch.append(PostTag(post_id=post.id, tag_id=tag_ids[key], created_at=post.created_at))
+        if len(batch) >= 1000:
+            PostTag.objects.using(db).bulk_create(batch)
+            batch = []
+    PostTag.objects.using(db).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('hashtag', 'Hashtag'), ('mention', 'Mention')], max_length=10)),
+                ('name', models.CharField(max_length=150)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TagTrendBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('tag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='trend_buckets', to='posts.tag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['minute'], name='posts_tagtrend_minute_idx')],
+                'unique_together': {('tag', 'minute')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='posts.post')),
+                ('tag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='posts.tag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tag', 'created_at', 'post'], name='posts_tag_created_idx')],
+                'unique_together': {('post', 'tag')},
+            },
+        ),
+        migrations.RunPython(tag_existing_posts, migrations.RunPython.noop),
+    ]
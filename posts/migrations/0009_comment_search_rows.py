@@ -0,0 +1,67 @@
+from django.db import migrations
+
+# Frozen copy of the search schema as of this migration (a document per post
+# content in posts_search, one per comment in posts_comment_search); later
+# changes to posts.search don't alter what it does
+
+
+def split_comment_documents(apps, schema_editor):
+    """Recreate the search tables with one document per comment"""
+    db = schema_editor.connection
+    if db.vendor not in ('sqlite', 'postgresql'):
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    posts = Post.objects.using(db.alias).filter(is_active=True).values_list('id', 'content')
+    comments = Comment.objects.using(db.alias).filter(is_active=True).values_list('id', 'post_id', 'content')
+
+    with db.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS posts_search')
+        cursor.execute('DROP TABLE IF EXISTS posts_comment_search')
+
+        if db.vendor == 'sqlite':
+            tokenize = "tokenize = 'porter unicode61 remove_diacritics 2'"
+            cursor.execute(f'CREATE VIRTUAL TABLE posts_search USING fts5(content, {tokenize})')
+            cursor.execute(f'CREATE VIRTUAL TABLE posts_comment_search USING fts5(content, post_id UNINDEXED, {tokenize})')
+            for post_id, content in posts.iterator():
+                cursor.execute('INSERT INTO posts_search (rowid, content) VALUES (%s, %s)', [post_id, content])
+            for comment_id, post_id, content in comments.iterator():
+                cursor.execute(
+                    'INSERT INTO posts_comment_search (rowid, content, post_id) VALUES (%s, %s, %s)',
+                    [comment_id, content, post_id],
+                )
+        else:
+            cursor.execute(
+                'CREATE TABLE posts_search ('
+                'post_id bigint PRIMARY KEY REFERENCES posts_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                'document tsvector NOT NULL)'
+            )
+            cursor.execute('CREATE INDEX posts_search_document_idx ON posts_search USING GIN (document)')
+            cursor.execute(
+                'CREATE TABLE posts_comment_search ('
+                'comment_id bigint PRIMARY KEY REFERENCES posts_comment (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                'post_id bigint NOT NULL, '
+                'document tsvector NOT NULL)'
+            )
+            cursor.execute('CREATE INDEX posts_comment_search_document_idx ON posts_comment_search USING GIN (document)')
+            for post_id, content in posts.iterator():
+                cursor.execute(
+                    'INSERT INTO posts_search (post_id, document) VALUES (%s, to_tsvector(%s, %s))',
+                    [post_id, 'english', content],
+                )
+            for comment_id, post_id, content in comments.iterator():
+                cursor.execute(
+                    'INSERT INTO posts_comment_search (comment_id, post_id, document) VALUES (%s, %s, to_tsvector(%s, %s))',
+                    [comment_id, post_id, 'english', content],
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_comment_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def flag_pulled_posts(apps, schema_editor):
+    """Flag the posts of authors over the fan-out threshold, which timelines never got"""
+    Follow = apps.get_model('users', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    limit = getattr(settings, 'FEED_FANOUT_MAX_FOLLOWERS', 5000)
+    db = schema_editor.connection.alias
+
+    authors = (
+        Follow.objects.using(db).values('following_id')
+        .annotate(followers=models.Count('id')).filter(followers__gt=limit)
+        .values_list('following_id', flat=True)
+    )
+    Post.objects.using(db).filter(author_id__in=list(authors)).update(fanout_on_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_comment_search_rows'),
+        ('users', '0002_user_avatar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='fanout_on_read',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('fanout_on_read', True), ('is_active', True)), fields=['author', 'created_at'], name='posts_fanout_on_read_idx'),
+        ),
+        migrations.RunPython(flag_pulled_posts, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 
 class Post(models.Model):
     CATEGORY_CHOICES = [
@@ -13,16 +14,62 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     image_url = models.URLField(blank=True)
+    # Resized copies of the image, filled in by posts.image_variants
+    image_variants = models.JSONField(default=dict, blank=True)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='general')
     is_active = models.BooleanField(default=True)
     like_count = models.PositiveIntegerField(default=0)
     comment_count = models.PositiveIntegerField(default=0)
+    # Written while the author was over FEED_FANOUT_MAX_FOLLOWERS: never
+    # copied into followers' timelines, merged in when their feeds are read
+    fanout_on_read = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['-created_at']
+        # Ascending (created_at, implicit id): read backwards they serve both
+        # ORDER BY -created_at and the keyset order (-created_at, -id)
+        indexes = [
+            # Profile pages: one author's active posts, newest first
+            models.Index(fields=['author', 'created_at'], condition=models.Q(is_active=True), name='posts_author_active_idx'),
+            # Global post list; partial so soft-deleted posts don't bloat it
+            models.Index(fields=['created_at'], condition=models.Q(is_active=True), name='posts_active_created_idx'),
+            # Home feeds: the few posts that have to be merged in at read time
+            models.Index(
+                fields=['author', 'created_at'], condition=models.Q(is_active=True, fanout_on_read=True),
+                name='posts_fanout_on_read_idx',
+            ),
+        ]
         
     def __str__(self):
         return f'{self.author.username}: {self.content[:50]}'
+    
+    MEDIA_FIELDS = ('image_url', 'image_variants')
+    
+    def media_references(self):
+        """Names of the stored blobs this post points at"""
+        from utils.storage import references
+        variant_urls = [
+            url for variant in (self.image_variants or {}).values()
+            for url in variant.values() if isinstance(url, str)
+        ]
+        return references(self.image_url, *variant_urls)
+    
+    def deactivate(self):
+        """Soft-delete the post. Returns False if it was already inactive."""
+        from django.contrib.auth import get_user_model
+        from .timeline import remove_post
+        from . import search
+        
+        with transaction.atomic():
+            changed = Post.objects.filter(pk=self.pk, is_active=True).update(
+                is_active=False, updated_at=timezone.now()
+            )
+            self.is_active = False
+            if changed:
+                get_user_model().adjust_counter(self.author_id, 'stored_posts_count', -1)
+                remove_post(self)
+                search.remove_post(self.pk)
+        return bool(changed)
 
 class Like(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -44,6 +91,89 @@ class Comment(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['post', 'created_at'], condition=models.Q(is_active=True), name='posts_comment_post_active_idx'),
+        ]
         
     def __str__(self):
         return f'{self.author.username}: {self.content[:30]}'
+
+class FeedEntry(models.Model):
+    """Materialized home timeline row: `post` appears in `owner`'s feed"""
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='feed_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='feed_entries')
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('owner', 'post')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='posts_feed_owner_created_idx'),
+        ]
+        
+    def __str__(self):
+        return f'{self.owner.username} <- {self.post_id}'
+
+class PostCounterDelta(models.Model):
+    """Append-only buffer of like/comment count changes, folded into Post by posts.counters.flush"""
+    FIELD_CHOICES = [
+        ('like_count', 'Like count'),
+        ('comment_count', 'Comment count'),
+    ]
+    
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='counter_deltas')
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    delta = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f'{self.post_id}.{self.field} {self.delta:+d}'
+
+class Tag(models.Model):
+    """A normalized #hashtag or @mention; see posts.tags"""
+    HASHTAG = 'hashtag'
+    MENTION = 'mention'
+    KIND_CHOICES = [
+        (HASHTAG, 'Hashtag'),
+        (MENTION, 'Mention'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    name = models.CharField(max_length=150)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('kind', 'name')
+        
+    def __str__(self):
+        return f'{"#" if self.kind == self.HASHTAG else "@"}{self.name}'
+
+class PostTag(models.Model):
+    """`post` uses `tag`; created_at is copied from the post for keyset pages"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_tags')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='post_tags', db_index=False)
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('post', 'tag')
+        indexes = [
+            models.Index(fields=['tag', 'created_at', 'post'], name='posts_tag_created_idx'),
+        ]
+        
+    def __str__(self):
+        return f'{self.post_id} {self.tag}'
+
+class TagTrendBucket(models.Model):
+    """Uses of a hashtag during one minute, summed with decay by posts.tags.trending"""
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='trend_buckets', db_index=False)
+    minute = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('tag', 'minute')
+        indexes = [
+            models.Index(fields=['minute'], name='posts_tagtrend_minute_idx'),
+        ]
+        
+    def __str__(self):
+        return f'{self.tag} @ {self.minute:%H:%M}: {self.count}'
@@ -0,0 +1,278 @@
+"""Full-text search over posts and their comments.
+
+Each active post has a document holding its content in ``posts_search``,
+and each active comment its own document (with its post id) in
+``posts_comment_search``. They are kept up to date by ``posts.signals``
+(post create/edit/delete, comment create/edit/delete) and
+``Post.deactivate``, one row per change, so a comment never rewrites its
+post's document. Both can be rebuilt with ``rebuild_post_search``.
+
+A post's score is its content score plus the score of its best matching
+comment, weighted by ``weights``; every query token has to appear in the
+content or in a single comment. Comments of deactivated posts stay indexed
+and are filtered out with the post.
+
+The tables are database specific, so they are managed by a backend chosen
+from ``POST_SEARCH_BACKEND`` (or by the database vendor when unset):
+
+* ``SQLiteFTSBackend`` - FTS5 virtual tables ranked with BM25.
+* ``PostgresBackend`` - ``tsvector`` columns with GIN indexes ranked with
+  ``ts_rank_cd``.
+
+Both return (post_id, score) pairs ordered by score descending (higher is
+better) then post id descending, and page with a (score, id) cursor.
+"""
+import re
+from django.conf import settings
+from django.db import connection as default_connection
+from django.utils.module_loading import import_string
+
+TOKEN = re.compile(r'\w+')
+
+
+def query_tokens(query):
+    return TOKEN.findall(query.lower())
+
+
+def filter_sql(category=None, author_id=None):
+    clauses, params = [], []
+    if category:
+        clauses.append('AND p.category = %s')
+        params.append(category)
+    if author_id:
+        clauses.append('AND p.author_id = %s')
+        params.append(author_id)
+    return ' '.join(clauses), params
+
+
+class SQLiteFTSBackend:
+    # Content matches weigh twice as much as the best comment match
+    weights = (2.0, 1.0)
+
+    def __init__(self, connection=None):
+        self.connection = connection or default_connection
+
+    def create_schema(self, cursor):
+        tokenize = "tokenize = 'porter unicode61 remove_diacritics 2'"
+        cursor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5(content, {tokenize})')
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS posts_comment_search USING fts5(content, post_id UNINDEXED, {tokenize})'
+        )
+
+    def drop_schema(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS posts_search')
+        cursor.execute('DROP TABLE IF EXISTS posts_comment_search')
+
+    def index_post(self, post_id, content):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search WHERE rowid = %s', [post_id])
+            cursor.execute('INSERT INTO posts_search (rowid, content) VALUES (%s, %s)', [post_id, content])
+
+    def remove_post(self, post_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search WHERE rowid = %s', [post_id])
+
+    def index_comment(self, comment_id, post_id, content):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_comment_search WHERE rowid = %s', [comment_id])
+            cursor.execute(
+                'INSERT INTO posts_comment_search (rowid, content, post_id) VALUES (%s, %s, %s)',
+                [comment_id, content, post_id],
+            )
+
+    def remove_comment(self, comment_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_comment_search WHERE rowid = %s', [comment_id])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+            cursor.execute('DELETE FROM posts_comment_search')
+
+    def match_expression(self, tokens):
+        # Quoted so user input is never parsed as FTS5 syntax; the last token
+        # is a prefix so results show up while the user is still typing
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def search(self, tokens, limit, after=None, category=None, author_id=None):
+        filters, params = filter_sql(category, author_id)
+        page = ''
+        if after is not None:
+            page = 'AND (h.score < %s OR (h.score = %s AND h.post_id < %s))'
+            params += [after[0], after[0], after[1]]
+
+        # bm25() is evaluated once per match inside the MATERIALIZED CTEs
+        # (kept out of aggregates and the outer WHERE, where FTS5 can't
+        # compute it); the join, filters and cursor apply to the combined
+        # per-post scores
+        match = self.match_expression(tokens)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH c AS MATERIALIZED ('
+                f'SELECT rowid AS post_id, -bm25(posts_search) AS score '
+                f'FROM posts_search WHERE posts_search MATCH %s), '
+                f'm AS MATERIALIZED ('
+                f'SELECT CAST(post_id AS INTEGER) AS post_id, -bm25(posts_comment_search) AS score '
+                f'FROM posts_comment_search WHERE posts_comment_search MATCH %s), '
+                f'h AS ('
+                f'SELECT post_id, SUM(score) AS score FROM ('
+                f'SELECT post_id, {self.weights[0]} * score AS score FROM c '
+                f'UNION ALL SELECT post_id, {self.weights[1]} * MAX(score) AS score FROM m GROUP BY post_id) '
+                f'GROUP BY post_id) '
+                f'SELECT h.post_id, h.score FROM h JOIN posts_post p ON p.id = h.post_id '
+                f'WHERE p.is_active {filters} {page} '
+                f'ORDER BY h.score DESC, h.post_id DESC LIMIT %s',
+                [match, match] + params + [limit],
+            )
+            return cursor.fetchall()
+
+
+class PostgresBackend:
+    config = 'english'
+    weights = (2.0, 1.0)
+
+    def __init__(self, connection=None):
+        self.connection = connection or default_connection
+
+    def create_schema(self, cursor):
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS posts_search ('
+            'post_id bigint PRIMARY KEY REFERENCES posts_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        cursor.execute('CREATE INDEX IF NOT EXISTS posts_search_document_idx ON posts_search USING GIN (document)')
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS posts_comment_search ('
+            'comment_id bigint PRIMARY KEY REFERENCES posts_comment (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'post_id bigint NOT NULL, '
+            'document tsvector NOT NULL)'
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS posts_comment_search_document_idx ON posts_comment_search USING GIN (document)'
+        )
+
+    def drop_schema(self, cursor):
+        cursor.execute('DROP TABLE IF EXISTS posts_search')
+        cursor.execute('DROP TABLE IF EXISTS posts_comment_search')
+
+    def index_post(self, post_id, content):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO posts_search (post_id, document) VALUES (%s, to_tsvector(%s, %s)) '
+                'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document',
+                [post_id, self.config, content],
+            )
+
+    def remove_post(self, post_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search WHERE post_id = %s', [post_id])
+
+    def index_comment(self, comment_id, post_id, content):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO posts_comment_search (comment_id, post_id, document) VALUES (%s, %s, to_tsvector(%s, %s)) '
+                'ON CONFLICT (comment_id) DO UPDATE SET document = EXCLUDED.document',
+                [comment_id, post_id, self.config, content],
+            )
+
+    def remove_comment(self, comment_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_comment_search WHERE comment_id = %s', [comment_id])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('TRUNCATE posts_search, posts_comment_search')
+
+    def match_expression(self, tokens):
+        return ' & '.join(tokens[:-1] + [f'{tokens[-1]}:*'])
+
+    def search(self, tokens, limit, after=None, category=None, author_id=None):
+        filters, params = filter_sql(category, author_id)
+        page = ''
+        if after is not None:
+            page = 'AND (h.score < %s OR (h.score = %s AND h.post_id < %s))'
+            params += [after[0], after[0], after[1]]
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'WITH q AS (SELECT to_tsquery(%s, %s) AS query), '
+                f'h AS ('
+                f'SELECT post_id, SUM(score) AS score FROM ('
+                f'SELECT s.post_id, {self.weights[0]} * ts_rank_cd(s.document, q.query) AS score '
+                f'FROM posts_search s, q WHERE s.document @@ q.query '
+                f'UNION ALL '
+                f'SELECT c.post_id, {self.weights[1]} * MAX(ts_rank_cd(c.document, q.query)) AS score '
+                f'FROM posts_comment_search c, q WHERE c.document @@ q.query GROUP BY c.post_id'
+                f') parts GROUP BY post_id) '
+                f'SELECT h.post_id, h.score FROM h JOIN posts_post p ON p.id = h.post_id '
+                f'WHERE p.is_active {filters} {page} '
+                f'ORDER BY h.score DESC, h.post_id DESC LIMIT %s',
+                [self.config, self.match_expression(tokens)] + params + [limit],
+            )
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': 'posts.search.SQLiteFTSBackend',
+    'postgresql': 'posts.search.PostgresBackend',
+}
+
+
+def get_backend(vendor=None, connection=None):
+    """The search backend for `connection` (the default one unless given)"""
+    connection = connection or default_connection
+    path = getattr(settings, 'POST_SEARCH_BACKEND', None) or BACKENDS.get(vendor or connection.vendor)
+    if path is None:
+        return None
+    return import_string(path)(connection)
+
+
+def populate(backend, posts, comments):
+    """Index `posts` (with pk and content) and `comments` (with pk, post_id and content)"""
+    for post in posts:
+        backend.index_post(post.pk, post.content)
+    for comment in comments:
+        backend.index_comment(comment.pk, comment.post_id, comment.content)
+
+
+def index_post(post):
+    backend = get_backend()
+    if backend is None:
+        return
+    if post.is_active:
+        backend.index_post(post.pk, post.content)
+    else:
+        backend.remove_post(post.pk)
+
+
+def remove_post(post_id):
+    backend = get_backend()
+    if backend is not None:
+        backend.remove_post(post_id)
+
+
+def index_comment(comment):
+    backend = get_backend()
+    if backend is None:
+        return
+    if comment.is_active:
+        backend.index_comment(comment.pk, comment.post_id, comment.content)
+    else:
+        backend.remove_comment(comment.pk)
+
+
+def remove_comment(comment_id):
+    backend = get_backend()
+    if backend is not None:
+        backend.remove_comment(comment_id)
+
+
+def search_posts(query, limit=20, after=None, category=None, author_id=None):
+    """[(post_id, score)] best first, starting after the (score, id) pair `after`"""
+    tokens = query_tokens(query)
+    backend = get_backend()
+    if not tokens or backend is None:
+        return []
+    return backend.search(tokens, limit, after=after, category=category, author_id=author_id)
@@ -1,20 +1,62 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import Post, Like, Comment
+from . import counters, tags, image_variants
+from users.models import Follow
 from users.serializers import UserSerializer
 
+class PostListSerializer(serializers.ListSerializer):
+    """Resolves viewer state for a whole page of posts before serializing it"""
+    
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        self.context['pending_counter_deltas'] = counters.pending_deltas([post.id for post in posts])
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            self.context['liked_post_ids'] = set(
+                Like.objects.filter(user=request.user, post_id__in=[post.id for post in posts])
+                .values_list('post_id', flat=True)
+            )
+            self.context['followed_user_ids'] = set(
+                Follow.objects.filter(follower=request.user, following_id__in={post.author_id for post in posts})
+                .values_list('following_id', flat=True)
+            )
+        return super().to_representation(posts)
+
 class PostSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
+    like_count = serializers.SerializerMethodField()
+    comment_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     time_ago = serializers.SerializerMethodField()
     
     class Meta:
         model = Post
         fields = ['id', 'content', 'author', 'created_at', 'updated_at', 
-                 'image_url', 'category', 'like_count', 'comment_count', 'is_liked', 'time_ago']
+                 'image_url', 'image_srcset', 'category', 'like_count', 'comment_count', 'is_liked', 'time_ago']
         read_only_fields = ['id', 'author', 'created_at', 'updated_at', 'like_count', 'comment_count']
+        list_serializer_class = PostListSerializer
+    
+    def _pending_counter_deltas(self, obj):
+        pending = self.context.get('pending_counter_deltas')
+        if pending is not None:
+            return pending[obj.id]
+        if not hasattr(obj, '_pending_counter_deltas'):
+            obj._pending_counter_deltas = counters.pending_deltas([obj.id])[obj.id]
+        return obj._pending_counter_deltas
+    
+    def get_like_count(self, obj):
+        return max(0, obj.like_count + self._pending_counter_deltas(obj)['like_count'])
+    
+    def get_comment_count(self, obj):
+        return max(0, obj.comment_count + self._pending_counter_deltas(obj)['comment_count'])
     
     def get_is_liked(self, obj):
+        liked_post_ids = self.context.get('liked_post_ids')
+        if liked_post_ids is not None:
+            return obj.id in liked_post_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Like.objects.filter(user=request.user, post=obj).exists()
@@ -26,6 +68,10 @@ class PostSerializer(serializers.ModelSerializer):
             return obj.image_url
         return None
     
+    def get_image_srcset(self, obj):
+        # None until the variants have been generated; clients fall back to image_url
+        return image_variants.srcset(obj.image_variants)
+    
     def get_time_ago(self, obj):
         from django.utils import timezone
         now = timezone.now()
@@ -57,24 +103,21 @@ class PostCreateSerializer(serializers.ModelSerializer):
         post = super().create(validated_data)
         
         if image:
-            import os
-            from django.conf import settings
-            
-            # Ensure media/posts directory exists
-            posts_dir = os.path.join(settings.MEDIA_ROOT, 'posts')
-            os.makedirs(posts_dir, exist_ok=True)
-            
-            # Save file
-            filename = f'posts/{image.name}'
-            filepath = os.path.join(settings.MEDIA_ROOT, filename)
-            
-            with open(filepath, 'wb+') as destination:
-                for chunk in image.chunks():
-                    destination.write(chunk)
-                    
-            post.image_url = f'http://127.0.0.1:8000{settings.MEDIA_URL}{filename}'
-            post.save()
-            
+            # Streamed and deduplicated by content (utils.storage)
+            name = default_storage.save(f'posts/{image.name}', image)
+            url = default_storage.url(name)
+            request = self.context.get('request')
+            post.image_url = request.build_absolute_uri(url) if request else url
+            post.save(update_fields=['image_url'])
+            image_variants.schedule(post, name)
+        
+        tags.tag_post(post)
+        return post
+    
+    def update(self, instance, validated_data):
+        post = super().update(instance, validated_data)
+        if 'content' in validated_data:
+            tags.tag_post(post)
         return post
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -0,0 +1,71 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from utils.storage import saved_references, update_references
+from users.models import User, Follow
+from .models import Post, Comment
+from . import timeline
+from . import search
+
+@receiver(pre_save, sender=Post)
+def flag_fanout_on_read(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance.fanout_on_read = timeline.is_fanout_on_read(instance.author)
+
+@receiver(post_save, sender=Post)
+def update_timelines_for_post(sender, instance, created, **kwargs):
+    if created and instance.is_active:
+        timeline.fan_out_post(instance)
+    elif not instance.is_active:
+        timeline.remove_post(instance)
+
+@receiver(post_save, sender=Post)
+def increment_posts_count(sender, instance, created, **kwargs):
+    if created and instance.is_active:
+        User.adjust_counter(instance.author_id, 'stored_posts_count', 1)
+
+@receiver(post_delete, sender=Post)
+def decrement_posts_count(sender, instance, **kwargs):
+    if instance.is_active:
+        User.adjust_counter(instance.author_id, 'stored_posts_count', -1)
+
+@receiver(post_save, sender=Post)
+def update_search_index_for_post(sender, instance, update_fields=None, **kwargs):
+    # e.g. the image_url save right after a post with an image is created
+    if update_fields is not None and not {'content', 'is_active'} & set(update_fields):
+        return
+    search.index_post(instance)
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_search_index(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+@receiver(post_save, sender=Comment)
+def update_search_index_for_comment(sender, instance, **kwargs):
+    search.index_comment(instance)
+
+@receiver(post_delete, sender=Comment)
+def remove_comment_from_search_index(sender, instance, **kwargs):
+    search.remove_comment(instance.pk)
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline_on_follow(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill_follow(instance.follower, instance.following)
+
+@receiver(post_delete, sender=Follow)
+def retract_timeline_on_unfollow(sender, instance, **kwargs):
+    timeline.retract_follow(instance.follower, instance.following)
+
+@receiver(pre_save, sender=Post)
+def remember_media_references(sender, instance, update_fields=None, **kwargs):
+    instance._media_references = saved_references(instance, update_fields)
+
+@receiver(post_save, sender=Post)
+def update_media_references(sender, instance, **kwargs):
+    before = getattr(instance, '_media_references', None)
+    if before is not None:
+        update_references(before, instance.media_references())
+
+@receiver(post_delete, sender=Post)
+def release_media_references(sender, instance, **kwargs):
+    update_references(instance.media_references(), set())
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import tag_posts_view, trending_tags_view
+
+urlpatterns = [
+    path('trending/', trending_tags_view, name='trending_tags'),
+    path('<str:tag>/posts/', tag_posts_view, name='tag_posts'),
+]
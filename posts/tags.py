@@ -0,0 +1,116 @@
+"""Hashtags and @mentions.
+
+Post content is parsed when a post is created or edited (PostCreateSerializer)
+and every #hashtag and @mention is stored once as a normalized Tag, linked to
+the post through PostTag rows that carry the post's created_at, so a tag's
+posts are read newest first from the (tag, created_at, post) index.
+
+Trending hashtags come from TagTrendBucket: one counter per hashtag per minute,
+incremented as posts are tagged. ``trending`` reads only the buckets inside
+the ``TAG_TRENDING_WINDOW`` (minutes) and weighs each one by its age, halving
+every ``TAG_TRENDING_HALF_LIFE`` minutes, so the cost depends on how many
+hashtags were used recently, never on how many posts exist. Buckets that fall
+out of the window are deleted as new minutes start.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Tag, PostTag, TagTrendBucket
+
+HASHTAG = re.compile(r'(?<![\w#])#(\w{1,100})')
+MENTION = re.compile(r'(?<![\w@])@(\w{1,150})')
+
+
+def normalize(name):
+    return unicodedata.normalize('NFKC', name).casefold()
+
+
+def parse_tag(value):
+    """(kind, name) for a tag as given in a URL: 'python', '#python' or '@alice'"""
+    if value.startswith('@'):
+        return Tag.MENTION, normalize(value[1:])
+    return Tag.HASHTAG, normalize(value.lstrip('#'))
+
+
+def extract_tags(content):
+    """{(kind, name)} for the hashtags and mentions in `content`"""
+    found = {(Tag.HASHTAG, normalize(name)) for name in HASHTAG.findall(content)}
+    found |= {(Tag.MENTION, normalize(name)) for name in MENTION.findall(content)}
+    return found
+
+
+def get_or_create_tags(keys):
+    Tag.objects.bulk_create([Tag(kind=kind, name=name) for kind, name in keys], ignore_conflicts=True)
+    lookup = Q()
+    for kind, name in keys:
+        lookup |= Q(kind=kind, name=name)
+    return list(Tag.objects.filter(lookup))
+
+
+def tag_post(post, now=None):
+    """Sync the post's PostTag rows with its content. Returns the newly added tags."""
+    wanted = extract_tags(post.content)
+    existing = {
+        (post_tag.tag.kind, post_tag.tag.name): post_tag.id
+        for post_tag in PostTag.objects.filter(post=post).select_related('tag')
+    }
+    removed = [post_tag_id for key, post_tag_id in existing.items() if key not in wanted]
+    added = wanted - existing.keys()
+    
+    with transaction.atomic():
+        if removed:
+            PostTag.objects.filter(id__in=removed).delete()
+        if not added:
+            return []
+        tags = get_or_create_tags(added)
+        PostTag.objects.bulk_create(
+            [PostTag(post=post, tag=tag, created_at=post.created_at) for tag in tags],
+            ignore_conflicts=True,
+        )
+        for tag in tags:
+            if tag.kind == Tag.HASHTAG:
+                record_use(tag, now)
+    return tags
+
+
+def window():
+    return timedelta(minutes=getattr(settings, 'TAG_TRENDING_WINDOW', 60))
+
+
+def record_use(tag, now=None):
+    """Count one use of `tag` in the current minute's bucket"""
+    minute = (now or timezone.now()).replace(second=0, microsecond=0)
+    buckets = TagTrendBucket.objects.filter(tag=tag, minute=minute)
+    if buckets.update(count=F('count') + 1):
+        return
+    try:
+        with transaction.atomic():
+            TagTrendBucket.objects.create(tag=tag, minute=minute, count=1)
+    except IntegrityError:
+        # Another request created this minute's bucket first
+        buckets.update(count=F('count') + 1)
+        return
+    # First use of this tag this minute: drop buckets that left the window
+    TagTrendBucket.objects.filter(minute__lt=minute - window()).delete()
+
+
+def trending(limit=10, now=None):
+    """[(tag, score, uses)] for the hottest hashtags in the window, best first"""
+    now = now or timezone.now()
+    half_life = getattr(settings, 'TAG_TRENDING_HALF_LIFE', 15)
+    scores, uses = defaultdict(float), defaultdict(int)
+    
+    buckets = TagTrendBucket.objects.filter(minute__gt=now - window(), minute__lte=now)
+    for tag_id, minute, count in buckets.values_list('tag_id', 'minute', 'count'):
+        age = (now - minute).total_seconds() / 60
+        scores[tag_id] += count * 0.5 ** (age / half_life)
+        uses[tag_id] += count
+    
+    top = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    tags = Tag.objects.in_bulk([tag_id for tag_id, _ in top])
+    return [(tags[tag_id], score, uses[tag_id]) for tag_id, score in top if tag_id in tags]
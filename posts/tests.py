@@ -1,3 +1,602 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from unittest import mock, skipUnless
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from PIL import Image
+from users.models import User, Follow
+from .models import Post, Comment, Like, FeedEntry, PostCounterDelta, Tag, PostTag, TagTrendBucket
+from .serializers import PostSerializer
+from . import counters, tags, image_variants, imaging, timeline
+from utils.query_plans import plan_problems
 
-# Create your tests here.
+
+def make_user(username):
+    return User.objects.create_user(email=f'{username}@example.com', username=username, password='pass12345')
+
+
+class FeedTimelineTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def feed_ids(self):
+        response = self.client.get('/api/posts/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.data['results']]
+
+    def test_post_fans_out_to_followers(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        post = Post.objects.create(author=self.bob, content='hello')
+
+        self.assertTrue(FeedEntry.objects.filter(owner=self.alice, post=post).exists())
+        self.assertTrue(FeedEntry.objects.filter(owner=self.bob, post=post).exists())
+        self.assertEqual(self.feed_ids(), [post.id])
+
+    def test_follow_backfills_and_unfollow_retracts(self):
+        post = Post.objects.create(author=self.bob, content='before follow')
+        self.assertEqual(self.feed_ids(), [])
+
+        self.client.post(f'/api/users/{self.bob.id}/follow/')
+        self.assertEqual(self.feed_ids(), [post.id])
+
+        self.client.delete(f'/api/users/{self.bob.id}/follow/')
+        self.assertEqual(self.feed_ids(), [])
+
+    def test_deactivated_post_is_removed(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        post = Post.objects.create(author=self.bob, content='hello')
+        post.is_active = False
+        post.save()
+
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.feed_ids(), [])
+
+    @override_settings(FEED_TIMELINE_LENGTH=3)
+    def test_timeline_is_trimmed(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        posts = [Post.objects.create(author=self.bob, content=str(i)) for i in range(5)]
+
+        out = io.StringIO()
+        call_command('trim_timelines', stdout=out)
+
+        self.assertIn('Removed 4 timeline entries', out.getvalue())  # 2 from each of alice and bob
+        self.assertEqual(FeedEntry.objects.filter(owner=self.alice).count(), 3)
+        self.assertEqual(self.feed_ids(), [post.id for post in reversed(posts[2:])])
+
+    @override_settings(FEED_TIMELINE_LENGTH=3)
+    def test_posting_does_not_trim_in_the_request(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        for i in range(4):
+            Post.objects.create(author=self.bob, content=str(i))
+
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.create(author=self.bob, content='newest')
+        feed_queries = [q['sql'] for q in queries.captured_queries if 'posts_feedentry' in q['sql']]
+        self.assertEqual(len(feed_queries), 1)  # the fan-out insert
+        self.assertEqual(FeedEntry.objects.filter(owner=self.alice).count(), 5)
+
+    @override_settings(FEED_TIMELINE_LENGTH=3)
+    def test_trimming_probes_each_timeline_through_its_index(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        for i in range(5):
+            Post.objects.create(author=self.bob, content=str(i))
+
+        with CaptureQueriesContext(connection) as queries:
+            timeline.trim_timelines([self.alice.id, self.bob.id])
+        self.assertFalse([q for q in queries.captured_queries if 'COUNT(' in q['sql']])
+        self.assertEqual(plan_problems(queries.captured_queries), [])
+        self.assertEqual(FeedEntry.objects.filter(owner=self.alice).count(), 3)
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_large_accounts_fan_out_on_read(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        self.bob.refresh_from_db()
+        post = Post.objects.create(author=self.bob, content='celebrity post')
+
+        self.assertFalse(FeedEntry.objects.filter(owner=self.alice, post=post).exists())
+        self.assertEqual(self.feed_ids(), [post.id])
+
+    def test_pulled_posts_stay_when_author_drops_below_threshold(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        earlier = Post.objects.create(author=self.bob, content='before going viral')
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=0):
+            self.bob.refresh_from_db()
+            pulled = Post.objects.create(author=self.bob, content='celebrity post')
+        self.bob.refresh_from_db()
+        later = Post.objects.create(author=self.bob, content='back to normal')
+
+        self.assertTrue(pulled.fanout_on_read)
+        self.assertFalse(FeedEntry.objects.filter(owner=self.alice, post=pulled).exists())
+        self.assertEqual(self.feed_ids(), [later.id, pulled.id, earlier.id])
+
+        # A new follower gets the fanned-out posts copied, the pulled one merged
+        carol = make_user('carol')
+        Follow.objects.create(follower=carol, following=self.bob)
+        self.client.force_authenticate(carol)
+        self.assertEqual(self.feed_ids(), [later.id, pulled.id, earlier.id])
+
+
+class FeedPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.posts = [Post.objects.create(author=self.alice, content=str(i)) for i in range(45)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_cursor_walks_whole_feed(self):
+        seen = []
+        response = self.client.get('/api/posts/feed/')
+        while True:
+            seen += [post['id'] for post in response.data['results']]
+            if not response.data['has_next']:
+                break
+            response = self.client.get('/api/posts/feed/', {'cursor': response.data['next_cursor']})
+
+        self.assertEqual(seen, [post.id for post in reversed(self.posts)])
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_page_parameter_still_supported(self):
+        response = self.client.get('/api/posts/feed/', {'page': 3})
+
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertFalse(response.data['has_next'])
+        self.assertEqual(response.data['page'], 3)
+
+    def test_invalid_page_is_rejected(self):
+        for page in ('abc', '0', '-1', ''):
+            response = self.client.get('/api/posts/feed/', {'page': page})
+            self.assertEqual(response.status_code, 400, page)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/posts/feed/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ViewerStateTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        authors = [self.alice] + [make_user(f'author{i}') for i in range(4)]
+        for author in authors[1:3]:
+            Follow.objects.create(follower=self.alice, following=author)
+        self.posts = [Post.objects.create(author=authors[i % len(authors)], content=str(i)) for i in range(40)]
+        Like.objects.create(user=self.alice, post=self.posts[0])
+        self.request = APIRequestFactory().get('/api/posts/')
+        self.request.user = self.alice
+
+    def page_queries(self, page_size):
+        posts = Post.objects.filter(id__in=[post.id for post in self.posts[:page_size]]).select_related('author')
+        with CaptureQueriesContext(connection) as ctx:
+            data = PostSerializer(posts, many=True, context={'request': self.request}).data
+        self.assertEqual(len(data), page_size)
+        return ctx.captured_queries
+
+    def test_viewer_state_resolved_in_constant_queries_per_page(self):
+        # The page itself, the viewer's likes and the followed authors
+        self.assertEqual(len(self.page_queries(5)), 3)
+        self.assertEqual(len(self.page_queries(40)), 3)
+
+    def test_is_liked_values(self):
+        data = PostSerializer(self.posts[:2], many=True, context={'request': self.request}).data
+        self.assertEqual([post['is_liked'] for post in data], [True, False])
+
+        single = PostSerializer(self.posts[0], context={'request': self.request}).data
+        self.assertTrue(single['is_liked'])
+
+    def test_is_following_values(self):
+        data = PostSerializer(self.posts[:5], many=True, context={'request': self.request}).data
+        self.assertEqual([post['author']['is_following'] for post in data], [False, True, True, False, False])
+
+        single = PostSerializer(self.posts[1], context={'request': self.request}).data
+        self.assertTrue(single['author']['is_following'])
+
+
+@override_settings(POST_COUNTER_WRITE_BEHIND=True)
+class BufferedCounterTests(TransactionTestCase):
+    def setUp(self):
+        self.author = make_user('author')
+        self.post = Post.objects.create(author=self.author, content='viral')
+
+    def tearDown(self):
+        # Tuned connections switch the test database to WAL; switch it back
+        if connection.vendor == 'sqlite':
+            connection.close()
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode = DELETE')
+
+    # Several request threads writing to one SQLite file, as in production:
+    # the threads' connections wait for the write lock instead of failing
+    @override_settings(SQLITE_TUNING=True)
+    def test_concurrent_likes_and_comments_are_not_lost(self):
+        workers, users_per_worker = 8, 5
+        likers = [[make_user(f'liker{w}-{i}') for i in range(users_per_worker)] for w in range(workers)]
+        errors = []
+
+        def like_and_comment(users):
+            client = APIClient()
+            try:
+                for user in users:
+                    client.force_authenticate(user)
+                    liked = client.post(f'/api/posts/{self.post.id}/like/')
+                    commented = client.post(f'/api/posts/{self.post.id}/comments/', {'content': 'nice'})
+                    if (liked.status_code, commented.status_code) != (201, 201):
+                        errors.append((user.username, liked.status_code, commented.status_code))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=like_and_comment, args=(users,)) for users in likers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        total = workers * users_per_worker
+        self.assertEqual(errors, [])
+        self.assertEqual(counters.pending_deltas([self.post.id])[self.post.id], {'like_count': total, 'comment_count': total})
+
+        while counters.flush(batch_size=50):
+            pass
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (total, total))
+        self.assertEqual(Like.objects.filter(post=self.post).count(), total)
+        self.assertFalse(PostCounterDelta.objects.exists())
+
+    def test_reads_merge_pending_deltas(self):
+        liker = make_user('liker')
+        client = APIClient()
+        client.force_authenticate(liker)
+        client.post(f'/api/posts/{self.post.id}/like/')
+        client.post(f'/api/posts/{self.post.id}/comments/', {'content': 'nice'})
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 0))
+
+        data = client.get(f'/api/posts/{self.post.id}/').data
+        self.assertEqual((data['like_count'], data['comment_count']), (1, 1))
+        listed = client.get('/api/posts/').data['results'][0]
+        self.assertEqual((listed['like_count'], listed['comment_count']), (1, 1))
+
+        client.delete(f'/api/posts/{self.post.id}/like/')
+        counters.flush()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 1))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        self.posts = [Post.objects.create(author=self.bob, content=str(i)) for i in range(25)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def assertIndexed(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, data)
+        self.assertLess(response.status_code, 400)
+        self.assertEqual(plan_problems(queries.captured_queries), [])
+
+    def test_post_list(self):
+        self.assertIndexed('get', '/api/posts/')
+
+    def test_feed(self):
+        response = self.client.get('/api/posts/feed/')
+        self.assertIndexed('get', '/api/posts/feed/', {'cursor': response.data['next_cursor']})
+
+    def test_follow_backfill(self):
+        carol = make_user('carol')
+        self.client.force_authenticate(carol)
+        self.assertIndexed('post', f'/api/users/{self.bob.id}/follow/')
+
+    def test_comments(self):
+        post = self.posts[0]
+        self.client.post(f'/api/posts/{post.id}/comments/', {'content': 'hi'})
+        self.assertIndexed('get', f'/api/posts/{post.id}/comments/')
+
+    def test_like(self):
+        self.assertIndexed('post', f'/api/posts/{self.posts[0].id}/like/')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Uses the SQLite FTS5 backend')
+class PostSearchTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def search(self, **params):
+        response = self.client.get('/api/posts/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def ids(self, **params):
+        return [post['id'] for post in self.search(**params).data['results']]
+
+    def test_ranks_content_matches_and_follows_edits(self):
+        weak = Post.objects.create(author=self.bob, content='Gardening tips for the weekend')
+        strong = Post.objects.create(author=self.bob, content='Gardening gardening: my gardening journal')
+        Post.objects.create(author=self.bob, content='Nothing relevant')
+
+        self.assertEqual(self.ids(q='gardening'), [strong.id, weak.id])
+        self.assertEqual(self.ids(q='garden'), [strong.id, weak.id])  # stemmed
+
+        weak.content = 'Cooking tips'
+        weak.save()
+        self.assertEqual(self.ids(q='gardening'), [strong.id])
+
+    def test_comments_are_searchable_and_deactivated_posts_are_not(self):
+        post = Post.objects.create(author=self.bob, content='Holiday photos')
+        self.client.post(f'/api/posts/{post.id}/comments/', {'content': 'Lovely beaches in Portugal'})
+        self.assertEqual(self.ids(q='portugal'), [post.id])
+
+        post.deactivate()
+        self.assertEqual(self.ids(q='portugal'), [])
+
+    def test_each_comment_is_indexed_on_its_own(self):
+        post = Post.objects.create(author=self.bob, content='Holiday photos')
+        self.client.post(f'/api/posts/{post.id}/comments/', {'content': 'Lovely beaches'})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/api/posts/{post.id}/comments/', {'content': 'Portugal in spring'})
+        index_writes = [q['sql'] for q in queries if 'search' in q['sql']]
+        self.assertEqual(len(index_writes), 2)  # delete + insert of this comment's row only
+        self.assertTrue(all('posts_comment_search' in sql for sql in index_writes))
+
+        # Tokens have to match within one document: the content or a single comment
+        self.assertEqual(self.ids(q='holiday portugal'), [])
+        self.assertEqual(self.ids(q='portugal spring'), [post.id])
+
+        self.client.delete(f'/api/posts/comments/{response.data["id"]}/')
+        self.assertEqual(self.ids(q='portugal'), [])
+
+    def test_content_match_outranks_comment_match(self):
+        commented = Post.objects.create(author=self.bob, content='Weekend')
+        Comment.objects.create(post=commented, author=self.alice, content='Kayaking looks fun')
+        about = Post.objects.create(author=self.bob, content='Kayaking trip')
+
+        self.assertEqual(self.ids(q='kayaking'), [about.id, commented.id])
+
+    def test_saving_only_the_image_url_skips_the_index(self):
+        post = Post.objects.create(author=self.bob, content='Sunset')
+        post.image_url = 'http://testserver/media/blobs/sunset.png'
+        with CaptureQueriesContext(connection) as queries:
+            post.save(update_fields=['image_url'])
+        self.assertFalse([q for q in queries if 'search' in q['sql']])
+        self.assertEqual(self.ids(q='sunset'), [post.id])
+
+    def test_filters(self):
+        question = Post.objects.create(author=self.bob, content='Any python tips?', category='question')
+        mine = Post.objects.create(author=self.alice, content='Python tips inside')
+
+        self.assertEqual(self.ids(q='python', category='question'), [question.id])
+        self.assertEqual(self.ids(q='python', author=self.alice.id), [mine.id])
+
+    def test_cursor_pages_through_all_results(self):
+        posts = [Post.objects.create(author=self.bob, content=f'django {"django " * (i % 5)}{i}') for i in range(45)]
+
+        seen, params = [], {'q': 'django'}
+        while True:
+            response = self.search(**params)
+            seen += [post['id'] for post in response.data['results']]
+            if not response.data['has_next']:
+                break
+            params['cursor'] = response.data['next_cursor']
+
+        self.assertEqual(sorted(seen), sorted(post.id for post in posts))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_query_syntax_is_not_interpreted(self):
+        Post.objects.create(author=self.bob, content='Stay near, and/or go far')
+        self.assertEqual(len(self.ids(q='"and* OR NEAR(')), 1)
+
+
+class TagTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def create(self, content):
+        response = self.client.post('/api/posts/', {'content': content})
+        self.assertEqual(response.status_code, 201)
+        return Post.objects.latest('id')
+
+    def tag_names(self, post):
+        return {str(post_tag.tag) for post_tag in PostTag.objects.filter(post=post).select_related('tag')}
+
+    def test_parses_and_normalizes_on_create_and_edit(self):
+        post = self.create('Loving #Django and #django, thanks @Bob! mail: me@example.com ##x')
+        self.assertEqual(self.tag_names(post), {'#django', '@bob'})
+
+        self.client.patch(f'/api/posts/{post.id}/', {'content': 'Now #python only'})
+        self.assertEqual(self.tag_names(post), {'#python'})
+        self.assertEqual(Tag.objects.count(), 3)
+
+    def test_tag_posts_pages_newest_first(self):
+        posts = [self.create(f'#Weekend post {i}') for i in range(25)]
+        self.create('untagged')
+        posts[3].deactivate()
+
+        response = self.client.get('/api/tags/weekend/posts/')
+        self.assertEqual(response.data['tag'], '#weekend')
+        seen = [post['id'] for post in response.data['results']]
+        response = self.client.get('/api/tags/weekend/posts/', {'cursor': response.data['next_cursor']})
+        seen += [post['id'] for post in response.data['results']]
+
+        self.assertFalse(response.data['has_next'])
+        self.assertEqual(seen, [post.id for post in reversed(posts) if post.id != posts[3].id])
+        self.assertEqual(self.client.get('/api/tags/missing/posts/').status_code, 404)
+
+    def test_tag_posts_query_is_indexed(self):
+        for i in range(5):
+            self.create(f'#news {i}')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/tags/news/posts/')
+        self.assertEqual(plan_problems(queries.captured_queries), [])
+
+    def test_trending_decays_with_age(self):
+        now = timezone.now()
+        old, new = tags.get_or_create_tags([(Tag.HASHTAG, 'old'), (Tag.HASHTAG, 'new')])
+        if old.name != 'old':
+            old, new = new, old
+        for _ in range(4):
+            tags.record_use(old, now - timedelta(minutes=45))
+        for _ in range(2):
+            tags.record_use(new, now)
+
+        ranked = [(tag.name, uses) for tag, score, uses in tags.trending(now=now)]
+        self.assertEqual(ranked, [('new', 2), ('old', 4)])
+        self.assertEqual(TagTrendBucket.objects.count(), 2)
+
+        # Buckets that leave the window are dropped as new minutes start
+        tags.record_use(new, now + timedelta(minutes=20))
+        self.assertEqual(TagTrendBucket.objects.filter(tag=old).count(), 0)
+
+    def test_trending_endpoint_counts_new_posts(self):
+        self.create('#launch day')
+        self.create('#launch again with #party')
+        response = self.client.get('/api/tags/trending/')
+        self.assertEqual([(row['tag'], row['uses']) for row in response.data['results']], [('launch', 2), ('party', 1)])
+
+
+def make_jpeg(width, height, orientation=None):
+    image = Image.new('RGB', (width, height), (200, 30, 30))
+    exif = Image.Exif()
+    exif[0x010F] = 'TestCam'
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media, IMAGE_VARIANT_WORKERS=0)
+        self.settings_override.enable()
+        self.alice = make_user('alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media)
+
+    def test_variants_are_generated_after_commit(self):
+        # Orientation 6: stored landscape, displayed rotated to portrait
+        upload = SimpleUploadedFile('holiday.jpg', make_jpeg(2000, 1000, orientation=6), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/posts/', {'content': 'Beach', 'image': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.latest('id')
+        self.assertEqual(post.image_variants, {})
+        self.assertIsNone(self.client.get(f'/api/posts/{post.id}/').data['image_srcset'])
+
+        for callback in callbacks:
+            callback()
+        post.refresh_from_db()
+
+        sizes = {label: (variant['width'], variant['height']) for label, variant in post.image_variants.items()}
+        self.assertEqual(sizes, {'thumbnail': (320, 640), 'card': (640, 1280), 'full': (1000, 2000)})
+
+        card = post.image_variants['card']
+        for fmt in ('webp', 'jpeg'):
+            with Image.open(f"{self.media}/{card[fmt].split('/media/', 1)[1]}") as image:
+                self.assertEqual(image.size, (640, 1280))
+                self.assertEqual(len(image.getexif()), 0)
+
+        srcset = self.client.get(f'/api/posts/{post.id}/').data['image_srcset']
+        self.assertEqual(len(srcset['webp'].split(', ')), 3)
+        # Absolute like image_url, for a frontend on another origin
+        self.assertTrue(all(entry.startswith('http://testserver/media/blobs/') for entry in srcset['webp'].split(', ')))
+        self.assertTrue(srcset['jpeg'].endswith(' 1000w'))
+
+    def test_command_generates_missing_variants_in_chunks(self):
+        for i in range(5):
+            with open(f'{self.media}/{i}.jpg', 'wb') as f:
+                f.write(make_jpeg(200, 100))
+            Post.objects.create(author=self.alice, content=str(i), image_url=f'http://testserver/media/{i}.jpg')
+        Post.objects.create(author=self.alice, content='external', image_url='https://cdn.example.com/x.jpg')
+
+        out = io.StringIO()
+        call_command('generate_image_variants', stdout=out)
+
+        self.assertIn('Generated variants for 5 posts (1 external images skipped, 0 failed)', out.getvalue())
+        self.assertFalse(Post.objects.filter(image_variants={}).exclude(image_url__startswith='https://cdn').exists())
+
+    def test_render_failure_does_not_fail_the_upload(self):
+        upload = SimpleUploadedFile('holiday.jpg', make_jpeg(200, 100), content_type='image/jpeg')
+        with mock.patch.object(imaging, 'render_variants', side_effect=OSError('truncated image')):
+            with self.assertLogs('django.test', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/posts/', {'content': 'Beach', 'image': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Post.objects.latest('id').image_variants, {})
+
+    def test_images_are_not_upscaled(self):
+        post = Post.objects.create(author=self.alice, content='Tiny', image_url='http://testserver/media/posts/tiny.jpg')
+        with open(f'{self.media}/tiny.jpg', 'wb') as f:
+            f.write(make_jpeg(200, 100))
+        image_variants.generate(post.id, 'tiny.jpg').result()
+
+        post.refresh_from_db()
+        self.assertEqual({variant['width'] for variant in post.image_variants.values()}, {200})
+        self.assertTrue(image_variants.srcset(post.image_variants)['webp'].endswith('.webp 200w'))
+        self.assertEqual(len(image_variants.srcset(post.image_variants)['webp'].split(', ')), 1)
+
+
+class ImageVariantPoolTests(TransactionTestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media, IMAGE_VARIANT_WORKERS=1)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        if image_variants._pool is not None:
+            image_variants._pool.shutdown()
+            image_variants._pool = None
+        self.settings_override.disable()
+        shutil.rmtree(self.media)
+
+    def test_renders_in_worker_process(self):
+        post = Post.objects.create(author=make_user('alice'), content='Big', image_url='http://testserver/media/big.jpg')
+        with open(f'{self.media}/big.jpg', 'wb') as f:
+            f.write(make_jpeg(3000, 2000))
+
+        variants = image_variants.generate(post.id, 'big.jpg').result(timeout=60)
+
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants, variants)
+        self.assertEqual(variants['full']['height'], 853)
+
+    def test_broken_pool_is_replaced(self):
+        post = Post.objects.create(author=make_user('alice'), content='Big', image_url='http://testserver/media/big.jpg')
+        with open(f'{self.media}/big.jpg', 'wb') as f:
+            f.write(make_jpeg(300, 200))
+        broken = image_variants.get_pool()
+        broken.submit(os._exit, 1)  # a worker dying breaks the whole pool
+
+        with self.assertRaises(BrokenProcessPool):
+            image_variants.generate(post.id, 'big.jpg').result(timeout=60)
+        variants = image_variants.generate(post.id, 'big.jpg').result(timeout=60)
+
+        self.assertIsNot(image_variants._pool, broken)
+        self.assertEqual(variants['full']['width'], 300)
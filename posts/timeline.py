@@ -0,0 +1,140 @@
+"""Materialized home timelines (fan-out-on-write).
+
+When a post is created it is copied into the ``FeedEntry`` table of every
+follower, so reading a feed is an indexed range scan over one owner's rows
+instead of a sort over every post by everyone they follow. Authors with more
+than ``FEED_FANOUT_MAX_FOLLOWERS`` followers are skipped at write time and
+merged in when the feed is read (fan-out-on-read), so a single celebrity post
+doesn't turn into a write storm. Such posts are flagged ``fanout_on_read``
+when they are created and merged by that flag, so they stay in feeds when the
+author later drops back under the threshold.
+
+Timelines are cut back to ``FEED_TIMELINE_LENGTH`` entries by the
+``trim_timelines`` command rather than on every post, which would cost a
+probe per follower inside the request; in between runs a timeline can run a
+little over, which reads don't notice (they walk it newest first).
+"""
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Q
+
+from users.models import Follow
+from .models import Post, FeedEntry
+
+
+def timeline_length():
+    return getattr(settings, 'FEED_TIMELINE_LENGTH', 800)
+
+
+def fanout_max_followers():
+    return getattr(settings, 'FEED_FANOUT_MAX_FOLLOWERS', 5000)
+
+
+def is_fanout_on_read(user):
+    """Whether `user` has too many followers to fan their posts out on write"""
+    return user.followers_count() > fanout_max_followers()
+
+
+def fan_out_post(post):
+    """Push a newly created post into its author's and followers' timelines"""
+    owner_ids = [post.author_id]
+    if not post.fanout_on_read:
+        owner_ids += list(
+            Follow.objects.filter(following_id=post.author_id).values_list('follower_id', flat=True)
+        )
+
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(owner_id=owner_id, post=post, created_at=post.created_at) for owner_id in owner_ids],
+        ignore_conflicts=True,
+    )
+
+
+def remove_post(post):
+    """Drop a deactivated post from every timeline"""
+    FeedEntry.objects.filter(post=post).delete()
+
+
+def backfill_follow(follower, following):
+    """Copy recent posts of a newly followed user into the follower's timeline"""
+    # Their fan-out-on-read posts are merged in when the feed is read
+    recent_posts = Post.objects.filter(
+        author=following, is_active=True, fanout_on_read=False
+    ).order_by('-created_at').values_list('id', 'created_at')[:timeline_length()]
+
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(owner=follower, post_id=post_id, created_at=created_at) for post_id, created_at in recent_posts],
+        ignore_conflicts=True,
+    )
+    trim_timelines([follower.id])
+
+
+def retract_follow(follower, following):
+    """Remove an unfollowed user's posts from the follower's timeline"""
+    FeedEntry.objects.filter(owner=follower, post__author=following).delete()
+
+
+def trim_timelines(owner_ids):
+    """Cut every given timeline back to the newest `FEED_TIMELINE_LENGTH` entries. Returns how many were removed."""
+    limit, removed = timeline_length(), 0
+    for owner_id in owner_ids:
+        # Probe for the first entry past the limit by walking the owner's
+        # (owner, -created_at, -post) index; only overflowing timelines
+        # have one, and that's where the delete starts
+        entries = FeedEntry.objects.filter(owner_id=owner_id)
+        cutoff = list(
+            entries.order_by('-created_at', '-post_id').values_list('created_at', 'post_id')[limit:limit + 1]
+        )
+        if not cutoff:
+            continue
+        created_at, post_id = cutoff[0]
+        removed += entries.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, post_id__lte=post_id)
+        ).delete()[0]
+    return removed
+
+
+def rebuild_timeline(user):
+    """Recompute a user's timeline from scratch"""
+    FeedEntry.objects.filter(owner=user).delete()
+
+    following_ids = Follow.objects.filter(follower=user).values_list('following_id', flat=True)
+    recent_posts = Post.objects.filter(
+        Q(author_id__in=following_ids, fanout_on_read=False) | Q(author=user),
+        is_active=True
+    ).order_by('-created_at').values_list('id', 'created_at')[:timeline_length()]
+
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(owner=user, post_id=post_id, created_at=created_at) for post_id, created_at in recent_posts],
+        ignore_conflicts=True,
+    )
+
+
+# Fields home_timeline() is ordered by; pass them to keyset_page
+TIMELINE_ORDER = ('feed_created_at', 'feed_post_id')
+
+
+def home_timeline(user):
+    """Posts for `user`'s home feed, ordered newest first by TIMELINE_ORDER"""
+    # Posts written while their author was over the fan-out threshold never
+    # went into timelines, so they are merged in at read time: one probe of
+    # the small fan-out-on-read index per followed account
+    pulled = Post.objects.filter(author=OuterRef('following_id'), is_active=True, fanout_on_read=True)
+    fanout_on_read_authors = list(
+        Follow.objects.filter(follower=user).filter(Exists(pulled)).values_list('following_id', flat=True)
+    )
+
+    if not fanout_on_read_authors:
+        # Common case: walk the owner's FeedEntry index in order (its
+        # created_at/post_id are the post's), no sort needed
+        posts = Post.objects.filter(feed_entries__owner=user, is_active=True).annotate(
+            feed_created_at=F('feed_entries__created_at'), feed_post_id=F('feed_entries__post_id')
+        )
+    else:
+        # Merging in pulled posts means sorting the union; it only happens
+        # for users who follow accounts over the fan-out threshold
+        materialized = FeedEntry.objects.filter(owner=user).values('post_id')
+        posts = Post.objects.filter(
+            Q(id__in=materialized) | Q(author_id__in=fanout_on_read_authors, fanout_on_read=True),
+            is_active=True
+        ).annotate(feed_created_at=F('created_at'), feed_post_id=F('id'))
+
+    return posts.select_related('author').order_by('-feed_created_at', '-feed_post_id')
@@ -4,10 +4,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
 from PIL import Image
-import uuid
-import os
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -33,12 +30,9 @@ def upload_image(request):
         img = Image.open(image_file)
         img.verify()
         
-        # Generate unique filename
-        file_extension = os.path.splitext(image_file.name)[1]
-        filename = f"posts/{uuid.uuid4()}{file_extension}"
-        
-        # Save file locally (in production, use Supabase Storage)
-        file_path = default_storage.save(filename, ContentFile(image_file.read()))
+        # Stored under its content hash (utils.storage): streamed in chunks,
+        # and identical uploads share one file
+        file_path = default_storage.save(f"posts/{image_file.name}", image_file)
         file_url = default_storage.url(file_path)
         
         return Response({
@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
     PostListCreateView, PostDetailView, like_post, like_status,
-    PostCommentsView, CommentDetailView, feed_view
+    PostCommentsView, CommentDetailView, feed_view, search_posts_view
 )
 from .upload_views import upload_image
 
@@ -13,5 +13,6 @@ urlpatterns = [
     path('<int:post_id>/comments/', PostCommentsView.as_view(), name='post_comments'),
     path('comments/<int:pk>/', CommentDetailView.as_view(), name='comment_detail'),
     path('feed/', feed_view, name='feed'),
+    path('search/', search_posts_view, name='search_posts'),
     path('upload-image/', upload_image, name='upload_image'),
 ]
\ No newline at end of file
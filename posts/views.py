@@ -2,19 +2,26 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.db.models import F
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from .models import Post, Like, Comment
+from .models import Post, Like, Comment, Tag
 from .serializers import PostSerializer, PostCreateSerializer, CommentSerializer, LikeSerializer
-from notifications.models import Notification
-from users.models import Follow
+from .timeline import home_timeline, TIMELINE_ORDER
+from . import counters
+from .search import search_posts
+from .tags import parse_tag, trending
+from utils.pagination import KeysetPagination, keyset_page, encode_cursor, encode_rank_cursor, decode_rank_cursor, InvalidCursor
+from utils import write_queue
 
 class PostListCreateView(generics.ListCreateAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
+    # Keyset pages walk the active-posts index and stop; page numbers would
+    # COUNT(*) every active post on each request
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        return Post.objects.filter(is_active=True).order_by('-created_at')
+        return Post.objects.filter(is_active=True).select_related('author').order_by('-created_at')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -48,32 +55,25 @@ def like_post(request, post_id):
     post = get_object_or_404(Post, id=post_id, is_active=True)
     
     if request.method == 'POST':
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        def add_like():
+            like, created = Like.objects.get_or_create(user=request.user, post=post)
+            if created:
+                counters.increment(post.id, 'like_count', 1)
+            return created
         
-        if created:
-            post.like_count += 1
-            post.save(update_fields=['like_count'])
-            
-            # Create notification if not liking own post
-            if post.author != request.user:
-                Notification.objects.create(
-                    recipient=post.author,
-                    sender=request.user,
-                    notification_type='like',
-                    post=post,
-                    message=f'{request.user.username} liked your post'
-                )
-            
+        if write_queue.run(add_like):
             return Response({"message": "Post liked"}, status=status.HTTP_201_CREATED)
         else:
             return Response({"message": "Already liked"}, status=status.HTTP_200_OK)
     
     elif request.method == 'DELETE':
-        try:
+        def remove_like():
             like = Like.objects.get(user=request.user, post=post)
             like.delete()
-            post.like_count = max(0, post.like_count - 1)
-            post.save(update_fields=['like_count'])
+            counters.increment(post.id, 'like_count', -1)
+        
+        try:
+            write_queue.run(remove_like)
             return Response({"message": "Post unliked"}, status=status.HTTP_200_OK)
         except Like.DoesNotExist:
             return Response({"error": "Not liked"}, status=status.HTTP_400_BAD_REQUEST)
@@ -96,21 +96,11 @@ class PostCommentsView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         post_id = self.kwargs['post_id']
         post = get_object_or_404(Post, id=post_id, is_active=True)
-        comment = serializer.save(author=self.request.user, post=post)
+        def add_comment():
+            serializer.save(author=self.request.user, post=post)
+            counters.increment(post.id, 'comment_count', 1)
         
-        # Update comment count
-        post.comment_count += 1
-        post.save(update_fields=['comment_count'])
-        
-        # Create notification if not commenting on own post
-        if post.author != self.request.user:
-            Notification.objects.create(
-                recipient=post.author,
-                sender=self.request.user,
-                notification_type='comment',
-                post=post,
-                message=f'{self.request.user.username} commented on your post'
-            )
+        write_queue.run(add_comment)
 
 class CommentDetailView(generics.DestroyAPIView):
     queryset = Comment.objects.filter(is_active=True)
@@ -124,34 +114,122 @@ class CommentDetailView(generics.DestroyAPIView):
         return obj
     
     def perform_destroy(self, instance):
-        post = instance.post
-        post.comment_count = max(0, post.comment_count - 1)
-        post.save(update_fields=['comment_count'])
+        counters.increment(instance.post_id, 'comment_count', -1)
         instance.delete()
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def feed_view(request):
-    # Get users that current user follows
-    following_users = Follow.objects.filter(follower=request.user).values_list('following', flat=True)
+    posts = home_timeline(request.user)
+    
+    page_size = 20
+    
+    # Legacy page/offset pagination, kept for clients that still send ?page=
+    if 'page' in request.GET and 'cursor' not in request.GET:
+        try:
+            page = int(request.GET['page'])
+            if page < 1:
+                raise ValueError(page)
+        except ValueError:
+            return Response({"error": "page must be a positive number"}, status=status.HTTP_400_BAD_REQUEST)
+        start = (page - 1) * page_size
+        rows = list(posts[start:start + page_size + 1])
+        posts_page = rows[:page_size]
+        serializer = PostSerializer(posts_page, many=True, context={'request': request})
+        
+        return Response({
+            'results': serializer.data,
+            'has_next': len(rows) > page_size,
+            'next_cursor': encode_cursor(posts_page[-1].created_at, posts_page[-1].id) if len(rows) > page_size else None,
+            'page': page
+        })
+    
+    try:
+        posts_page, next_cursor = keyset_page(posts, request.GET.get('cursor'), page_size, fields=TIMELINE_ORDER)
+    except InvalidCursor:
+        return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = PostSerializer(posts_page, many=True, context={'request': request})
+    
+    return Response({
+        'results': serializer.data,
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_posts_view(request):
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    author = request.GET.get('author')
+    if author is not None and not author.isdigit():
+        return Response({"error": "author must be a user id"}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Get posts from followed users + own posts
-    posts = Post.objects.filter(
-        Q(author__in=following_users) | Q(author=request.user),
-        is_active=True
-    ).order_by('-created_at')
+    try:
+        after = decode_rank_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except InvalidCursor:
+        return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Pagination
-    page = int(request.GET.get('page', 1))
     page_size = 20
-    start = (page - 1) * page_size
-    end = start + page_size
+    hits = search_posts(
+        query, limit=page_size + 1, after=after,
+        category=request.GET.get('category'), author_id=int(author) if author else None,
+    )
+    next_cursor = None
+    if len(hits) > page_size:
+        post_id, score = hits[page_size - 1]
+        next_cursor = encode_rank_cursor(score, post_id)
+    hits = hits[:page_size]
+    
+    posts = Post.objects.select_related('author').in_bulk([post_id for post_id, _ in hits])
+    serializer = PostSerializer([posts[post_id] for post_id, _ in hits if post_id in posts], many=True, context={'request': request})
+    
+    return Response({
+        'results': serializer.data,
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def tag_posts_view(request, tag):
+    kind, name = parse_tag(tag)
+    tag = get_object_or_404(Tag, kind=kind, name=name)
+    
+    # Ordered by the PostTag copy of created_at so the page is read from the
+    # (tag, created_at, post) index instead of sorting the tag's posts
+    posts = Post.objects.filter(post_tags__tag=tag, is_active=True).annotate(
+        tagged_at=F('post_tags__created_at'), tagged_post_id=F('post_tags__post_id')
+    ).select_related('author')
+    
+    try:
+        posts_page, next_cursor = keyset_page(posts, request.GET.get('cursor'), 20, fields=('tagged_at', 'tagged_post_id'))
+    except InvalidCursor:
+        return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
     
-    posts_page = posts[start:end]
     serializer = PostSerializer(posts_page, many=True, context={'request': request})
     
     return Response({
+        'tag': str(tag),
         'results': serializer.data,
-        'has_next': len(posts) > end,
-        'page': page
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def trending_tags_view(request):
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'results': [
+            {'tag': tag.name, 'score': round(score, 3), 'uses': uses}
+            for tag, score, uses in trending(limit)
+        ]
     })
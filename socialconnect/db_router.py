@@ -0,0 +1,95 @@
+"""Read-replica routing.
+
+``ReplicaRoutingMiddleware`` marks safe-method requests (GET, HEAD, OPTIONS)
+as replica reads, and ``ReplicaRouter`` then sends their reads to one of the
+``DATABASE_REPLICAS`` aliases. Writes always go to ``default``, as does
+everything outside a request (management commands, workers).
+
+Read-your-writes: a request with an unsafe method marks its client as sticky
+for ``REPLICA_STICKY_SECONDS``, and that client's reads stay on the primary
+until the replicas have had time to catch up. Clients are identified by their
+Authorization header (or session / address when there is none) and the marker
+is kept in the default cache. A marker in a per-process cache would not pin
+the client's next read if it landed on another worker, so replicas are only
+read from when the default cache is shared (see ``utils.caching``); with the
+local-memory default every read stays on the primary.
+"""
+import hashlib
+import os
+import random
+import sqlite3
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from utils import caching
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if aliases and _use_replica.get():
+            return random.choice(aliases)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of default, so objects from any alias can be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db not in replicas()
+
+
+def client_key(request):
+    identity = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or getattr(getattr(request, 'session', None), 'session_key', None)
+        or request.META.get('REMOTE_ADDR', '')
+    )
+    return 'db-sticky:' + hashlib.sha256(identity.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = client_key(request)
+        if request.method not in SAFE_METHODS:
+            cache.set(key, True, getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+            return self.get_response(request)
+
+        token = _use_replica.set(bool(replicas()) and caching.is_shared() and not cache.get(key))
+        try:
+            return self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+
+def copy_sqlite_database(target, using='default'):
+    """Copy the committed state of the `using` SQLite database to the file `target`.
+
+    Uses the backup API on a separate connection. The copy is written next to
+    `target` and moved into place, so readers opening `target` see either the
+    old or the new snapshot, never a partial one.
+    """
+    partial = f'{target}.partial'
+    source = sqlite3.connect(settings.DATABASES[using]['NAME'])
+    destination = sqlite3.connect(partial)
+    try:
+        source.backup(destination)
+    finally:
+        destination.close()
+        source.close()
+    os.replace(partial, target)
@@ -45,17 +45,20 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'authentication',
     'users',
     'posts',
     'notifications',
+    'utils',
 ]
 
 MIDDLEWARE = [
     'socialconnect.cors_middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'socialconnect.db_router.ReplicaRoutingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -103,9 +106,45 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # File-backed test database so concurrency tests can use real
+        # connections from several threads (in-memory SQLite can't)
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Read replicas: comma-separated aliases, e.g. DATABASE_REPLICAS=replica1,replica2.
+# Safe-method requests read from them (see socialconnect/db_router.py). Locally
+# they are SQLite copies of the primary refreshed by `manage.py sync_replicas --loop`.
+DATABASE_REPLICAS = [alias for alias in os.getenv('DATABASE_REPLICAS', '').split(',') if alias]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db.{alias}.sqlite3',
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+
+DATABASE_ROUTERS = ['socialconnect.db_router.ReplicaRouter']
+
+# Production SQLite mode for several worker processes (see utils/sqlite.py and
+# utils/write_queue.py): WAL and connection pragmas, and batched writes.
+SQLITE_TUNING = os.getenv('SQLITE_TUNING', 'False') == 'True'
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000'))  # ms
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))  # bytes
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', str(64 * 1024)))
+SQLITE_TRANSACTION_MODE = os.getenv('SQLITE_TRANSACTION_MODE', 'IMMEDIATE')
+SQLITE_WRITE_QUEUE = os.getenv('SQLITE_WRITE_QUEUE', 'False') == 'True'
+SQLITE_WRITE_BATCH_SIZE = int(os.getenv('SQLITE_WRITE_BATCH_SIZE', '64'))
+SQLITE_WRITE_BATCH_WAIT = int(os.getenv('SQLITE_WRITE_BATCH_WAIT', '2'))  # ms
+
+# After a write, the client's reads stay on the primary this long. Keep it
+# above the replica refresh interval. The markers live in the default cache,
+# and replicas are only read from when it is shared (CACHE_BACKEND below).
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -151,7 +190,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.cached_auth.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -166,6 +205,35 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'authentication.serializers.RevocationAwareTokenRefreshSerializer',
+}
+
+# Revoked refresh tokens (authentication/revocation.py): sizing of the
+# per-process Bloom filter, how often it picks up revocations made by other
+# processes, and how often it is rebuilt to drop expired tokens (seconds).
+# Each sync re-reads the revocations of the overlap before the previous one,
+# so rows committed out of id order are still picked up; keep it above the
+# longest write transaction.
+REVOKED_TOKEN_FILTER_CAPACITY = int(os.getenv('REVOKED_TOKEN_FILTER_CAPACITY', '100000'))
+REVOKED_TOKEN_FILTER_ERROR_RATE = 0.001
+REVOKED_TOKEN_SYNC_SECONDS = int(os.getenv('REVOKED_TOKEN_SYNC_SECONDS', '5'))
+REVOKED_TOKEN_SYNC_OVERLAP_SECONDS = int(os.getenv('REVOKED_TOKEN_SYNC_OVERLAP_SECONDS', '60'))
+REVOKED_TOKEN_REBUILD_SECONDS = 3600
+
+# Seconds an authenticated user stays cached by CachedJWTAuthentication.
+# Invalidation goes through the cache, so users are only cached when CACHES
+# points at a backend shared by all processes (not the local-memory default)
+AUTH_USER_CACHE_SECONDS = int(os.getenv('AUTH_USER_CACHE_SECONDS', '300'))
+
+# Default cache. Per-process local memory unless set; user caching and
+# replica reads (read-your-writes markers) need a shared one, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://127.0.0.1:6379/0
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
 }
 
 # Disable CSRF for API endpoints
@@ -182,16 +250,101 @@ ALLOWED_HOSTS = ['*']
 SUPABASE_URL = os.getenv('SUPABASE_URL', '')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY', '')
 SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY', '')
+SUPABASE_SYNC_TIMEOUT = 10
+SUPABASE_SYNC_MAX_ATTEMPTS = 10
+SUPABASE_SYNC_BACKOFF_SECONDS = 1
+SUPABASE_SYNC_MAX_BACKOFF_SECONDS = 300
+# Storage client (utils/supabase_client.py): threads for batch uploads/deletes
+SUPABASE_STORAGE_WORKERS = int(os.getenv('SUPABASE_STORAGE_WORKERS', '8'))
+SUPABASE_STORAGE_TIMEOUT = 30
+
+# Serve follower/following/post counts from the denormalized columns on User
+USE_STORED_USER_COUNTERS = os.getenv('USE_STORED_USER_COUNTERS', 'True') == 'True'
+
+# Buffer like/comment count changes and apply them in batches with the
+# flush_post_counters command (must be running when this is enabled)
+POST_COUNTER_WRITE_BEHIND = os.getenv('POST_COUNTER_WRITE_BEHIND', 'False') == 'True'
+
+# User search (users/search.py): rows scanned from the prefix index per search
+USER_SEARCH_CANDIDATES = int(os.getenv('USER_SEARCH_CANDIDATES', '200'))
+
+# Trending hashtags (posts/tags.py): minutes of per-minute counters summed,
+# and minutes after which a use counts half as much
+TAG_TRENDING_WINDOW = int(os.getenv('TAG_TRENDING_WINDOW', '60'))
+TAG_TRENDING_HALF_LIFE = float(os.getenv('TAG_TRENDING_HALF_LIFE', '15'))
+
+# Fold likes on the same post (and new followers) into one notification
+# while the previous one is unseen and younger than the window (minutes)
+NOTIFICATION_COALESCING = os.getenv('NOTIFICATION_COALESCING', 'True') == 'True'
+NOTIFICATION_COALESCE_WINDOW = int(os.getenv('NOTIFICATION_COALESCE_WINDOW', '60'))
+NOTIFICATION_RECENT_ACTORS = 3
+
+# How long notifications are kept before purge_notifications archives them.
+# only_read: unread/unseen notifications of that type are never removed.
+NOTIFICATION_RETENTION = {
+    'like': {'days': 30, 'only_read': True},
+    'comment': {'days': 90, 'only_read': True},
+    'follow': {'days': 180, 'only_read': False},
+}
+
+# Notification stream (/api/notifications/stream/, served under ASGI).
+# Use notifications.broker.UnixSocketBackend when running several workers.
+NOTIFICATION_STREAM_BACKEND = os.getenv('NOTIFICATION_STREAM_BACKEND', 'notifications.broker.LocalBackend')
+NOTIFICATION_STREAM_SOCKET_DIR = os.getenv('NOTIFICATION_STREAM_SOCKET_DIR', '/tmp/socialconnect-stream')
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = 15
+NOTIFICATION_STREAM_MAX_SECONDS = 300
+
+# Feed Timelines
+FEED_TIMELINE_LENGTH = int(os.getenv('FEED_TIMELINE_LENGTH', '800'))
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', '5000'))
 
 # Media Files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are stored once per distinct content under media/blobs/ and
+# garbage-collected by gc_media when unreferenced (utils/storage.py)
+STORAGES = {
+    'default': {'BACKEND': 'utils.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+MEDIA_GC_GRACE_HOURS = int(os.getenv('MEDIA_GC_GRACE_HOURS', '24'))
+
+# Media serving (utils/media_views.py): browser cache lifetime for files that
+# aren't content-addressed, and an optional nginx internal location mapped to
+# MEDIA_ROOT that file bodies are handed off to with X-Accel-Redirect
+MEDIA_CACHE_SECONDS = int(os.getenv('MEDIA_CACHE_SECONDS', '3600'))
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+
+# Processes rendering post image variants (posts/image_variants.py); 0
+# renders them inline after the request's transaction commits
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', '2'))
+
 # Custom User Model
 AUTH_USER_MODEL = 'users.User'
 
 # Authentication Backends
 AUTHENTICATION_BACKENDS = [
-    'authentication.backends.EmailBackend',
-    'django.contrib.auth.backends.ModelBackend',
+    'authentication.backends.EmailOrUsernameBackend',
 ]
+
+# New and upgraded password hashes use PASSWORD_HASHER; hashes made by the
+# other hashers still verify and are rewritten on the owner's next login.
+# PASSWORD_HASH_ITERATIONS sets the PBKDF2 work factor (empty for Django's
+# default) - lower verifies faster, at the cost of cheaper offline guessing.
+# Django's own PBKDF2PasswordHasher is left out: it shares the pbkdf2_sha256
+# name and would take over verifying those hashes.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'authentication.hashers.ConfigurablePBKDF2PasswordHasher')
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS') or 0) or None
+PASSWORD_HASHERS = [PASSWORD_HASHER] + [
+    hasher for hasher in (
+        'authentication.hashers.ConfigurablePBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ) if hasher != PASSWORD_HASHER
+]
+
+# login_view records last_login at most once per this many minutes per user
+LAST_LOGIN_UPDATE_MINUTES = int(os.getenv('LAST_LOGIN_UPDATE_MINUTES', '15'))
@@ -15,10 +15,10 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.http import JsonResponse
+from utils.media_views import serve_media
 
 def api_home(request):
     return JsonResponse({
@@ -28,6 +28,7 @@ def api_home(request):
             'auth': '/api/auth/',
             'users': '/api/users/',
             'posts': '/api/posts/',
+            'tags': '/api/tags/',
             'notifications': '/api/notifications/',
             'admin': '/api/admin/'
         }
@@ -40,9 +41,8 @@ urlpatterns = [
     path('api/users/', include('users.urls')),
     path('api/posts/', include('posts.urls')),
     path('api/feed/', include('posts.urls')),
+    path('api/tags/', include('posts.tag_urls')),
     path('api/notifications/', include('notifications.urls')),
     path('api/admin/', include('users.admin_urls')),
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', serve_media, name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -53,7 +53,7 @@ class AdminPostListView(generics.ListAPIView):
     def get_queryset(self):
         if self.request.user.role != 'admin':
             return Post.objects.none()
-        return Post.objects.all().order_by('-created_at')
+        return Post.objects.select_related('author').order_by('-created_at')
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
@@ -62,8 +62,7 @@ def admin_delete_post(request, post_id):
         return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
     
     post = get_object_or_404(Post, id=post_id)
-    post.is_active = False
-    post.save()
+    post.deactivate()
     
     return Response({"message": "Post deleted"}, status=status.HTTP_200_OK)
 
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from users.models import UserSearchTerm
+from users.search import terms_for
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Rebuild the user search index (UserSearchTerm) from user names and emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        indexed = terms = 0
+        last_pk = 0
+
+        while True:
+            users = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'username', 'first_name', 'last_name', 'email')[:batch_size]
+            )
+            if not users:
+                break
+            last_pk = users[-1].pk
+
+            rows = [UserSearchTerm(user=user, term=term, field=field) for user in users for term, field in terms_for(user)]
+            with transaction.atomic():
+                UserSearchTerm.objects.filter(user__in=users).delete()
+                UserSearchTerm.objects.bulk_create(rows)
+            indexed += len(users)
+            terms += len(rows)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {indexed} users ({terms} search terms)')
+        )
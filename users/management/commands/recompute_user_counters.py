@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce
+from users.models import Follow
+from posts.models import Post
+
+User = get_user_model()
+
+COUNTERS = ['stored_followers_count', 'stored_following_count', 'stored_posts_count']
+
+def count_of(queryset, field):
+    """Correlated COUNT(*) of `queryset` rows whose `field` points at the outer user"""
+    counts = queryset.filter(**{field: OuterRef('pk')}).values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized follower/following/post counters on users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = fixed = 0
+        last_pk = 0
+
+        while True:
+            batch = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', *COUNTERS)
+                .annotate(
+                    live_followers=count_of(Follow.objects.all(), 'following'),
+                    live_following=count_of(Follow.objects.all(), 'follower'),
+                    live_posts=count_of(Post.objects.filter(is_active=True), 'author'),
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+
+            drifted = []
+            for user in batch:
+                live = (user.live_followers, user.live_following, user.live_posts)
+                if live != tuple(getattr(user, field) for field in COUNTERS):
+                    for field, value in zip(COUNTERS, live):
+                        setattr(user, field, value)
+                    drifted.append(user)
+
+            fixed += len(drifted)
+            if drifted and not options['dry_run']:
+                with transaction.atomic():
+                    User.objects.bulk_update(drifted, COUNTERS)
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(
+            self.style.SUCCESS(f'Checked {checked} users. {verb} {fixed} with drifted counters')
+        )
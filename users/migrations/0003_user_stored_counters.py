@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:18
+
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('users', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+
+    for user in User.objects.all().iterator():
+        User.objects.filter(pk=user.pk).update(
+            stored_followers_count=Follow.objects.filter(following=user).count(),
+            stored_following_count=Follow.objects.filter(follower=user).count(),
+            stored_posts_count=Post.objects.filter(author=user, is_active=True).count(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_avatar'),
+        ('posts', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='stored_followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='stored_following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='stored_posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_search_terms(apps, schema_editor):
+    from users.search import terms_for
+
+    User = apps.get_model('users', 'User')
+    UserSearchTerm = apps.get_model('users', 'UserSearchTerm')
+
+    batch = []
+    for user in User.objects.all().iterator():
+        batch += [UserSearchTerm(user=user, term=term, field=field) for term, field in terms_for(user)]
+        if len(batch) >= 1000:
+            UserSearchTerm.objects.bulk_create(batch)
+            batch = []
+    UserSearchTerm.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=150)),
+                ('field', models.CharField(choices=[('username', 'Username'), ('first_name', 'First name'), ('last_name', 'Last name'), ('email', 'Email local part')], max_length=20)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'user'], name='users_search_term_idx')],
+            },
+        ),
+        migrations.RunPython(build_search_terms, migrations.RunPython.noop),
+    ]
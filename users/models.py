@@ -1,5 +1,8 @@
 from django.contrib.auth.models import AbstractUser
+from django.conf import settings
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -25,17 +28,41 @@ class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Denormalized counters, kept in sync by users.signals and posts.signals
+    # and repaired with the recompute_user_counters command
+    stored_followers_count = models.PositiveIntegerField(default=0)
+    stored_following_count = models.PositiveIntegerField(default=0)
+    stored_posts_count = models.PositiveIntegerField(default=0)
+    
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
     
     def followers_count(self):
+        if settings.USE_STORED_USER_COUNTERS:
+            return self.stored_followers_count
         return self.followers_set.count()
     
     def following_count(self):
+        if settings.USE_STORED_USER_COUNTERS:
+            return self.stored_following_count
         return self.following_set.count()
     
     def posts_count(self):
-        return self.post_set.count()
+        if settings.USE_STORED_USER_COUNTERS:
+            return self.stored_posts_count
+        return self.post_set.filter(is_active=True).count()
+    
+    MEDIA_FIELDS = ('avatar', 'avatar_url')
+    
+    def media_references(self):
+        """Names of the stored blobs this user points at"""
+        from utils.storage import references
+        return references(self.avatar.name if self.avatar else '', self.avatar_url)
+    
+    @classmethod
+    def adjust_counter(cls, user_id, field, delta):
+        """Atomically add `delta` to a stored counter, never going below zero"""
+        cls.objects.filter(pk=user_id).update(**{field: Greatest(F(field) + delta, 0)})
 
 class Follow(models.Model):
     follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following_set')
@@ -44,6 +71,31 @@ class Follow(models.Model):
     
     class Meta:
         unique_together = ('follower', 'following')
+        indexes = [
+            models.Index(fields=['following', 'created_at'], name='users_follow_following_idx'),
+            models.Index(fields=['follower', 'created_at'], name='users_follow_follower_idx'),
+        ]
         
     def __str__(self):
         return f'{self.follower.username} follows {self.following.username}'
+
+class UserSearchTerm(models.Model):
+    """Normalized name fragment of a user; search is an index range scan over `term`"""
+    FIELD_CHOICES = [
+        ('username', 'Username'),
+        ('first_name', 'First name'),
+        ('last_name', 'Last name'),
+        ('email', 'Email local part'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=150)
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'user'], name='users_search_term_idx'),
+        ]
+        
+    def __str__(self):
+        return f'{self.term} -> {self.user_id}'
@@ -0,0 +1,114 @@
+"""Indexed prefix search over users.
+
+Every user has a few ``UserSearchTerm`` rows: their normalized (case-folded,
+accent-stripped) username, first name, last name and email local part, plus
+the words inside each of those. A search is a range scan over the term index
+(``term >= q AND term < q + U+10FFFF``), capped at ``USER_SEARCH_CANDIDATES``
+rows, so its cost doesn't grow with the number of users. The candidates are
+then ranked in Python: exact matches before prefix matches, username matches
+before other fields, and mutual follows before followed users before
+everyone else.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from django.conf import settings
+from .models import User, Follow, UserSearchTerm
+
+WORD_SEPARATORS = re.compile(r'[\s._\-+]+')
+MAX_TERM = '\U0010ffff'
+
+
+def normalize(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    return ''.join(c for c in value if not unicodedata.combining(c)).casefold().strip()
+
+
+def terms_for(user):
+    """The (term, field) pairs `user` can be found by"""
+    values = {
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': (user.email or '').split('@')[0],
+    }
+    terms = set()
+    for field, value in values.items():
+        value = normalize(value)
+        if not value:
+            continue
+        terms.add((value[:150], field))
+        for word in WORD_SEPARATORS.split(value):
+            if word:
+                terms.add((word[:150], field))
+    return terms
+
+
+def index_user(user):
+    """Replace `user`'s search terms"""
+    UserSearchTerm.objects.filter(user=user).delete()
+    UserSearchTerm.objects.bulk_create(
+        [UserSearchTerm(user=user, term=term, field=field) for term, field in terms_for(user)]
+    )
+
+
+def prefix_filter(token):
+    return {'term__gte': token, 'term__lt': token + MAX_TERM}
+
+
+def match_rank(tokens, terms):
+    """0 exact username .. 3 prefix of another field; None unless every token matches"""
+    worst = 0
+    for token in tokens:
+        ranks = [
+            (0 if term == token else 2) + (0 if field == 'username' else 1)
+            for term, field in terms
+            if term.startswith(token)
+        ]
+        if not ranks:
+            return None
+        worst = max(worst, min(ranks))
+    return worst
+
+
+def search_users(viewer, query, limit=10):
+    """Users matching `query`, best first"""
+    tokens = normalize(query).split()
+    if not tokens:
+        return []
+
+    # The longest token is the most selective one to scan for
+    matching = UserSearchTerm.objects.filter(**prefix_filter(max(tokens, key=len)))
+    candidates_limit = getattr(settings, 'USER_SEARCH_CANDIDATES', 200)
+
+    # Followed users are looked up separately so a common prefix can't push
+    # them out of the capped candidate set
+    followed_matches = matching.filter(user__followers_set__follower=viewer)
+    candidate_ids = set(followed_matches.values_list('user_id', flat=True)[:candidates_limit])
+    candidate_ids.update(matching.order_by('term').values_list('user_id', flat=True)[:candidates_limit])
+    if not candidate_ids:
+        return []
+
+    terms = defaultdict(list)
+    for user_id, term, field in UserSearchTerm.objects.filter(user_id__in=candidate_ids).values_list('user_id', 'term', 'field'):
+        terms[user_id].append((term, field))
+    followed = set(
+        Follow.objects.filter(follower=viewer, following_id__in=candidate_ids).values_list('following_id', flat=True)
+    )
+    followers = set(
+        Follow.objects.filter(following=viewer, follower_id__in=candidate_ids).values_list('follower_id', flat=True)
+    )
+
+    ranked = []
+    for user_id, user_terms in terms.items():
+        rank = match_rank(tokens, user_terms)
+        if rank is None:
+            continue
+        social = 0 if user_id in followed and user_id in followers else 1 if user_id in followed else 2
+        # The full username is the longest username term
+        username = max((term for term, field in user_terms if field == 'username'), key=len, default='')
+        ranked.append((rank, social, len(username), username, user_id))
+
+    top = [entry[-1] for entry in sorted(ranked)[:limit]]
+    users = User.objects.in_bulk(top)
+    return [users[user_id] for user_id in top if user_id in users]
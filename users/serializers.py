@@ -20,9 +20,21 @@ class UserSerializer(serializers.ModelSerializer):
     def get_is_following(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated and request.user != obj:
+            # Lists of posts resolve the authors the viewer follows in one query
+            followed_user_ids = self.context.get('followed_user_ids')
+            if followed_user_ids is not None:
+                return obj.id in followed_user_ids
             return Follow.objects.filter(follower=request.user, following=obj).exists()
         return False
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Just enough of a user to render their name and avatar, with no extra queries"""
+    
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name', 'avatar', 'avatar_url', 'is_verified']
+        read_only_fields = fields
+
 class UserProfileUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
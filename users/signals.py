@@ -0,0 +1,38 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from utils.storage import saved_references, update_references
+from .models import User, Follow
+from .search import index_user
+
+SEARCHED_FIELDS = {'username', 'first_name', 'last_name', 'email'}
+
+@receiver(post_save, sender=User)
+def update_search_terms(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCHED_FIELDS & set(update_fields):
+        return
+    index_user(instance)
+
+@receiver(post_save, sender=Follow)
+def increment_follow_counters(sender, instance, created, **kwargs):
+    if created:
+        User.adjust_counter(instance.follower_id, 'stored_following_count', 1)
+        User.adjust_counter(instance.following_id, 'stored_followers_count', 1)
+
+@receiver(post_delete, sender=Follow)
+def decrement_follow_counters(sender, instance, **kwargs):
+    User.adjust_counter(instance.follower_id, 'stored_following_count', -1)
+    User.adjust_counter(instance.following_id, 'stored_followers_count', -1)
+
+@receiver(pre_save, sender=User)
+def remember_media_references(sender, instance, update_fields=None, **kwargs):
+    instance._media_references = saved_references(instance, update_fields)
+
+@receiver(post_save, sender=User)
+def update_media_references(sender, instance, **kwargs):
+    before = getattr(instance, '_media_references', None)
+    if before is not None:
+        update_references(before, instance.media_references())
+
+@receiver(post_delete, sender=User)
+def release_media_references(sender, instance, **kwargs):
+    update_references(instance.media_references(), set())
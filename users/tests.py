@@ -1,3 +1,149 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import skipUnless
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from posts.models import Post
+from .models import User, Follow, UserSearchTerm
+from .serializers import UserSerializer
+from utils.query_plans import plan_problems
 
-# Create your tests here.
+
+def make_user(username):
+    return User.objects.create_user(email=f'{username}@example.com', username=username, password='pass12345')
+
+
+class StoredCounterTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def counters(self, user):
+        user.refresh_from_db()
+        return user.stored_followers_count, user.stored_following_count, user.stored_posts_count
+
+    def test_follow_and_unfollow_update_counters(self):
+        self.client.post(f'/api/users/{self.bob.id}/follow/')
+        self.assertEqual(self.counters(self.alice), (0, 1, 0))
+        self.assertEqual(self.counters(self.bob), (1, 0, 0))
+
+        self.client.delete(f'/api/users/{self.bob.id}/follow/')
+        self.assertEqual(self.counters(self.alice), (0, 0, 0))
+        self.assertEqual(self.counters(self.bob), (0, 0, 0))
+
+    def test_post_create_and_deactivate_update_counters(self):
+        post = Post.objects.create(author=self.alice, content='hello')
+        self.assertEqual(self.counters(self.alice), (0, 0, 1))
+
+        self.assertTrue(post.deactivate())
+        self.assertFalse(post.deactivate())
+        self.assertEqual(self.counters(self.alice), (0, 0, 0))
+
+    def test_recompute_command_fixes_drift(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        Post.objects.create(author=self.bob, content='hello')
+        User.objects.update(stored_followers_count=7, stored_following_count=7, stored_posts_count=7)
+
+        out = StringIO()
+        call_command('recompute_user_counters', stdout=out)
+
+        self.assertIn('Fixed 2', out.getvalue())
+        self.assertEqual(self.counters(self.alice), (0, 1, 0))
+        self.assertEqual(self.counters(self.bob), (1, 0, 1))
+
+    @override_settings(USE_STORED_USER_COUNTERS=True)
+    def test_serializer_reads_stored_counters_without_queries(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        self.bob.refresh_from_db()
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = UserSerializer(self.bob).data
+
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(data['followers_count'], 1)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        for name in ('bob', 'carol', 'dave'):
+            Follow.objects.create(follower=make_user(name), following=self.alice)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def assertIndexed(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(plan_problems(queries.captured_queries), [])
+
+    def test_followers(self):
+        self.assertIndexed(f'/api/users/{self.alice.id}/followers/')
+
+    def test_following(self):
+        self.assertIndexed(f'/api/users/{self.alice.id}/following/')
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        self.viewer = make_user('viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def search(self, query):
+        response = self.client.get('/api/users/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [user['username'] for user in response.data['results']]
+
+    def test_exact_and_prefix_ranked_before_social_boost(self):
+        make_user('annabel')
+        friend = make_user('annie')
+        make_user('ann')
+        Follow.objects.create(follower=self.viewer, following=friend)
+
+        self.assertEqual(self.search('Ann'), ['ann', 'annie', 'annabel'])
+
+    def test_mutual_follows_ranked_before_followed(self):
+        followed, mutual = make_user('sam_one'), make_user('sam_two')
+        make_user('sam')
+        Follow.objects.create(follower=self.viewer, following=followed)
+        Follow.objects.create(follower=self.viewer, following=mutual)
+        Follow.objects.create(follower=mutual, following=self.viewer)
+
+        self.assertEqual(self.search('sa'), ['sam_two', 'sam_one', 'sam'])
+
+    def test_names_email_and_accents_are_searchable(self):
+        user = make_user('xyz')
+        user.first_name, user.last_name, user.email = 'José', 'Núñez', 'jnunez@example.com'
+        user.save()
+
+        self.assertEqual(self.search('jose nun'), ['xyz'])
+        self.assertEqual(self.search('jnu'), ['xyz'])
+        self.assertEqual(self.search('xyzz'), [])
+
+    def test_index_follows_renames(self):
+        user = make_user('oldname')
+        user.username, user.email = 'newname', 'newname@example.com'
+        user.save()
+
+        self.assertEqual(self.search('old'), [])
+        self.assertEqual(self.search('new'), ['newname'])
+
+    def test_query_count_does_not_grow_with_matches(self):
+        from .search import search_users
+        for i in range(30):
+            make_user(f'bulk{i}')
+
+        with self.assertNumQueries(6):
+            self.assertEqual(len(search_users(self.viewer, 'bulk')), 10)
+
+    def test_rebuild_command(self):
+        make_user('rebuilt')
+        UserSearchTerm.objects.all().delete()
+        call_command('rebuild_user_search', stdout=StringIO())
+        self.assertEqual(self.search('rebu'), ['rebuilt'])
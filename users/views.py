@@ -4,7 +4,9 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
+from utils import write_queue
 from .models import Follow
+from .search import search_users
 from .serializers import UserSerializer, UserProfileUpdateSerializer, FollowSerializer
 
 User = get_user_model()
@@ -19,7 +21,9 @@ class UserProfileUpdateView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        # The full row rather than the cached request.user, which only has
+        # the columns authentication needs
+        return User.objects.get(pk=self.request.user.pk)
 
 @api_view(['POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
@@ -30,20 +34,25 @@ def follow_user(request, user_id):
         return Response({"error": "Cannot follow yourself"}, status=status.HTTP_400_BAD_REQUEST)
     
     if request.method == 'POST':
-        follow, created = Follow.objects.get_or_create(
-            follower=request.user,
-            following=user_to_follow
-        )
+        def add_follow():
+            follow, created = Follow.objects.get_or_create(
+                follower=request.user,
+                following=user_to_follow
+            )
+            return created
         
-        if created:
+        if write_queue.run(add_follow):
             return Response({"message": "Successfully followed user"}, status=status.HTTP_201_CREATED)
         else:
             return Response({"message": "Already following this user"}, status=status.HTTP_200_OK)
     
     elif request.method == 'DELETE':
-        try:
+        def remove_follow():
             follow = Follow.objects.get(follower=request.user, following=user_to_follow)
             follow.delete()
+        
+        try:
+            write_queue.run(remove_follow)
             return Response({"message": "Successfully unfollowed user"}, status=status.HTTP_200_OK)
         except Follow.DoesNotExist:
             return Response({"error": "Not following this user"}, status=status.HTTP_400_BAD_REQUEST)
@@ -52,7 +61,7 @@ def follow_user(request, user_id):
 @permission_classes([IsAuthenticated])
 def user_followers(request, user_id):
     user = get_object_or_404(User, id=user_id)
-    followers = Follow.objects.filter(following=user)
+    followers = Follow.objects.filter(following=user).order_by('-created_at')
     serializer = FollowSerializer(followers, many=True)
     return Response(serializer.data)
 
@@ -60,7 +69,7 @@ def user_followers(request, user_id):
 @permission_classes([IsAuthenticated])
 def user_following(request, user_id):
     user = get_object_or_404(User, id=user_id)
-    following = Follow.objects.filter(follower=user)
+    following = Follow.objects.filter(follower=user).order_by('-created_at')
     serializer = FollowSerializer(following, many=True)
     return Response(serializer.data)
 
@@ -76,7 +85,5 @@ class UserListView(generics.ListAPIView):
         # Regular users can search for users
         search = self.request.query_params.get('search', '')
         if search:
-            return User.objects.filter(
-                username__icontains=search
-            )[:10]
+            return search_users(self.request.user, search)
         return User.objects.none()
@@ -0,0 +1,16 @@
+"""Cache backend properties.
+
+Per-process state such as the cached authenticated user and read-your-writes
+markers must be visible to every worker, so features that rely on the cache
+for it check ``is_shared`` and fall back to not using the cache otherwise.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def is_shared(alias='default'):
+    """Whether what one process writes to cache `alias` is seen by the others"""
+    return not isinstance(caches[alias], LOCAL_BACKENDS)
@@ -0,0 +1,30 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from socialconnect.db_router import replicas, copy_sqlite_database
+
+class Command(BaseCommand):
+    help = 'Refresh the SQLite read replicas (DATABASE_REPLICAS) from the primary database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep refreshing every --interval seconds')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between refreshes with --loop')
+
+    def handle(self, *args, **options):
+        aliases = replicas()
+        if not aliases:
+            raise CommandError('No DATABASE_REPLICAS configured')
+        for alias in aliases:
+            if settings.DATABASES[alias]['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(f'{alias} is not SQLite; replicate it with the database server instead')
+
+        while True:
+            started = time.monotonic()
+            for alias in aliases:
+                copy_sqlite_database(settings.DATABASES[alias]['NAME'])
+            self.stdout.write(
+                self.style.SUCCESS(f'Copied primary to {len(aliases)} replicas in {time.monotonic() - started:.2f}s')
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,171 @@
+"""Serving files from MEDIA_ROOT.
+
+Responses carry a strong ETag and Last-Modified, so repeat requests are
+answered with 304 Not Modified, and single byte ranges are honoured (206)
+for resumed downloads and media scrubbing. Content-addressed blobs
+(utils.storage) can never change under their name, so they are sent with a
+one-year ``immutable`` Cache-Control and their digest as ETag: browsers and
+CDNs don't even revalidate them.
+
+Full responses are FileResponses over the open file, which WSGI servers
+send with sendfile(). With ``MEDIA_ACCEL_REDIRECT_PREFIX`` set, the body is
+left to nginx entirely through an ``X-Accel-Redirect`` to that internal
+location (which nginx must map to MEDIA_ROOT).
+
+Uploaded files are served from the API origin, so the Content-Type never
+comes from the (client-chosen) file name alone: only known image types are
+sent as images, everything else as an ``application/octet-stream``
+attachment, and every response carries ``nosniff`` and a sandboxing CSP so
+a file can't run as a page.
+"""
+import os
+import re
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from .storage import blob_name_from
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+IMAGE_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+SAFETY_HEADERS = {
+    'X-Content-Type-Options': 'nosniff',
+    'Content-Security-Policy': 'sandbox',
+}
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def byte_range(header, size):
+    """Inclusive (start, end) for a single-range Range header, or None to send the whole file"""
+    match = RANGE.fullmatch(header.strip())
+    if match is None or match.group(1) == match.group(2) == '':
+        # Malformed or multiple ranges: a full response is always allowed
+        return None
+    first, last = match.groups()
+    if first == '':
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request, etag, last_modified):
+    value = request.headers.get('If-Range')
+    if value is None:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+class RangeFile:
+    """Read-only view of `length` bytes of `file` starting at `start`"""
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def cache_headers(path, stat):
+    if blob_name_from(path) == path:
+        etag = f'"{os.path.splitext(os.path.basename(path))[0]}"'
+        cache_control = IMMUTABLE
+    else:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        cache_control = f'public, max-age={getattr(settings, "MEDIA_CACHE_SECONDS", 3600)}'
+    return {
+        'ETag': etag,
+        'Last-Modified': http_date(int(stat.st_mtime)),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+        **SAFETY_HEADERS,
+    }
+
+
+def content_type_for(path):
+    """(content type, as attachment) for `path`: inline only for known image types"""
+    content_type = IMAGE_TYPES.get(os.path.splitext(path)[1].lower())
+    if content_type is None:
+        return 'application/octet-stream', True
+    return content_type, False
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Not found')
+    # .part files are uploads still being written (utils.storage)
+    if path.endswith('.part') or not os.path.isfile(full_path):
+        raise Http404('Not found')
+
+    stat = os.stat(full_path)
+    headers = cache_headers(path, stat)
+    last_modified = int(stat.st_mtime)
+
+    not_modified = get_conditional_response(
+        request, etag=headers['ETag'], last_modified=last_modified, response=HttpResponse(headers=headers)
+    )
+    if not_modified.status_code != 200:
+        return not_modified
+
+    content_type, attachment = content_type_for(path)
+    if attachment:
+        headers['Content-Disposition'] = 'attachment'
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '')
+    if accel_prefix:
+        # nginx serves the body, ranges included, and keeps these headers
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + path
+        return response
+
+    requested = None
+    if 'Range' in request.headers and if_range_matches(request, headers['ETag'], last_modified):
+        try:
+            requested = byte_range(request.headers['Range'], stat.st_size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416, headers=headers)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    file = open(full_path, 'rb')
+    if requested is None:
+        # as_attachment: FileResponse would otherwise set an inline disposition
+        return FileResponse(file, content_type=content_type, as_attachment=attachment, headers=headers)
+    start, end = requested
+    response = FileResponse(RangeFile(file, start, end - start + 1), status=206, content_type=content_type, headers=headers)
+    response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response['Content-Length'] = str(end - start + 1)
+    return response
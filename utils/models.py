@@ -0,0 +1,23 @@
+from django.db import models
+
+
+class MediaBlob(models.Model):
+    """One stored file of the content-addressed media store (utils.storage)"""
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    # Rows (posts, users) whose fields point at this blob; kept by
+    # posts.signals/users.signals, recounted by gc_media --recount
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the same bytes are uploaded again, so an upload that is
+    # about to be referenced is never collected as an orphan
+    last_uploaded_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_uploaded_at'], condition=models.Q(ref_count=0), name='utils_mediablob_orphan_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count} refs)'
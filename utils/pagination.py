@@ -0,0 +1,101 @@
+import base64
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    """Opaque cursor pointing at the row (created_at, pk)"""
+    raw = json.dumps([created_at.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError(cursor)
+        return created_at, int(pk)
+    except (ValueError, TypeError, json.JSONDecodeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+
+def encode_rank_cursor(score, pk):
+    """Opaque cursor pointing at the row (score, pk) of a ranked result list"""
+    raw = json.dumps([score, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_rank_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(score), int(pk)
+    except (ValueError, TypeError, json.JSONDecodeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+
+def keyset_page(queryset, cursor=None, page_size=20, fields=('created_at', 'id')):
+    """Return (rows, next_cursor) for `queryset` ordered newest first.
+
+    Rows are ordered by `fields` (a timestamp and a unique id, both may be
+    annotations) descending and the page is cut with a WHERE clause on that
+    pair, so every page costs the same as the first one. One extra row is
+    fetched to know whether there is a next page.
+    """
+    time_field, id_field = fields
+    queryset = queryset.order_by(f'-{time_field}', f'-{id_field}')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{time_field}__lt': created_at}) | Q(**{time_field: created_at, f'{id_field}__lt': pk})
+        )
+
+    rows = list(queryset[:page_size + 1])
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        return rows, encode_cursor(getattr(last, time_field), getattr(last, id_field))
+    return rows, None
+
+
+class KeysetPagination(BasePagination):
+    """DRF pagination class on top of keyset_page: ?cursor= instead of ?page=, no COUNT(*)"""
+    page_size = 20
+    cursor_query_param = 'cursor'
+    # (timestamp, unique id) the pages are ordered and cut on, newest first
+    ordering_fields = ('created_at', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            rows, self.next_cursor = keyset_page(
+                queryset, request.query_params.get(self.cursor_query_param), self.page_size, self.ordering_fields
+            )
+        except InvalidCursor:
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor'})
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'has_next': self.next_cursor is not None,
+            'results': data,
+        })
@@ -0,0 +1,52 @@
+"""EXPLAIN QUERY PLAN checks for the hot query paths (SQLite only).
+
+Used by the test suites to fail when an endpoint's queries stop being served
+by an index: a plan step that scans a whole table or sorts through a temporary
+B-tree is reported as a problem. Walking a whole index is only accepted in a
+statement with a LIMIT (a page or a keyset probe stops early); without one,
+e.g. a COUNT over an index, it reads every entry and is reported too.
+"""
+import re
+from django.db import connection
+
+PROBLEM_MARKERS = ('USE TEMP B-TREE',)
+
+
+def explain(sql, params=()):
+    """The EXPLAIN QUERY PLAN detail lines for `sql`"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+
+
+def is_problem(detail, bounded=False):
+    """Whether a plan step is a full scan or temp sort. `bounded`: the statement has a LIMIT."""
+    if any(marker in detail for marker in PROBLEM_MARKERS):
+        return True
+    if not detail.startswith('SCAN ') or 'CONSTANT ROW' in detail:
+        return False
+    # "SCAN posts_post" walks the table; "SCAN ... USING INDEX" walks an index
+    # in order, which only stops early at a LIMIT (what keyset pages rely on)
+    return ' USING ' not in detail or not bounded
+
+
+def plan_problems(queries):
+    """[(sql, detail)] for every statement in `queries` whose plan has a full scan or temp sort.
+
+    `queries` is CaptureQueriesContext.captured_queries; statements are
+    re-planned with the raw SQL Django logged, so they must not depend on
+    state that has since changed.
+    """
+    problems = []
+    for query in queries:
+        sql = query['sql']
+        if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            continue
+        bounded = bool(LIMIT.search(sql))
+        for detail in explain(sql):
+            if is_problem(detail, bounded):
+                problems.append((sql, detail))
+    return problems
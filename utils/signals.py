@@ -0,0 +1,7 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from . import sqlite
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    sqlite.configure(connection)
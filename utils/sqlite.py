@@ -0,0 +1,52 @@
+"""Connection tuning for running SQLite under several worker processes.
+
+With ``SQLITE_TUNING`` on, every new SQLite connection switches the database
+to WAL (readers no longer block the writer and vice versa), relaxes fsyncs to
+``synchronous=NORMAL`` (still safe in WAL mode, only the last commits can be
+lost on power failure), maps the file into memory, enlarges the page cache
+and waits ``SQLITE_BUSY_TIMEOUT`` ms for the write lock instead of failing
+with "database is locked" straight away.
+
+Transactions are also started with ``BEGIN IMMEDIATE``. A deferred
+transaction that reads first and writes later can't wait for the lock in WAL
+mode (its snapshot would be stale), so it fails immediately whatever the busy
+timeout; taking the write lock up front makes it queue instead. This is the
+``transaction_mode`` database option of newer Django versions.
+"""
+from django.conf import settings
+
+
+def is_enabled():
+    return getattr(settings, 'SQLITE_TUNING', False)
+
+
+def pragmas():
+    return [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', getattr(settings, 'SQLITE_BUSY_TIMEOUT', 5000)),
+        ('mmap_size', getattr(settings, 'SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        # Negative cache_size is in KiB rather than pages
+        ('cache_size', -getattr(settings, 'SQLITE_CACHE_SIZE_KB', 64 * 1024)),
+        ('temp_store', 'MEMORY'),
+    ]
+
+
+def configure(connection):
+    """Apply the tuning pragmas to a freshly opened connection"""
+    if connection.vendor != 'sqlite' or not is_enabled():
+        return
+    if connection.is_in_memory_db():
+        # No WAL for in-memory databases
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+    mode = getattr(settings, 'SQLITE_TRANSACTION_MODE', 'IMMEDIATE')
+
+    def start_transaction():
+        connection.cursor().execute(f'BEGIN {mode}')
+
+    # Called by atomic() to open the outermost transaction
+    connection._start_transaction_under_autocommit = start_transaction
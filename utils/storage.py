@@ -0,0 +1,133 @@
+"""Content-addressed media storage.
+
+``ContentAddressedStorage`` is the default file storage. Uploads are
+streamed chunk by chunk into a temporary file while being hashed, then
+moved to ``blobs/<aa>/<sha256><ext>``. The name the caller asked for is
+ignored: ``<ext>`` comes from the image format Pillow recognises in the
+bytes (IMAGE_EXTENSIONS), and anything else is stored without one, so a
+client can't choose how a blob is later served. Identical uploads end up in
+the same file, which is written once, and a name can never be overwritten
+with different bytes.
+
+Each stored file has a MediaBlob row. Its ``ref_count`` is the number of
+rows pointing at it (``Post.image_url``/``image_variants``, ``User.avatar``/
+``avatar_url``), maintained through ``update_references`` by the posts and
+users signals. Blobs nobody references are deleted by ``gc_media`` once
+they haven't been uploaded for a grace period.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from collections import Counter
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+BLOB_DIR = 'blobs'
+BLOB_NAME = re.compile(r'(blobs/[0-9a-f]{2}/[0-9a-f]{64}(?:\.[a-z0-9]{1,8})?)(?:[?#]|$)')
+# Pillow format -> blob extension
+IMAGE_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+
+def sniff_extension(path):
+    """Extension for the image format of the file at `path`, '' if it isn't an allowed image"""
+    try:
+        # Only parses the header
+        with Image.open(path) as image:
+            return IMAGE_EXTENSIONS.get(image.format, '')
+    except (UnidentifiedImageError, OSError):
+        return ''
+
+
+def blob_name(digest, extension):
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}{extension}'
+
+
+def blob_name_from(value):
+    """The blob a storage name or media URL points at, or None"""
+    match = BLOB_NAME.search(value or '')
+    return match.group(1) if match else None
+
+
+def references(*values):
+    """Set of blob names referenced by `values` (URLs or storage names)"""
+    return {name for name in map(blob_name_from, values) if name}
+
+
+def update_references(before, after):
+    """Adjust ref counts for a row whose referenced blobs changed from `before` to `after`"""
+    from .models import MediaBlob
+    added, released = after - before, before - after
+    if added:
+        MediaBlob.objects.filter(name__in=added).update(ref_count=F('ref_count') + 1)
+    if released:
+        MediaBlob.objects.filter(name__in=released).update(ref_count=Greatest(F('ref_count') - 1, 0))
+
+
+REFERRERS = ('posts.Post', 'users.User')
+
+
+def count_references():
+    """{blob name: number of referencing rows}, computed from scratch"""
+    from django.apps import apps
+    counts = Counter()
+    for label in REFERRERS:
+        model = apps.get_model(label)
+        for instance in model.objects.only(*model.MEDIA_FIELDS).iterator(chunk_size=1000):
+            counts.update(instance.media_references())
+    return counts
+
+
+def saved_references(instance, update_fields=None):
+    """Blobs the stored row of `instance` references (for pre_save), None if the save can't change them"""
+    if update_fields is not None and not set(instance.MEDIA_FIELDS) & set(update_fields):
+        return None
+    if instance._state.adding:
+        return set()
+    stored = type(instance).objects.filter(pk=instance.pk).only(*instance.MEDIA_FIELDS).first()
+    return stored.media_references() if stored is not None else set()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # _save picks the final name from the content; equal names are equal files
+        return name
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+        
+        temp_dir = self.path(BLOB_DIR)
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir, suffix='.part')
+        digest, size = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+            
+            name = blob_name(digest.hexdigest(), sniff_extension(temp_path))
+            # Row first: the write locks it against a concurrent gc_media,
+            # which deletes the row and then the file in one transaction
+            MediaBlob.objects.update_or_create(
+                name=name,
+                defaults={'digest': digest.hexdigest(), 'size': size, 'last_uploaded_at': timezone.now()},
+            )
+            path = self.path(name)
+            if os.path.exists(path):
+                os.unlink(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                # Atomic: readers see either no file or the complete one
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
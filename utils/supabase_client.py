@@ -1,44 +1,177 @@
-from supabase import create_client, Client
+"""Supabase Storage access.
+
+Uploads and deletes talk to the Storage REST API over one process-wide
+``requests.Session``, so connections and TLS sessions are reused across
+calls and threads instead of building a new client per operation. Uploads
+stream the file from disk (or from the upload's temporary file) in blocks
+rather than reading it into memory first.
+
+``upload_many``/``delete_many`` are for backfills and cleanup jobs: they run
+on a thread pool of at most ``SUPABASE_STORAGE_WORKERS`` threads, never hold
+more than a couple of batches of pending work at once, and report one
+``ObjectResult`` per object instead of failing the whole batch.
+
+``get_supabase_client`` still returns a full supabase-py client (imported
+lazily, created once) for anything beyond storage.
+"""
+import mimetypes
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+import requests
 from django.conf import settings
-import os
+from requests.adapters import HTTPAdapter
+
+ObjectResult = namedtuple('ObjectResult', ['path', 'ok', 'url', 'error'])
+
+_client = None
+_session = None
+_lock = threading.Lock()
 
-def get_supabase_client() -> Client:
-    """Get Supabase client instance"""
+
+class SupabaseStorageError(Exception):
+    pass
+
+
+def get_supabase_client():
+    """Process-wide supabase-py client"""
+    global _client
     url = settings.SUPABASE_URL
     key = settings.SUPABASE_KEY
     
     if not url or not key:
         raise ValueError("Supabase URL and Key must be configured")
     
-    return create_client(url, key)
+    with _lock:
+        if _client is None:
+            from supabase import create_client
+            _client = create_client(url, key)
+    return _client
+
+
+def workers():
+    return getattr(settings, 'SUPABASE_STORAGE_WORKERS', 8)
+
+
+def get_session():
+    """Process-wide HTTP session, with a connection per worker thread"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers())
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+    return _session
+
+
+def storage_headers(**extra):
+    key = settings.SUPABASE_SERVICE_KEY or settings.SUPABASE_KEY
+    if not settings.SUPABASE_URL or not key:
+        raise ValueError("Supabase URL and Key must be configured")
+    return {'apikey': key, 'Authorization': f'Bearer {key}', **extra}
+
+
+def object_url(bucket_name, file_path):
+    return f"{settings.SUPABASE_URL}/storage/v1/object/{quote(bucket_name)}/{quote(file_path)}"
+
+
+def public_url(bucket_name, file_path):
+    return f"{settings.SUPABASE_URL}/storage/v1/object/public/{quote(bucket_name)}/{quote(file_path)}"
 
-def upload_file_to_supabase(file, bucket_name: str, file_path: str):
-    """Upload file to Supabase Storage"""
+
+def error_message(response):
+    try:
+        body = response.json()
+        return f"{response.status_code} - {body.get('message') or body.get('error') or body}"
+    except ValueError:
+        return f"{response.status_code} - {response.text[:200]}"
+
+
+def upload_file_to_supabase(file, bucket_name: str, file_path: str, upsert=False):
+    """Upload file to Supabase Storage and return its public URL"""
+    content_type = getattr(file, 'content_type', None) or mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+    headers = storage_headers(**{'Content-Type': content_type, 'x-upsert': 'true' if upsert else 'false'})
+    timeout = getattr(settings, 'SUPABASE_STORAGE_TIMEOUT', 30)
+    
+    if hasattr(file, 'seek'):
+        file.seek(0)
     try:
-        supabase = get_supabase_client()
-        
-        # Upload file
-        response = supabase.storage.from_(bucket_name).upload(
-            file_path, 
-            file.read()
-        )
-        
-        if response.status_code == 200:
-            # Get public URL
-            public_url = supabase.storage.from_(bucket_name).get_public_url(file_path)
-            return public_url
-        else:
-            raise Exception(f"Upload failed: {response.text}")
-            
-    except Exception as e:
-        raise Exception(f"Supabase upload error: {str(e)}")
+        # A file object is sent in blocks as it is read; its length comes
+        # from the file so no chunked encoding is needed
+        response = get_session().post(object_url(bucket_name, file_path), data=file, headers=headers, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        raise SupabaseStorageError(f"Supabase upload error: {e}")
+    
+    if response.status_code not in [200, 201]:
+        raise SupabaseStorageError(f"Supabase upload error: {error_message(response)}")
+    return public_url(bucket_name, file_path)
+
+
+def delete_objects(bucket_name, file_paths):
+    """Delete up to a batch of objects in one request. Returns the set of paths that existed."""
+    timeout = getattr(settings, 'SUPABASE_STORAGE_TIMEOUT', 30)
+    response = get_session().delete(
+        f"{settings.SUPABASE_URL}/storage/v1/object/{quote(bucket_name)}",
+        json={'prefixes': list(file_paths)}, headers=storage_headers(), timeout=timeout,
+    )
+    if response.status_code != 200:
+        raise SupabaseStorageError(f"Supabase delete error: {error_message(response)}")
+    return {row['name'] for row in response.json()}
+
 
 def delete_file_from_supabase(bucket_name: str, file_path: str):
     """Delete file from Supabase Storage"""
     try:
-        supabase = get_supabase_client()
-        response = supabase.storage.from_(bucket_name).remove([file_path])
-        return response.status_code == 200
-    except Exception as e:
+        return file_path in delete_objects(bucket_name, [file_path])
+    except (SupabaseStorageError, requests.exceptions.RequestException) as e:
         print(f"Supabase delete error: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+
+def bounded_map(func, items, max_workers):
+    """Like Executor.map, but only keeps 2 * max_workers items in flight"""
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='supabase-storage') as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def upload_many(bucket_name, files, upsert=False, max_workers=None):
+    """Upload (file_path, file) pairs concurrently. Returns an ObjectResult per pair, in order."""
+    def upload(item):
+        file_path, file = item
+        try:
+            return ObjectResult(file_path, True, upload_file_to_supabase(file, bucket_name, file_path, upsert=upsert), None)
+        # OSError/ValueError: the file couldn't be read (or was closed)
+        except (SupabaseStorageError, requests.exceptions.RequestException, OSError, ValueError) as e:
+            return ObjectResult(file_path, False, None, str(e))
+    
+    return list(bounded_map(upload, files, max_workers or workers()))
+
+
+def delete_many(bucket_name, file_paths, batch_size=100, max_workers=None):
+    """Delete objects concurrently in batches. Returns an ObjectResult per path, in order.
+
+    A path that didn't exist is reported as not ok with error 'not found'.
+    """
+    file_paths = list(file_paths)
+    batches = [file_paths[i:i + batch_size] for i in range(0, len(file_paths), batch_size)]
+    
+    def delete(batch):
+        try:
+            deleted = delete_objects(bucket_name, batch)
+        except (SupabaseStorageError, requests.exceptions.RequestException) as e:
+            return [ObjectResult(path, False, None, str(e)) for path in batch]
+        return [
+            ObjectResult(path, True, None, None) if path in deleted else ObjectResult(path, False, None, 'not found')
+            for path in batch
+        ]
+    
+    return [result for batch in bounded_map(delete, batches, max_workers or workers()) for result in batch]
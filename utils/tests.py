@@ -0,0 +1,431 @@
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import skipUnless
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from posts.models import Post
+from socialconnect.db_router import ReplicaRouter, ReplicaRoutingMiddleware, copy_sqlite_database
+from users.models import User
+from PIL import Image
+from rest_framework.test import APIClient
+from .models import MediaBlob
+from .query_plans import plan_problems
+from . import supabase_client
+from .write_queue import WriteQueue
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=60)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        # Sticky markers must be visible to every worker: a shared cache
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': self.cache_dir},
+        })
+        self.settings_override.enable()
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(self.read_alias)
+
+    def read_alias(self, request):
+        return HttpResponse(ReplicaRouter().db_for_read(Post))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir)
+
+    def request(self, method, token='alice'):
+        request = getattr(self.factory, method)('/api/posts/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.middleware(request).content.decode()
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.request('get'), 'replica')
+        self.assertEqual(self.request('post'), 'default')
+        self.assertEqual(ReplicaRouter().db_for_write(Post), 'default')
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        self.request('post', token='alice')
+
+        self.assertEqual(self.request('get', token='alice'), 'default')
+        self.assertEqual(self.request('get', token='bob'), 'replica')
+
+        cache.clear()  # sticky window over
+        self.assertEqual(self.request('get', token='alice'), 'replica')
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Post), 'default')
+
+    def test_local_memory_cache_keeps_reads_on_primary(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual(self.request('get'), 'default')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite replicas only')
+class CopySqliteDatabaseTests(TransactionTestCase):
+    # The copy only sees committed rows
+    def test_copy_has_schema_and_rows(self):
+        User.objects.create_user(email='alice@example.com', username='alice', password='pass12345')
+        with tempfile.TemporaryDirectory() as directory:
+            target = os.path.join(directory, 'db.replica.sqlite3')
+            copy_sqlite_database(target)
+
+            replica = sqlite3.connect(target)
+            usernames = [row[0] for row in replica.execute('SELECT username FROM users_user')]
+            replica.close()
+
+        self.assertEqual(usernames, ['alice'])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite tuning only')
+class SqliteTuningTests(TransactionTestCase):
+    # Journal mode can't be switched inside the TestCase transaction
+
+    @override_settings(SQLITE_TUNING=True, SQLITE_BUSY_TIMEOUT=1234)
+    def test_pragmas_applied_to_new_connections(self):
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout = cursor.fetchone()[0]
+
+        self.assertEqual(journal_mode, 'wal')
+        self.assertEqual(busy_timeout, 1234)
+
+    def tearDown(self):
+        # Leave the test database in its default journal mode
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode = DELETE')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanCheckTests(TestCase):
+    def problems(self, sql):
+        return plan_problems([{'sql': sql}])
+
+    def test_index_walk_needs_a_limit(self):
+        walk = 'SELECT "id" FROM "posts_post" WHERE "is_active" ORDER BY "created_at" DESC'
+        self.assertEqual(self.problems(f'{walk} LIMIT 21'), [])
+        self.assertEqual(len(self.problems(walk)), 1)
+        self.assertEqual(len(self.problems('SELECT COUNT(*) FROM "posts_post" WHERE "is_active"')), 1)
+
+    def test_table_scan_and_temp_sort_are_problems_even_with_a_limit(self):
+        self.assertTrue(self.problems('SELECT "id" FROM "posts_post" WHERE "content" = \'x\' LIMIT 5'))
+        self.assertTrue(self.problems('SELECT "id" FROM "posts_post" ORDER BY "content" LIMIT 5'))
+
+
+@override_settings(SQLITE_WRITE_QUEUE=True)
+class WriteQueueTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(email='alice@example.com', username='alice', password='pass12345')
+        self.queue = WriteQueue(batch_size=50, max_wait=50)
+
+    def test_concurrent_writes_share_commits(self):
+        futures = [
+            self.queue.submit(Post.objects.create, author=self.alice, content=str(i))
+            for i in range(20)
+        ]
+        posts = [future.result(timeout=10) for future in futures]
+
+        self.assertEqual(Post.objects.filter(id__in=[post.id for post in posts]).count(), 20)
+        self.assertLess(self.queue.committed_batches, 20)
+
+    def test_failing_write_does_not_spoil_batch(self):
+        def fail():
+            Post.objects.create(author=self.alice, content='rolled back')
+            raise ValueError('boom')
+
+        failed = self.queue.submit(fail)
+        succeeded = self.queue.submit(Post.objects.create, author=self.alice, content='kept')
+
+        with self.assertRaises(ValueError):
+            failed.result(timeout=10)
+        succeeded.result(timeout=10)
+        self.assertEqual(list(Post.objects.values_list('content', flat=True)), ['kept'])
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media)
+        self.settings_override.enable()
+        self.alice = User.objects.create_user(email='alice@example.com', username='alice', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media)
+
+    def create_post(self, data, filename='photo.png'):
+        image = SimpleUploadedFile(filename, data, content_type='image/png')
+        response = self.client.post('/api/posts/', {'content': 'pic', 'image': image}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return Post.objects.latest('id')
+
+    def test_identical_content_is_stored_once(self):
+        data = os.urandom(200 * 1024)  # several chunks
+        first = default_storage.save('posts/a.JPG', ContentFile(data))
+        second = default_storage.save('avatars/b.jpg', ContentFile(data))
+
+        self.assertEqual(first, second)
+        # Not an image: no extension, whatever the name said
+        self.assertRegex(first, r'^blobs/[0-9a-f]{2}/[0-9a-f]{64}$')
+        with default_storage.open(first) as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(MediaBlob.objects.get().size, len(data))
+        self.assertEqual(os.listdir(os.path.dirname(default_storage.path(first))), [os.path.basename(first)])
+
+    def test_extension_comes_from_the_image_format(self):
+        response = self.client.post('/api/posts/upload-image/', {'image': SimpleUploadedFile('x.html', png_bytes('red'), content_type='image/png')}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertRegex(response.data['image_url'], r'/blobs/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+
+    def test_both_upload_paths_share_blobs_and_count_references(self):
+        data = png_bytes('red')
+        post = self.create_post(data, 'one.png')
+        same = self.create_post(data, 'two.png')
+        self.assertEqual(post.image_url, same.image_url)
+        self.assertTrue(post.image_url.startswith('http://testserver/media/blobs/'))
+
+        response = self.client.post('/api/posts/upload-image/', {'image': SimpleUploadedFile('x.png', data, content_type='image/png')}, format='multipart')
+        self.assertEqual(response.data['image_url'], post.image_url)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+
+        same.delete()
+        post.image_url = ''
+        post.save()
+        self.assertEqual(MediaBlob.objects.get().ref_count, 0)
+
+    def test_gc_deletes_only_old_orphans(self):
+        kept = self.create_post(png_bytes('red'))
+        orphan = default_storage.save('posts/orphan.png', ContentFile(png_bytes('blue')))
+        fresh = default_storage.save('posts/fresh.png', ContentFile(png_bytes('green')))
+        MediaBlob.objects.exclude(name=fresh).update(last_uploaded_at=timezone.now() - timedelta(days=2))
+
+        call_command('gc_media', stdout=io.StringIO())
+
+        self.assertEqual(set(MediaBlob.objects.values_list('name', flat=True)), {kept.media_references().pop(), fresh})
+        self.assertFalse(default_storage.exists(orphan))
+
+    def test_recount_repairs_drift(self):
+        post = self.create_post(png_bytes('red'))
+        MediaBlob.objects.update(ref_count=0, last_uploaded_at=timezone.now() - timedelta(days=2))
+
+        call_command('gc_media', recount=True, stdout=io.StringIO())
+
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        self.assertTrue(default_storage.exists(MediaBlob.objects.get().name))
+        self.assertIn(MediaBlob.objects.get().name, post.image_url)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media)
+        self.settings_override.enable()
+        self.data = png_bytes('red')
+        self.blob = default_storage.save('posts/photo.png', ContentFile(self.data))
+        os.makedirs(os.path.join(self.media, 'legacy'))
+        with open(os.path.join(self.media, 'legacy', 'old.jpg'), 'wb') as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_blobs_are_immutable_and_revalidate_with_304(self):
+        response = self.client.get(f'/media/{self.blob}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(response['ETag'].strip('"'), self.blob)
+
+        response = self.client.get(f'/media/{self.blob}', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_only_images_are_served_inline(self):
+        response = self.client.get(f'/media/{self.blob}')
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+
+        with open(os.path.join(self.media, 'legacy', 'page.html'), 'wb') as f:
+            f.write(b'<script>alert(1)</script>')
+        response = self.client.get('/media/legacy/page.html')
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+    def test_other_files_revalidate_by_date(self):
+        response = self.client.get('/media/legacy/old.jpg')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response = self.client.get('/media/legacy/old.jpg', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        url = f'/media/{self.blob}'
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(self.body(response), self.data[10:20])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(self.body(response), self.data[-5:])
+
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f'bytes={len(self.data)}-').status_code, 416)
+        # Stale If-Range: the whole current file instead of a mismatched slice
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+
+    def test_rejects_paths_outside_media_root(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/legacy/').status_code, 404)
+        self.assertEqual(self.client.post(f'/media/{self.blob}').status_code, 405)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect_offload(self):
+        response = self.client.get(f'/media/{self.blob}')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.blob}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class StandInStorage(BaseHTTPRequestHandler):
+    """Local stand-in for the Supabase Storage object API"""
+    objects = {}
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def track(self):
+        with self.lock:
+            StandInStorage.active += 1
+            StandInStorage.max_active = max(StandInStorage.max_active, StandInStorage.active)
+        time.sleep(0.02)
+        with self.lock:
+            StandInStorage.active -= 1
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.track()
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        key = self.path.split('/storage/v1/object/', 1)[1]
+        if self.headers['Authorization'] != 'Bearer service-key':
+            return self.reply(403, {'message': 'bad key'})
+        if 'reject' in key or (key in self.objects and self.headers['x-upsert'] != 'true'):
+            return self.reply(400, {'message': 'Duplicate'})
+        self.objects[key] = body
+        self.reply(200, {'Key': key})
+
+    def do_DELETE(self):
+        self.track()
+        bucket = self.path.rsplit('/', 1)[1]
+        prefixes = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['prefixes']
+        deleted = [name for name in prefixes if self.objects.pop(f'{bucket}/{name}', None) is not None]
+        self.reply(200, [{'name': name} for name in deleted])
+
+    def log_message(self, *args):
+        pass
+
+
+class SupabaseStorageClientTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInStorage)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StandInStorage.objects = {}
+        StandInStorage.max_active = 0
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.settings_override = override_settings(SUPABASE_URL=self.url, SUPABASE_SERVICE_KEY='service-key', SUPABASE_STORAGE_WORKERS=4)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        supabase_client._session = None
+
+    def test_upload_streams_file_and_reuses_session(self):
+        data = os.urandom(300 * 1024)
+        with tempfile.TemporaryFile() as f:
+            f.write(data)
+            url = supabase_client.upload_file_to_supabase(f, 'media', 'posts/a.jpg')
+
+        self.assertEqual(url, f'{self.url}/storage/v1/object/public/media/posts/a.jpg')
+        self.assertEqual(StandInStorage.objects['media/posts/a.jpg'], data)
+        self.assertIs(supabase_client.get_session(), supabase_client.get_session())
+        with self.assertRaises(supabase_client.SupabaseStorageError):
+            supabase_client.upload_file_to_supabase(ContentFile(b'x'), 'media', 'posts/a.jpg')
+
+    def test_batch_upload_reports_each_object_and_bounds_concurrency(self):
+        files = [(f'bulk/{i}.txt', ContentFile(f'file {i}'.encode())) for i in range(20)]
+        files[7] = ('bulk/reject.txt', ContentFile(b'no'))
+
+        results = supabase_client.upload_many('media', files)
+
+        self.assertEqual([result.path for result in results], [path for path, _ in files])
+        self.assertEqual([result.ok for result in results].count(False), 1)
+        self.assertIn('Duplicate', results[7].error)
+        self.assertEqual(StandInStorage.objects['media/bulk/3.txt'], b'file 3')
+        self.assertTrue(1 < StandInStorage.max_active <= 4)
+
+    def test_unreadable_file_fails_only_its_own_upload(self):
+        closed = tempfile.TemporaryFile()
+        closed.close()
+        files = [('bulk/a.txt', ContentFile(b'a')), ('bulk/closed.txt', closed), ('bulk/b.txt', ContentFile(b'b'))]
+
+        results = supabase_client.upload_many('media', files)
+
+        self.assertEqual([result.ok for result in results], [True, False, True])
+        self.assertIn('closed file', results[1].error)
+        self.assertEqual(sorted(StandInStorage.objects), ['media/bulk/a.txt', 'media/bulk/b.txt'])
+
+    def test_batch_delete(self):
+        StandInStorage.objects = {f'media/old/{i}': b'' for i in range(5)}
+        paths = [f'old/{i}' for i in range(6)]
+
+        results = supabase_client.delete_many('media', paths, batch_size=2)
+
+        self.assertEqual([(result.path, result.ok) for result in results], [(path, path != 'old/5') for path in paths])
+        self.assertEqual(results[-1].error, 'not found')
+        self.assertEqual(StandInStorage.objects, {})
+        self.assertFalse(supabase_client.delete_file_from_supabase('media', 'old/0'))
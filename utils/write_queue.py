@@ -0,0 +1,108 @@
+"""Per-process queue for short write transactions.
+
+SQLite allows a single writer at a time, and every commit is a lock round
+trip plus a journal sync. With ``SQLITE_WRITE_QUEUE`` on, ``run(func)`` hands
+`func` to this process's writer thread instead of opening a transaction in
+the request thread. The writer collects up to ``SQLITE_WRITE_BATCH_SIZE``
+queued writes (waiting at most ``SQLITE_WRITE_BATCH_WAIT`` ms for more to
+arrive) and runs them in one transaction, each in its own savepoint so one
+failing write doesn't undo the others. Callers block until the batch has
+committed, so they read their own writes afterwards.
+
+With the queue off, ``run`` is just ``transaction.atomic()`` around `func`.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from django.conf import settings
+from django.db import transaction
+
+
+def is_enabled():
+    return getattr(settings, 'SQLITE_WRITE_QUEUE', False)
+
+
+class WriteQueue:
+    def __init__(self, batch_size=None, max_wait=None):
+        self.batch_size = batch_size or getattr(settings, 'SQLITE_WRITE_BATCH_SIZE', 64)
+        self.max_wait = (max_wait if max_wait is not None else getattr(settings, 'SQLITE_WRITE_BATCH_WAIT', 2)) / 1000
+        self.committed_batches = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self._ensure_writer()
+        self._queue.put((func, args, kwargs, future))
+        return future
+
+    def _ensure_writer(self):
+        # Threads don't survive fork, so workers forked from a preloaded
+        # master start their own writer on first use
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sqlite-write-queue', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        jobs = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(jobs) < self.batch_size:
+            try:
+                jobs.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return jobs
+
+    def _run(self):
+        while True:
+            self._run_batch(self._next_batch())
+
+    def _run_batch(self, jobs):
+        results = []
+        try:
+            with transaction.atomic():
+                for func, args, kwargs, future in jobs:
+                    try:
+                        with transaction.atomic():
+                            results.append((future, func(*args, **kwargs), None))
+                    except Exception as e:
+                        results.append((future, None, e))
+        except Exception as e:
+            # The commit itself failed; nothing in the batch was written
+            for func, args, kwargs, future in jobs:
+                future.set_exception(e)
+            return
+
+        self.committed_batches += 1
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue():
+    global _write_queue
+    if _write_queue is None:
+        with _write_queue_lock:
+            if _write_queue is None:
+                _write_queue = WriteQueue()
+    return _write_queue
+
+
+def run(func, *args, **kwargs):
+    """Run `func` in a write transaction and return its result"""
+    if not is_enabled() or transaction.get_connection().in_atomic_block:
+        # Already inside a transaction: the write has to be part of it
+        with transaction.atomic():
+            return func(*args, **kwargs)
+    return get_write_queue().submit(func, *args, **kwargs).result()